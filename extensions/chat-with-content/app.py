@@ -1,4 +1,10 @@
+import asyncio
+import hashlib
+import json
 import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from posit import connect
 from posit.connect.content import ContentItem
 from posit.connect.errors import ClientError
@@ -9,21 +15,90 @@ from shiny import App, Inputs, Outputs, Session, ui, reactive, render
 from helpers import time_since_deployment
 
 
+# A successful credentials check is remembered in this file for BEDROCK_CHECK_TTL
+# seconds, so a restarted process using the same credentials doesn't check again.
+BEDROCK_CHECK_TTL = int(os.getenv("BEDROCK_CHECK_TTL", "3600"))
+BEDROCK_CHECK_PATH = os.path.join(
+    tempfile.gettempdir(), "chat-with-content-bedrock-check.json"
+)
+
+
+def _credentials_fingerprint(credentials) -> str:
+    # Which credentials were checked: where they came from and their access key ID,
+    # hashed so the file doesn't name the key.
+    access_key = credentials.get_frozen_credentials().access_key
+    return hashlib.sha256(f"{credentials.method}\0{access_key}".encode()).hexdigest()
+
+
+def _checked_recently(fingerprint: str) -> bool:
+    # Whether these same credentials passed the check within BEDROCK_CHECK_TTL.
+    try:
+        with open(BEDROCK_CHECK_PATH) as f:
+            check = json.load(f)
+        return (
+            check["credentials"] == fingerprint
+            and time.time() - check["checked_at"] < BEDROCK_CHECK_TTL
+        )
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+
+def _remember_check(fingerprint: str, identity: dict) -> None:
+    # Written readable only by this user, then moved into place whole, so a process
+    # reading it never sees half a file.
+    temp_path = f"{BEDROCK_CHECK_PATH}.{os.getpid()}"
+    try:
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(
+                {
+                    "checked_at": time.time(),
+                    "credentials": fingerprint,
+                    "account": identity.get("Account"),
+                    "arn": identity.get("Arn"),
+                },
+                f,
+            )
+        os.replace(temp_path, BEDROCK_CHECK_PATH)
+    except OSError as e:
+        print(f"Couldn't cache the AWS Bedrock credentials check. Err: {e}")
+
+
 def check_aws_bedrock_credentials():
-    # Check if AWS credentials are available in the environment
-    # that can be used to access Bedrock
+    # Check if AWS credentials are available in the environment that can be used to
+    # access Bedrock, without calling the model: resolve them the way Bedrock's client
+    # would, then confirm they're valid with STS GetCallerIdentity, which needs no
+    # permissions and costs nothing.
     try:
-        chat = ChatBedrockAnthropic(
-            model="us.anthropic.claude-sonnet-4-20250514-v1:0",
+        import boto3
+        from botocore.config import Config
+
+        aws = boto3.Session()
+        credentials = aws.get_credentials()
+        if credentials is None:
+            raise RuntimeError("no AWS credentials found")
+        fingerprint = _credentials_fingerprint(credentials)
+        if _checked_recently(fingerprint):
+            return True
+        sts = aws.client(
+            "sts",
+            region_name=aws.region_name or "us-east-1",
+            # Sessions wait on this check, so don't let an unreachable STS hold them.
+            config=Config(
+                connect_timeout=5, read_timeout=5, retries={"max_attempts": 1}
+            ),
         )
-        chat.chat("test", echo="none")
-        return True
+        identity = sts.get_caller_identity()
     except Exception as e:
         print(
             f"AWS Bedrock credentials check failed and will fall back to checking for values for the CHATLAS_CHAT_PROVIDER_MODEL env var. Err: {e}"
         )
         return False
 
+    # Only a success is remembered, so fixing the credentials takes effect on restart.
+    _remember_check(fingerprint, identity)
+    return True
+
 
 def fetch_connect_content_list(client: connect.Client):
     content_list: list[ContentItem] = client.content.find(include=["owner", "tags"])
@@ -204,7 +279,20 @@ screen_ui = ui.page_output("screen")
 CHATLAS_CHAT_PROVIDER = os.getenv("CHATLAS_CHAT_PROVIDER")
 CHATLAS_CHAT_PROVIDER_MODEL = os.getenv("CHATLAS_CHAT_PROVIDER_MODEL")
 CHATLAS_CHAT_ARGS = os.getenv("CHATLAS_CHAT_ARGS")
-HAS_AWS_CREDENTIALS = check_aws_bedrock_credentials()
+# Bedrock is only the fallback, so only check for AWS credentials when no provider is
+# configured. The check runs in the background, so the app starts serving at once;
+# sessions wait for it only to pick their screen.
+_bedrock_check = (
+    ThreadPoolExecutor(max_workers=1).submit(check_aws_bedrock_credentials)
+    if not (CHATLAS_CHAT_PROVIDER_MODEL or CHATLAS_CHAT_PROVIDER)
+    else None
+)
+
+
+async def has_aws_credentials():
+    if _bedrock_check is None:
+        return False
+    return await asyncio.wrap_future(_bedrock_check)
 
 
 def server(input: Inputs, output: Outputs, session: Session):
@@ -248,17 +336,19 @@ def server(input: Inputs, output: Outputs, session: Session):
         chat = ChatAuto(
             system_prompt=system_prompt,
         )
-    elif HAS_AWS_CREDENTIALS:
-        # Fall back to Bedrock if AWS credentials are available and no provider is explicitly configured
+    else:
+        # Fall back to Bedrock if no provider is explicitly configured. Building the chat
+        # makes no request, so it's built before the credentials check finishes; the
+        # setup screen shows if the check fails.
         chat = ChatBedrockAnthropic(
             model="us.anthropic.claude-sonnet-4-20250514-v1:0",
             system_prompt=system_prompt,
         )
 
     @render.ui
-    def screen():
+    async def screen():
         if (
-            CHATLAS_CHAT_PROVIDER_MODEL is None and CHATLAS_CHAT_PROVIDER is None and not HAS_AWS_CREDENTIALS
+            CHATLAS_CHAT_PROVIDER_MODEL is None and CHATLAS_CHAT_PROVIDER is None and not await has_aws_credentials()
         ) or not VISITOR_API_INTEGRATION_ENABLED:
             return setup_ui
         else:
@@ -0,0 +1,135 @@
+"""Measure how request latency holds up as concurrent viewers grow.
+
+Runs the app in-process against a stub Connect client whose calls block for
+`--connect-delay` seconds, the way listing a large server or reading a content
+item's packages does. At each concurrency level, that many simulated viewers
+load the content list and a content item's packages while a probe times
+`GET /api/scan`, which never touches Connect. With the Connect calls on
+worker threads the probe stays flat; if they ran on the event loop it would
+grow with every viewer.
+
+    uv run python benchmark.py --viewers 1 10 50
+
+Prints one JSON object per concurrency level.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import tracemalloc
+
+import httpx
+
+# main.py builds a Connect client at import; give it placeholder settings since
+# the stub below replaces it, and keep the background scan from starting.
+os.environ.setdefault("CONNECT_SERVER", "http://connect.invalid")
+os.environ.setdefault("CONNECT_API_KEY", "benchmark")
+os.environ.setdefault("SCAN_INTERVAL_HOURS", "0")
+os.makedirs("dist", exist_ok=True)
+
+import main
+import scans
+
+
+class StubContent(dict):
+    def __init__(self, delay, guid):
+        super().__init__(guid=guid, bundle_id=None, title=guid)
+        self._delay = delay
+
+    @property
+    def packages(self):
+        time.sleep(self._delay)
+        return [{"name": "requests", "version": "2.31.0", "language": "Python"}]
+
+
+class StubContentResource:
+    def __init__(self, delay):
+        self._delay = delay
+
+    def find(self):
+        time.sleep(self._delay)
+        return [StubContent(self._delay, f"guid-{i}") for i in range(100)]
+
+    def get(self, guid):
+        time.sleep(self._delay)
+        return StubContent(self._delay, guid)
+
+
+class StubClient:
+    def __init__(self, delay):
+        self.content = StubContentResource(delay)
+
+    @property
+    def me(self):
+        return {"username": "benchmark", "content": self.content}
+
+
+PROBE_INTERVAL = 0.01
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run_level(http, viewers):
+    done = asyncio.Event()
+
+    async def viewer(i):
+        await http.get("/api/content", params={"show_all": "true"})
+        await http.get(f"/api/packages/guid-{i}")
+
+    async def viewers_load():
+        await asyncio.gather(*(viewer(i) for i in range(viewers)))
+        done.set()
+
+    async def probe():
+        # Sample for as long as the viewers are loading. Each sample includes
+        # how late the pause between probes wakes up, so a blocked event loop
+        # shows up even when it stalls between requests rather than during one.
+        samples = []
+        while not done.is_set():
+            start = time.perf_counter()
+            await http.get("/api/scan")
+            await asyncio.sleep(PROBE_INTERVAL)
+            samples.append(time.perf_counter() - start - PROBE_INTERVAL)
+        return samples
+
+    start = time.perf_counter()
+    samples, _ = await asyncio.gather(probe(), viewers_load())
+    elapsed = time.perf_counter() - start
+    return {
+        "viewers": viewers,
+        "viewer_requests_per_second": round(2 * viewers / elapsed, 1),
+        "probe_samples": len(samples),
+        "probe_p50_ms": round(statistics.median(samples) * 1000, 2),
+        "probe_p99_ms": round(percentile(samples, 99) * 1000, 2),
+    }
+
+
+async def run(args):
+    main.client = StubClient(args.connect_delay)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark"
+    ) as http:
+        for viewers in args.viewers:
+            # Packages are cached per bundle; start each level cold.
+            scans._bundle_packages.clear()
+            tracemalloc.start()
+            result = await run_level(http, viewers)
+            result["peak_memory_mb"] = round(
+                tracemalloc.get_traced_memory()[1] / 1e6, 1
+            )
+            tracemalloc.stop()
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--viewers", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--connect-delay", type=float, default=0.2)
+    asyncio.run(run(parser.parse_args()))
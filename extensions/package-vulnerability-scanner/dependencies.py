@@ -0,0 +1,105 @@
+"""Work out the transitive dependencies a content item's packages pull in.
+
+Connect records the packages a bundle installs, but a vulnerable package is
+usually fixed by upgrading whichever direct dependency requires it. Package
+Manager resolves an environment's dependency graph when asked not to omit
+dependencies; this module turns that answer into the indirect packages and the
+direct dependencies each one is reached through.
+
+Many content items share an environment exactly (cloned templates, the same
+lockfile deployed twice), so graphs are keyed by the environment's pinned
+package set and resolved once per set, not once per item.
+"""
+
+import re
+from collections import deque
+from typing import Optional
+
+from package_index import normalize_name
+
+# A dependency given as a requirement string, like "urllib3 (>= 1.21.1)" or
+# "urllib3>=1.21.1,<3; extra == 'socks'": the name is the leading identifier.
+_REQUIREMENT_NAME = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+
+# Not installable packages: R itself and the packages that ship with it.
+_CRAN_BUILTIN = {
+    "r",
+    "base",
+    "compiler",
+    "datasets",
+    "graphics",
+    "grdevices",
+    "grid",
+    "methods",
+    "parallel",
+    "splines",
+    "stats",
+    "stats4",
+    "tcltk",
+    "tools",
+    "utils",
+}
+
+
+def environment_key(specs) -> tuple[str, ...]:
+    """A key shared by every environment pinning the same "name==version" set."""
+    return tuple(sorted(set(specs)))
+
+
+def _dependency_name(repo: str, dependency) -> Optional[str]:
+    # Dependencies come as {"name": ...} objects or as requirement strings.
+    if isinstance(dependency, dict):
+        name = dependency.get("name")
+    else:
+        match = _REQUIREMENT_NAME.match(str(dependency))
+        name = match.group(1) if match else None
+    if not name:
+        return None
+    name = normalize_name(repo, name)
+    if repo == "cran" and name in _CRAN_BUILTIN:
+        return None
+    return name
+
+
+def attribute(repo: str, direct: list[str], records: list[dict]) -> list[dict]:
+    """The indirect packages in a resolved environment.
+
+    `direct` names the packages the content installs itself and `records` are
+    Package Manager's resolved packages (each with a "name", "version" and its
+    "dependencies"). Returns {"name", "version", "via"} for every package only
+    reachable through dependencies, where "via" lists the direct dependencies
+    that pull it in.
+    """
+    resolved = {normalize_name(repo, r["name"]): r for r in records if r.get("name")}
+    direct_names = {normalize_name(repo, name): name for name in direct}
+
+    via: dict[str, set[str]] = {}
+    for root in sorted(direct_names):
+        # Walk everything this direct dependency requires, however deep.
+        seen = {root}
+        queue = deque([root])
+        while queue:
+            record = resolved.get(queue.popleft())
+            for dependency in (record or {}).get("dependencies") or []:
+                name = _dependency_name(repo, dependency)
+                if name is None or name in seen:
+                    continue
+                seen.add(name)
+                queue.append(name)
+                if name not in direct_names:
+                    via.setdefault(name, set()).add(direct_names[root])
+
+    indirect = []
+    for name, parents in sorted(via.items()):
+        record = resolved.get(name)
+        # Without a resolved version there's nothing to match advisories to.
+        if record is None or not record.get("version"):
+            continue
+        indirect.append(
+            {
+                "name": record["name"],
+                "version": record["version"],
+                "via": sorted(parents),
+            }
+        )
+    return indirect
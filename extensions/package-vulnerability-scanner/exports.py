@@ -0,0 +1,260 @@
+"""Export stored scan results as SBOMs and CSV.
+
+Exports are built from the latest background scan and produced as generators
+of text chunks, so a fleet-wide export streams to the client row by row rather
+than being assembled in memory first.
+"""
+
+import csv
+import io
+import json
+import uuid
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from typing import Optional
+
+from scans import LANGUAGE_REPOS
+
+TOOL_NAME = "package-vulnerability-scanner"
+
+CSV_COLUMNS = [
+    "content_guid",
+    "content_title",
+    "owner_guid",
+    "bundle_id",
+    "last_deployed_time",
+    "repo",
+    "package",
+    "version",
+    "vulnerability_id",
+    "vulnerability_summary",
+    "published",
+    "latest_fixed_version",
+    "dependency_of",
+]
+
+# Flush the CSV buffer to the client once it holds about this many characters.
+CSV_CHUNK_SIZE = 64 * 1024
+
+
+def purl(repo: str, name: str, version: str) -> str:
+    """The package URL (purl) identifying a package version."""
+    return f"pkg:{repo}/{name}@{version}"
+
+
+def _json_document(fields: dict) -> Iterator[str]:
+    # Serialize a JSON object, streaming any iterator values as arrays so long
+    # lists are never held in memory as one string.
+    yield "{"
+    for i, (key, value) in enumerate(fields.items()):
+        if i:
+            yield ","
+        yield json.dumps(key) + ":"
+        if isinstance(value, Iterator):
+            yield "["
+            for j, item in enumerate(value):
+                if j:
+                    yield ","
+                yield json.dumps(item)
+            yield "]"
+        else:
+            yield json.dumps(value)
+    yield "}"
+
+
+def _packages(scan: dict, entry: dict) -> Iterator[tuple[str, dict, Optional[dict]]]:
+    # (repo, package, matched vulnerability details or None) for an item: its
+    # own packages, then any indirect ones (which carry "via").
+    for pkg in entry["packages"] + entry.get("dependencies", []):
+        repo = LANGUAGE_REPOS.get(pkg["language"].lower())
+        if repo is None:
+            continue
+        details = scan["vulns"][repo].get(pkg["name"], {}).get(pkg["version"])
+        yield repo, pkg, details
+
+
+def cyclonedx(scan: dict, entry: dict) -> Iterator[str]:
+    """A CycloneDX 1.5 JSON SBOM for one scanned content item."""
+
+    def components():
+        for repo, pkg, _ in _packages(scan, entry):
+            ref = purl(repo, pkg["name"], pkg["version"])
+            yield {
+                "type": "library",
+                "bom-ref": ref,
+                "name": pkg["name"],
+                "version": pkg["version"],
+                "purl": ref,
+            }
+
+    def vulnerabilities():
+        # One entry per advisory, listing every package in this item it affects,
+        # and how to fix each of them.
+        by_id: dict[str, dict] = {}
+        advice: dict[str, dict[str, None]] = {}
+        for repo, pkg, details in _packages(scan, entry):
+            if not details:
+                continue
+            ref = purl(repo, pkg["name"], pkg["version"])
+            for vuln in details["vulnerabilities"]:
+                found = by_id.setdefault(
+                    vuln["id"],
+                    {
+                        "id": vuln["id"],
+                        "source": {
+                            "name": "OSV",
+                            "url": f"https://osv.dev/vulnerability/{vuln['id']}",
+                        },
+                        "description": vuln.get("summary") or "",
+                        "detail": vuln.get("details") or "",
+                        "published": vuln.get("published"),
+                        "updated": vuln.get("modified"),
+                        "affects": [],
+                    },
+                )
+                found["affects"].append({"ref": ref})
+                if details["latest_fixed_version"]:
+                    # An indirect package is upgraded through what requires it.
+                    via = pkg.get("via")
+                    sentence = (
+                        f"Upgrade {pkg['name']} to "
+                        f"{details['latest_fixed_version']} or later"
+                        + (f" (required by {', '.join(via)})." if via else ".")
+                    )
+                    advice.setdefault(vuln["id"], {})[sentence] = None
+        for vuln_id, found in by_id.items():
+            if vuln_id in advice:
+                found["recommendation"] = " ".join(advice[vuln_id])
+            yield found
+
+    return _json_document(
+        {
+            "bomFormat": "CycloneDX",
+            "specVersion": "1.5",
+            "serialNumber": f"urn:uuid:{uuid.uuid4()}",
+            "version": 1,
+            "metadata": {
+                "timestamp": scan["finished_at"],
+                "tools": {"components": [{"type": "application", "name": TOOL_NAME}]},
+                "component": {
+                    "type": "application",
+                    "bom-ref": entry["guid"],
+                    "name": entry.get("title") or entry["guid"],
+                },
+            },
+            "components": components(),
+            "vulnerabilities": vulnerabilities(),
+        }
+    )
+
+
+def spdx(scan: dict, entry: dict) -> Iterator[str]:
+    """An SPDX 2.3 JSON SBOM for one scanned content item."""
+    packages = list(_packages(scan, entry))
+
+    def spdx_packages():
+        yield {
+            "name": entry.get("title") or entry["guid"],
+            "SPDXID": "SPDXRef-Content",
+            "downloadLocation": "NOASSERTION",
+            "filesAnalyzed": False,
+        }
+        for i, (repo, pkg, _) in enumerate(packages):
+            yield {
+                "name": pkg["name"],
+                "SPDXID": f"SPDXRef-Package-{i}",
+                "versionInfo": pkg["version"],
+                "downloadLocation": "NOASSERTION",
+                "filesAnalyzed": False,
+                "externalRefs": [
+                    {
+                        "referenceCategory": "PACKAGE-MANAGER",
+                        "referenceType": "purl",
+                        "referenceLocator": purl(repo, pkg["name"], pkg["version"]),
+                    }
+                ],
+            }
+
+    def relationships():
+        yield {
+            "spdxElementId": "SPDXRef-DOCUMENT",
+            "relationshipType": "DESCRIBES",
+            "relatedSpdxElement": "SPDXRef-Content",
+        }
+        # The content depends on its own packages, and they on indirect ones.
+        ids = {
+            (repo, pkg["name"]): f"SPDXRef-Package-{i}"
+            for i, (repo, pkg, _) in enumerate(packages)
+            if "via" not in pkg
+        }
+        for i, (repo, pkg, _) in enumerate(packages):
+            parents = [ids.get((repo, name)) for name in pkg.get("via", [])]
+            for parent in [p for p in parents if p] or ["SPDXRef-Content"]:
+                yield {
+                    "spdxElementId": parent,
+                    "relationshipType": "DEPENDS_ON",
+                    "relatedSpdxElement": f"SPDXRef-Package-{i}",
+                }
+
+    created = datetime.fromisoformat(scan["finished_at"]).astimezone(timezone.utc)
+    return _json_document(
+        {
+            "spdxVersion": "SPDX-2.3",
+            "dataLicense": "CC0-1.0",
+            "SPDXID": "SPDXRef-DOCUMENT",
+            "name": entry.get("title") or entry["guid"],
+            "documentNamespace": (
+                f"https://spdx.org/spdxdocs/{TOOL_NAME}-{entry['guid']}-{uuid.uuid4()}"
+            ),
+            "creationInfo": {
+                "created": created.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "creators": [f"Tool: {TOOL_NAME}"],
+            },
+            "packages": spdx_packages(),
+            "relationships": relationships(),
+        }
+    )
+
+
+def _fleet_rows(scan: dict) -> Iterator[list]:
+    # One row per package per item, repeated once per vulnerability it has.
+    for entry in scan["content"].values():
+        item = [
+            entry["guid"],
+            entry.get("title"),
+            entry.get("owner_guid"),
+            entry.get("bundle_id"),
+            entry.get("last_deployed_time"),
+        ]
+        for repo, pkg, details in _packages(scan, entry):
+            package = [repo, pkg["name"], pkg["version"]]
+            dependency_of = "; ".join(pkg.get("via", [])) or None
+            if not details:
+                yield item + package + [None, None, None, None, dependency_of]
+                continue
+            for vuln in details["vulnerabilities"]:
+                yield (
+                    item
+                    + package
+                    + [
+                        vuln["id"],
+                        vuln.get("summary"),
+                        vuln.get("published"),
+                        details["latest_fixed_version"],
+                        dependency_of,
+                    ]
+                )
+
+
+def fleet_csv(scan: dict) -> Iterator[str]:
+    """Every scanned package across the fleet, with its vulnerabilities, as CSV."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for row in _fleet_rows(scan):
+        writer.writerow(row)
+        if buffer.tell() >= CSV_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
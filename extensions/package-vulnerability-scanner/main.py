@@ -1,38 +1,106 @@
 import asyncio
+import contextlib
+import hashlib
 import json
+from typing import Literal, Optional
 
-import httpx
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from posit import connect
 from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
 
-app = FastAPI()
+import exports
+import scans
 
 client = connect.Client()
 
-# The public Package Manager is always current. To scan against your own
-# instance instead, point this at "https://your-ppm/__api__/filter/packages".
-PPM_URL = "https://packagemanager.posit.co/__api__/filter/packages"
-
-# Cap how many package specifiers go in one Package Manager request so a large
-# deployment doesn't produce an unwieldy payload.
-PPM_QUERY_CHUNK = 100
+# posit-sdk's requests session keeps up to 10 connections per host; size its
+# pool to the worker threads that share it so none of them has to reconnect.
+for prefix in ("https://", "http://"):
+    client.session.mount(prefix, HTTPAdapter(pool_maxsize=scans.CONNECT_CONCURRENCY))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Scan the fleet in the background so the UI can load the latest results
+    # immediately instead of scanning while someone waits. The scheduler starts
+    # from the saved scan, so a restart only scans once that one is stale.
+    scheduler = None
+    if scans.SCAN_INTERVAL_HOURS > 0:
+        scheduler = asyncio.create_task(scans.run_scheduled_scans(client))
+    yield
+    if scheduler is not None:
+        scheduler.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# The content fields the UI uses (ContentListItem in src/stores/content.ts).
+# Connect returns several times as many per item, which adds up to megabytes
+# of unused JSON when listing every item on a large server.
+CONTENT_FIELDS = (
+    "guid",
+    "title",
+    "name",
+    "description",
+    "app_mode",
+    "content_url",
+    "dashboard_url",
+    "last_deployed_time",
+    "bundle_id",
+    "py_version",
+    "r_version",
+    "quarto_version",
+)
 
 
 @app.get("/api/content")
-async def search_content(show_all: bool = False):
+async def search_content(
+    request: Request,
+    show_all: bool = False,
+    fields: Optional[str] = Query(
+        None,
+        description="Comma-separated content fields to return, "
+        "instead of the ones the UI uses.",
+    ),
+):
+    # Listing a large server is slow; keep it off the event loop (see
+    # scans.call_connect) so other viewers' requests aren't stalled behind it.
     if show_all:
-        return client.content.find()
-    return client.me.content.find()
+        items = await scans.call_connect(client.content.find)
+    else:
+        items = await scans.call_connect(lambda: client.me.content.find())
+
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else []
+    selected = selected or CONTENT_FIELDS
+    body = json.dumps(
+        [{field: item.get(field) for field in selected} for item in items]
+    )
+    # The list only changes when content is deployed, renamed, or removed.
+    return _revalidated_json(request, body)
+
+
+def _revalidated_json(request: Request, body: str) -> Response:
+    # Let the browser revalidate its copy and answer an unchanged one with a
+    # bodyless 304. Weak, since gzip may re-encode the same JSON.
+    etag = f'W/"{hashlib.sha256(body.encode()).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    cached = request.headers.get("if-none-match", "")
+    if {etag, "*"} & {tag.strip() for tag in cached.split(",")}:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @app.get("/api/packages/{guid}")
-async def get_packages(guid: str):
+async def get_packages(guid: str, bundle_id: Optional[str] = None):
+    # Passing the bundle_id the caller already knows lets an unchanged item be
+    # answered from the stored packages without another Connect request.
     try:
-        content = client.content.get(guid)
-        packages = list(content.packages)
-        return packages
+        return await scans.call_connect(scans.get_packages, client, guid, bundle_id)
     except Exception as e:
         raise HTTPException(
             status_code=404,
@@ -51,46 +119,134 @@ class InstalledPackages(BaseModel):
 async def get_vulnerabilities(installed: InstalledPackages):
     # Query the exact installed versions instead of the `has_vulns` filter,
     # which only flags packages whose latest version is vulnerable and so misses
-    # older deployed versions that were patched later.
-    results = {}
-
-    async def fetch_repo_vulns(repo, specifiers):
-        # name -> {vuln id -> vuln}; the same package may be requested at
-        # several versions, so we merge each version's vulns by id.
-        merged: dict[str, dict[str, dict]] = {}
-        specs = sorted(set(specifiers))
-        if not specs:
-            return repo, {}
-        async with httpx.AsyncClient() as http:
-            for start in range(0, len(specs), PPM_QUERY_CHUNK):
-                payload = {
-                    "repo": repo,
-                    "names": specs[start : start + PPM_QUERY_CHUNK],
-                    "omit_downloads": True,
-                    "omit_dependencies": True,
-                }
-                response = await http.post(PPM_URL, json=payload)
-                response.raise_for_status()
-                for line in response.text.strip().split("\n"):
-                    if not line:
-                        continue
-                    found = json.loads(line)
-                    for vuln in found.get("vulns") or []:
-                        merged.setdefault(found["name"], {})[vuln["id"]] = vuln
-        return repo, {name: list(v.values()) for name, v in merged.items()}
-
-    for repo, data in await asyncio.gather(
-        fetch_repo_vulns("pypi", installed.pypi),
-        fetch_repo_vulns("cran", installed.cran),
-    ):
-        results[repo] = data
-
-    return results
+    # older deployed versions that were patched later. Each version is resolved
+    # here, so the browser gets name -> version -> {vulnerabilities,
+    # latest_fixed_version} for just the vulnerable packages.
+    pypi, cran = await asyncio.gather(
+        scans.match_vulns("pypi", installed.pypi),
+        scans.match_vulns("cran", installed.cran),
+    )
+    return {"pypi": pypi, "cran": cran}
+
+
+@app.get("/api/scan")
+async def get_scan():
+    # Whether a scan is running, and a summary of the latest one. Its results
+    # are at /api/scan/results.
+    await scans.current_scan()
+    return scans.scan_status()
+
+
+async def _latest_scan() -> dict:
+    scan = await scans.current_scan()
+    if scan is None:
+        raise HTTPException(
+            status_code=404,
+            detail="No scan has finished yet. Start one from the UI or POST /api/scan.",
+        )
+    return scan
+
+
+# The fields of each scanned content item the UI uses (ScannedContent in
+# src/stores/scanner.ts).
+SCAN_CONTENT_FIELDS = ("guid", "bundle_id", "packages", "dependencies", "error")
+
+
+@app.get("/api/scan/results")
+async def get_scan_results(request: Request):
+    # Every item's packages and the vulnerabilities found, from the latest scan.
+    scan = await _latest_scan()
+    body = json.dumps(
+        {
+            "started_at": scan["started_at"],
+            "finished_at": scan["finished_at"],
+            "content": {
+                guid: {field: entry.get(field) for field in SCAN_CONTENT_FIELDS}
+                for guid, entry in scan["content"].items()
+            },
+            "vulns": scan["vulns"],
+        }
+    )
+    # Unchanged until the next scan, so tabs reloading it mostly get a 304.
+    return _revalidated_json(request, body)
+
+
+@app.post("/api/scan", status_code=202)
+async def request_scan():
+    # Joins the running scan when there is one, so repeated clicks and other
+    # open tabs don't each start a scan. Poll GET /api/scan for the result.
+    scans.start_scan(client)
+    return scans.scan_status()
+
+
+@app.get("/api/package-usage")
+async def get_package_usage(
+    name: Optional[str] = None,
+    prefix: Optional[str] = None,
+    versions: Optional[str] = Query(None, examples=[">=2.0,<2.32"]),
+    repo: Optional[Literal["pypi", "cran"]] = None,
+):
+    # Which content, as of the latest background scan, has a package installed:
+    # by exact name or name prefix, optionally narrowed to a version range.
+    if name is None and prefix is None:
+        raise HTTPException(status_code=400, detail="Pass a name or a prefix.")
+
+    scan = await scans.current_scan()
+    content = scan["content"] if scan else {}
+    results = []
+    try:
+        for r in [repo] if repo else ["pypi", "cran"]:
+            results.extend(scans.latest_index.find(r, name, prefix, versions))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    for result in results:
+        result["content"] = [
+            {"guid": guid, "title": content.get(guid, {}).get("title")}
+            for guid in result.pop("guids")
+        ]
+    return {
+        "scanned_at": scan["finished_at"] if scan else None,
+        "results": results,
+    }
+
+
+@app.get("/api/export/content/{guid}/sbom")
+async def export_sbom(guid: str, format: Literal["cyclonedx", "spdx"] = "cyclonedx"):
+    # An SBOM for one content item, from the latest background scan.
+    scan = await _latest_scan()
+    entry = scan["content"].get(guid)
+    if entry is None:
+        raise HTTPException(
+            status_code=404, detail=f"Content {guid} is not in the latest scan."
+        )
+    if format == "spdx":
+        body, media_type = exports.spdx(scan, entry), "application/spdx+json"
+    else:
+        body, media_type = (
+            exports.cyclonedx(scan, entry),
+            "application/vnd.cyclonedx+json",
+        )
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{guid}.{format}.json"'},
+    )
+
+
+@app.get("/api/export/fleet.csv")
+async def export_fleet_csv():
+    # Every package on every scanned content item, streamed as it's written.
+    return StreamingResponse(
+        exports.fleet_csv(await _latest_scan()),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="package-scan.csv"'},
+    )
 
 
 @app.get("/api/user")
 async def get_current_user():
-    return client.me
+    return await scans.call_connect(lambda: client.me)
 
 
 app.mount("/", StaticFiles(directory="dist", html=True), name="static")
@@ -0,0 +1,102 @@
+"""An inverted index from installed packages to the content that uses them.
+
+When a new advisory lands, the question is "which deployed content has
+requests 2.31.0?". Each fleet scan builds this index as it reads packages, so
+answering is a lookup instead of a rescan.
+"""
+
+import bisect
+import re
+from typing import Optional
+
+from vulns import parse_version, parse_version_range
+
+
+def normalize_name(repo: str, name: str) -> str:
+    """The key a package name is indexed under.
+
+    PyPI names compare case-insensitively with runs of "-", "_" and "."
+    equivalent (PEP 503); R package names are matched case-insensitively too,
+    so a search doesn't have to get the capitalization right.
+    """
+    if repo == "pypi":
+        return re.sub(r"[-_.]+", "-", name).lower()
+    return name.lower()
+
+
+def _highest_first(repo: str, versions: list[str]) -> list[str]:
+    # Versions that don't parse can't be ordered, so they go last.
+    keyed = [(parse_version(repo, v), v) for v in versions]
+    parsed = sorted(((key, v) for key, v in keyed if key is not None), reverse=True)
+    unparsed = sorted(v for key, v in keyed if key is None)
+    return [v for _, v in parsed] + unparsed
+
+
+class PackageIndex:
+    """(repo, name, version) -> guids of the content that has it installed."""
+
+    def __init__(self):
+        # repo -> normalized name -> version -> guids
+        self._guids: dict[str, dict[str, dict[str, set[str]]]] = {}
+        # repo -> normalized name -> the name as the package spells it
+        self._names: dict[str, dict[str, str]] = {}
+        # repo -> sorted normalized names, for prefix searches
+        self._sorted: dict[str, list[str]] = {}
+
+    def add(self, repo: str, name: str, version: str, guid: str) -> None:
+        key = normalize_name(repo, name)
+        versions = self._guids.setdefault(repo, {}).setdefault(key, {})
+        versions.setdefault(version, set()).add(guid)
+        if key not in self._names.setdefault(repo, {}):
+            self._names[repo][key] = name
+            self._sorted.pop(repo, None)
+
+    def _names_with_prefix(self, repo: str, prefix: str) -> list[str]:
+        names = self._sorted.get(repo)
+        if names is None:
+            names = self._sorted[repo] = sorted(self._guids.get(repo, {}))
+        start = bisect.bisect_left(names, prefix)
+        end = start
+        while end < len(names) and names[end].startswith(prefix):
+            end += 1
+        return names[start:end]
+
+    def find(
+        self,
+        repo: str,
+        name: Optional[str] = None,
+        prefix: Optional[str] = None,
+        versions: Optional[str] = None,
+    ) -> list[dict]:
+        """Installed versions of a package, or of every package with a prefix.
+
+        `versions` narrows the results to a version range such as
+        ">=2.0,<2.32" (see `parse_version_range`). Returns one entry per matching
+        name and version, highest version first, with the guids using it.
+        """
+        in_range = parse_version_range(repo, versions) if versions else None
+        if name is not None:
+            keys = [normalize_name(repo, name)]
+        elif prefix is not None:
+            keys = self._names_with_prefix(repo, normalize_name(repo, prefix))
+        else:
+            raise ValueError("Search by a package name or a name prefix.")
+
+        results = []
+        for key in keys:
+            installed = self._guids.get(repo, {}).get(key, {})
+            matching = [
+                version
+                for version in installed
+                if in_range is None or in_range(version)
+            ]
+            for version in _highest_first(repo, matching):
+                results.append(
+                    {
+                        "repo": repo,
+                        "name": self._names[repo][key],
+                        "version": version,
+                        "guids": sorted(installed[version]),
+                    }
+                )
+        return results
@@ -0,0 +1,461 @@
+"""Fleet scans, and the cached lookups they share.
+
+A content item's packages only change when it is redeployed, so they are kept
+per bundle and refetched only when the item's bundle_id moves on. Package
+Manager's advisories for a package version are reused for `VULN_TTL` seconds,
+after which the next scan asks again and re-matches every unchanged bundle
+against whatever has been published since.
+
+Fleet scans run in the background on a schedule (and on demand), and the
+latest result is kept so the UI can show it without waiting for a scan. It is
+also saved to `SCAN_SNAPSHOT_PATH`, so a restarted server starts from it and
+only scans once it is `SCAN_INTERVAL_HOURS` old, and a server running several
+processes serves the newest one any of them has finished. With
+`RESOLVE_DEPENDENCIES` on, a scan also resolves each distinct environment's
+dependency graph (see dependencies.py) and checks the indirect packages too.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+import traceback
+from datetime import datetime, timezone
+from typing import Optional
+
+import anyio
+import httpx
+from posit import connect
+
+from dependencies import attribute, environment_key
+from package_index import PackageIndex
+from vulns import match_package
+
+# The public Package Manager is always current. To scan against your own
+# instance instead, point this at "https://your-ppm/__api__/filter/packages".
+PPM_URL = "https://packagemanager.posit.co/__api__/filter/packages"
+
+# Cap how many package specifiers go in one Package Manager request so a large
+# deployment doesn't produce an unwieldy payload.
+PPM_QUERY_CHUNK = 100
+
+# How long (in seconds) a package version's advisories are reused before
+# Package Manager is asked again.
+VULN_TTL = 3600
+
+# Hours between background fleet scans; 0 turns the schedule off, leaving only
+# scans requested from the UI.
+SCAN_INTERVAL_HOURS = float(os.getenv("SCAN_INTERVAL_HOURS", "24"))
+
+# Where the latest scan is saved. A restarted server starts from it, so point
+# this at persistent storage to survive redeploys.
+SCAN_SNAPSHOT_PATH = os.getenv(
+    "SCAN_SNAPSHOT_PATH",
+    os.path.join(tempfile.gettempdir(), "package-vulnerability-scanner-scan.json"),
+)
+
+# Also scan the packages that content's packages depend on. Off by default:
+# it asks Package Manager to resolve every distinct environment on the server.
+RESOLVE_DEPENDENCIES = os.getenv("RESOLVE_DEPENDENCIES", "").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# How many environments are resolved against Package Manager at once.
+RESOLVE_CONCURRENCY = 4
+
+# How many blocking Connect API calls may run at once, across every request
+# and the background scan. posit-sdk blocks, so each call holds a worker thread.
+CONNECT_CONCURRENCY = int(os.getenv("CONNECT_CONCURRENCY", "16"))
+
+# How many content items a fleet scan reads packages for at once. Kept below
+# CONNECT_CONCURRENCY so viewers' requests still get through during a scan.
+SCAN_CONCURRENCY = 8
+
+_connect_limiter = anyio.CapacityLimiter(CONNECT_CONCURRENCY)
+
+# guid -> (bundle_id, packages). Only the latest bundle is kept per item, so
+# redeploys replace their entry instead of accumulating.
+_bundle_packages: dict[str, tuple[Optional[str], list[dict]]] = {}
+
+# (repo, "name==version") -> (fetched at, that package's advisories)
+_advisories: dict[tuple[str, str], tuple[float, list[dict]]] = {}
+
+# (repo, environment_key) -> the indirect packages of that environment. A
+# pinned package set always resolves the same way, so these are kept for as
+# long as some content is still deployed with that exact environment.
+_environments: dict[tuple[str, tuple[str, ...]], list[dict]] = {}
+
+
+async def call_connect(fn, *args):
+    """Run a blocking posit-sdk call on a worker thread.
+
+    Keeps the event loop free for other requests while Connect answers, and
+    queues calls past CONNECT_CONCURRENCY instead of piling them onto Connect.
+    """
+    return await anyio.to_thread.run_sync(fn, *args, limiter=_connect_limiter)
+
+
+def get_packages(
+    client: connect.Client, guid: str, bundle_id: Optional[str] = None
+) -> list[dict]:
+    """Installed packages for a content item, fetched once per bundle.
+
+    Pass the bundle_id the caller last saw to reuse the stored packages when
+    the item hasn't been redeployed; without it, Connect is always asked.
+    """
+    cached = _bundle_packages.get(guid)
+    if bundle_id is not None and cached is not None and cached[0] == bundle_id:
+        return cached[1]
+
+    content = client.content.get(guid)
+    packages = list(content.packages)
+    _bundle_packages[guid] = (content.get("bundle_id"), packages)
+    return packages
+
+
+def _ndjson(response: httpx.Response) -> list[dict]:
+    return [json.loads(line) for line in response.text.split("\n") if line.strip()]
+
+
+async def _fetch_advisories(repo: str, specs: list[str]) -> None:
+    # Package Manager answers per package name with every advisory it has, so
+    # each spec is stored with its name's advisories.
+    fetched_at = time.time()
+    found_by_name: dict[str, dict[str, dict]] = {}
+    async with httpx.AsyncClient() as http:
+        for start in range(0, len(specs), PPM_QUERY_CHUNK):
+            payload = {
+                "repo": repo,
+                "names": specs[start : start + PPM_QUERY_CHUNK],
+                "omit_downloads": True,
+                "omit_dependencies": True,
+            }
+            response = await http.post(PPM_URL, json=payload)
+            response.raise_for_status()
+            for found in _ndjson(response):
+                for vuln in found.get("vulns") or []:
+                    found_by_name.setdefault(found["name"], {})[vuln["id"]] = vuln
+
+    for spec in specs:
+        name = spec.partition("==")[0]
+        advisories = list(found_by_name.get(name, {}).values())
+        _advisories[(repo, spec)] = (fetched_at, advisories)
+
+
+async def _resolve_environment(http, semaphore, repo: str, key: tuple) -> None:
+    # The whole environment goes in one request so it resolves as a unit.
+    async with semaphore:
+        payload = {
+            "repo": repo,
+            "names": list(key),
+            "omit_downloads": True,
+            "omit_dependencies": False,
+        }
+        response = await http.post(PPM_URL, json=payload)
+        response.raise_for_status()
+    records = _ndjson(response)
+
+    # The resolved packages come with their advisories, so store those for
+    # match_vulns rather than asking for them again.
+    fetched_at = time.time()
+    for record in records:
+        if record.get("name") and record.get("version") and "vulns" in record:
+            spec = f"{record['name']}=={record['version']}"
+            _advisories[(repo, spec)] = (fetched_at, record["vulns"] or [])
+
+    direct = [spec.partition("==")[0] for spec in key]
+    _environments[(repo, key)] = attribute(repo, direct, records)
+
+
+async def resolve_environments(environments: set[tuple[str, tuple]]) -> None:
+    """Resolve the (repo, environment_key) environments not already known.
+
+    Environments no longer in use are forgotten. One that fails to resolve is
+    reported and left out, so its content is scanned for direct packages only.
+    """
+    for cached in [k for k in _environments if k not in environments]:
+        del _environments[cached]
+
+    missing = sorted(k for k in environments if k not in _environments)
+    if not missing:
+        return
+    semaphore = asyncio.Semaphore(RESOLVE_CONCURRENCY)
+    async with httpx.AsyncClient() as http:
+        results = await asyncio.gather(
+            *(
+                _resolve_environment(http, semaphore, repo, key)
+                for repo, key in missing
+            ),
+            return_exceptions=True,
+        )
+    for (repo, key), result in zip(missing, results):
+        if isinstance(result, Exception):
+            print(f"Error resolving a {repo} environment of {len(key)} packages:")
+            traceback.print_exception(type(result), result, result.__traceback__)
+
+
+async def match_vulns(repo: str, specifiers: list[str]) -> dict[str, dict[str, dict]]:
+    """Resolve "name==version" specifiers to the vulnerabilities affecting them.
+
+    Returns name -> version -> {vulnerabilities, latest_fixed_version}, for the
+    vulnerable versions only. Only specifiers not seen within `VULN_TTL` are
+    sent to Package Manager.
+    """
+    # Expire old answers first, which also drops packages no longer deployed.
+    now = time.time()
+    for key in [k for k, (at, _) in _advisories.items() if now - at > VULN_TTL]:
+        del _advisories[key]
+
+    specs = sorted(set(specifiers))
+    stale = [spec for spec in specs if (repo, spec) not in _advisories]
+    if stale:
+        await _fetch_advisories(repo, stale)
+
+    matched: dict[str, dict[str, dict]] = {}
+    for spec in specs:
+        name, _, version = spec.partition("==")
+        advisories = _advisories.get((repo, spec), (0, []))[1]
+        if not advisories:
+            continue
+        details = match_package(repo, version, advisories)
+        if details:
+            matched.setdefault(name, {})[version] = details
+    return matched
+
+
+# Package Manager repo for each content package language.
+LANGUAGE_REPOS = {"python": "pypi", "r": "cran"}
+
+# The most recent completed fleet scan and its package -> content index, the
+# running scan (if any), and why the last attempt failed (if it did).
+latest_scan: Optional[dict] = None
+latest_index = PackageIndex()
+_scan_task: Optional[asyncio.Task] = None
+_scan_error: Optional[str] = None
+# The modification time of the snapshot file latest_scan was read from or
+# written to, to notice when another process has saved a newer one.
+_snapshot_mtime: Optional[float] = None
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+async def _scan_item(client, item, semaphore) -> dict:
+    entry = {
+        "guid": item["guid"],
+        "title": item.get("title"),
+        "owner_guid": item.get("owner_guid"),
+        "bundle_id": item.get("bundle_id"),
+        "last_deployed_time": item.get("last_deployed_time"),
+        "packages": [],
+        # Indirect packages, each with the direct packages it comes "via".
+        # Only filled in when RESOLVE_DEPENDENCIES is on.
+        "dependencies": [],
+        "error": None,
+    }
+    if entry["bundle_id"] is None:
+        entry["error"] = "This content has not been fully deployed."
+        return entry
+    async with semaphore:
+        try:
+            entry["packages"] = await call_connect(
+                get_packages, client, entry["guid"], entry["bundle_id"]
+            )
+        except Exception as e:
+            entry["error"] = f"Error fetching packages: {e}"
+    return entry
+
+
+def _environments_of(entry: dict) -> dict[str, tuple[str, tuple]]:
+    # language -> (repo, environment_key) for each language the item installs.
+    specs: dict[str, list[str]] = {}
+    for pkg in entry["packages"]:
+        if LANGUAGE_REPOS.get(pkg["language"].lower()):
+            specs.setdefault(pkg["language"], []).append(
+                f"{pkg['name']}=={pkg['version']}"
+            )
+    return {
+        language: (LANGUAGE_REPOS[language.lower()], environment_key(found))
+        for language, found in specs.items()
+    }
+
+
+async def _add_dependencies(entries: list[dict]) -> None:
+    # Resolve each distinct environment once, however many items share it.
+    by_guid = {entry["guid"]: _environments_of(entry) for entry in entries}
+    await resolve_environments(
+        {env for envs in by_guid.values() for env in envs.values()}
+    )
+    for entry in entries:
+        entry["dependencies"] = [
+            {**dep, "language": language}
+            for language, env in by_guid[entry["guid"]].items()
+            for dep in _environments.get(env, [])
+        ]
+
+
+async def _scan_fleet(client: connect.Client) -> Optional[dict]:
+    global latest_scan, latest_index, _scan_error
+    started_at = _now()
+    try:
+        items = await call_connect(client.content.find)
+        semaphore = asyncio.Semaphore(SCAN_CONCURRENCY)
+        entries = await asyncio.gather(
+            *(_scan_item(client, item, semaphore) for item in items)
+        )
+
+        if RESOLVE_DEPENDENCIES:
+            await _add_dependencies(entries)
+
+        # Gather the versions to look up.
+        installed: dict[str, set[str]] = {"pypi": set(), "cran": set()}
+        for entry in entries:
+            for pkg in entry["packages"]:
+                repo = LANGUAGE_REPOS.get(pkg["language"].lower())
+                if repo:
+                    installed[repo].add(f"{pkg['name']}=={pkg['version']}")
+            for dep in entry["dependencies"]:
+                repo = LANGUAGE_REPOS[dep["language"].lower()]
+                installed[repo].add(f"{dep['name']}=={dep['version']}")
+        pypi, cran = await asyncio.gather(
+            match_vulns("pypi", list(installed["pypi"])),
+            match_vulns("cran", list(installed["cran"])),
+        )
+
+        scan = {
+            "started_at": started_at,
+            "finished_at": _now(),
+            "content": {entry["guid"]: entry for entry in entries},
+            "vulns": {"pypi": pypi, "cran": cran},
+        }
+        latest_scan, latest_index = scan, _index(scan)
+        _scan_error = None
+    except Exception as e:
+        # Keep serving the previous scan; the error is reported in the status.
+        traceback.print_exc()
+        _scan_error = str(e)
+        return latest_scan
+
+    try:
+        await anyio.to_thread.run_sync(save_snapshot, scan)
+    except OSError:
+        # This process still serves the scan; it just won't survive a restart.
+        traceback.print_exc()
+    return latest_scan
+
+
+def _index(scan: dict) -> PackageIndex:
+    # Which content has each direct package installed.
+    index = PackageIndex()
+    for entry in scan["content"].values():
+        for pkg in entry["packages"]:
+            repo = LANGUAGE_REPOS.get(pkg["language"].lower())
+            if repo:
+                index.add(repo, pkg["name"], pkg["version"], entry["guid"])
+    return index
+
+
+def save_snapshot(scan: dict) -> None:
+    """Save `scan` to SCAN_SNAPSHOT_PATH.
+
+    The file is replaced whole, so another process never reads a partial one.
+    """
+    global _snapshot_mtime
+    tmp = f"{SCAN_SNAPSHOT_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(scan, f)
+    os.replace(tmp, SCAN_SNAPSHOT_PATH)
+    _snapshot_mtime = os.stat(SCAN_SNAPSHOT_PATH).st_mtime
+
+
+def load_snapshot() -> None:
+    """Adopt the saved scan if it is newer than the one this process has."""
+    global latest_scan, latest_index, _snapshot_mtime
+    try:
+        mtime = os.stat(SCAN_SNAPSHOT_PATH).st_mtime
+        if mtime == _snapshot_mtime:
+            return
+        with open(SCAN_SNAPSHOT_PATH) as f:
+            scan = json.load(f)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError):
+        # An unreadable snapshot is no worse than none; the next scan replaces it.
+        traceback.print_exc()
+        return
+    _snapshot_mtime = mtime
+    if latest_scan is None or scan["finished_at"] > latest_scan["finished_at"]:
+        latest_scan, latest_index = scan, _index(scan)
+
+
+async def current_scan() -> Optional[dict]:
+    """The latest scan any process has finished, or None."""
+    await anyio.to_thread.run_sync(load_snapshot)
+    return latest_scan
+
+
+def start_scan(client: connect.Client) -> asyncio.Task:
+    """Start a fleet scan, or join the one already running.
+
+    Concurrent requests (several open tabs, or a request landing during a
+    scheduled scan) all share one scan instead of each starting their own.
+    """
+    global _scan_task
+    if _scan_task is None or _scan_task.done():
+        _scan_task = asyncio.create_task(_scan_fleet(client))
+    return _scan_task
+
+
+def scan_summary(scan: dict) -> dict:
+    """When `scan` ran and what it found, without its per-content packages."""
+    return {
+        "started_at": scan["started_at"],
+        "finished_at": scan["finished_at"],
+        "content_count": len(scan["content"]),
+        "error_count": sum(1 for entry in scan["content"].values() if entry["error"]),
+        "vulnerable_packages": {
+            repo: len(found) for repo, found in scan["vulns"].items()
+        },
+    }
+
+
+def scan_status() -> dict:
+    """Whether this process is scanning, and a summary of the latest scan.
+
+    Call `current_scan` first to pick up a scan another process has saved.
+    """
+    return {
+        "running": _scan_task is not None and not _scan_task.done(),
+        "error": _scan_error,
+        "scan": scan_summary(latest_scan) if latest_scan else None,
+    }
+
+
+def _scan_age() -> float:
+    # Seconds since the latest scan finished; infinite when there isn't one.
+    if latest_scan is None:
+        return float("inf")
+    finished = datetime.fromisoformat(latest_scan["finished_at"])
+    return (datetime.now(timezone.utc) - finished).total_seconds()
+
+
+async def run_scheduled_scans(client: connect.Client) -> None:
+    """Scan the fleet whenever the latest scan is `SCAN_INTERVAL_HOURS` old.
+
+    A saved scan counts, so restarting the server (or starting another of its
+    processes) doesn't rescan a fleet that was just scanned.
+    """
+    interval = SCAN_INTERVAL_HOURS * 3600
+    while True:
+        await current_scan()
+        wait = interval - _scan_age()
+        if wait <= 0:
+            await start_scan(client)
+            # After a failed scan the latest one is still stale; retry after an
+            # interval rather than straight away.
+            wait = interval
+        await asyncio.sleep(wait)
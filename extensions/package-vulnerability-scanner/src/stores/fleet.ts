@@ -0,0 +1,49 @@
+// The rows and view shared by the scanner store and its worker
+// (fleet.worker.ts), and the filtering and sorting both of them apply.
+
+export interface FleetRow {
+  guid: string;
+  // Position in the content list, so equal rows keep the server's order.
+  position: number;
+  lastDeployedTime: number;
+  vulnerabilityCount: number;
+}
+
+export interface FleetView {
+  filter: "all" | "vulnerable";
+  sortBy: "last-deployment-date" | "vulnerabilities";
+  sortOrder: "asc" | "desc";
+}
+
+export type FleetRequest =
+  | { type: "upsert"; rows: FleetRow[] }
+  | { type: "remove"; guids: string[] }
+  | { type: "view"; view: FleetView };
+
+export interface FleetResult {
+  order: string[];
+  totalVulnerabilities: number;
+  contentWithVulnerabilities: number;
+}
+
+// The guids of `rows` in `view`'s filter and sort order.
+export function sortedOrder(
+  rows: Iterable<FleetRow>,
+  view: FleetView,
+): string[] {
+  let selected = [...rows];
+  if (view.filter === "vulnerable") {
+    selected = selected.filter((row) => row.vulnerabilityCount > 0);
+  }
+
+  const key =
+    view.sortBy === "vulnerabilities"
+      ? (row: FleetRow) => row.vulnerabilityCount
+      : (row: FleetRow) => row.lastDeployedTime;
+  const direction = view.sortOrder === "desc" ? -1 : 1;
+
+  selected.sort(
+    (a, b) => direction * (key(a) - key(b)) || a.position - b.position,
+  );
+  return selected.map((row) => row.guid);
+}
@@ -0,0 +1,57 @@
+// Keeps the fleet-wide totals and the sorted, filtered content order off the
+// main thread. The scanner store sends only the rows that changed since its
+// last message, so a package fetch for one item costs one row update here
+// rather than a pass over every item on the page.
+
+import {
+  sortedOrder,
+  type FleetRequest,
+  type FleetResult,
+  type FleetRow,
+  type FleetView,
+} from "./fleet";
+
+const rows = new Map<string, FleetRow>();
+let view: FleetView = {
+  filter: "all",
+  sortBy: "last-deployment-date",
+  sortOrder: "desc",
+};
+let totalVulnerabilities = 0;
+let contentWithVulnerabilities = 0;
+
+// Adjust the running totals as one row leaves (-1) or joins (+1) the fleet.
+function count(row: FleetRow, sign: 1 | -1) {
+  totalVulnerabilities += sign * row.vulnerabilityCount;
+  if (row.vulnerabilityCount > 0) contentWithVulnerabilities += sign;
+}
+
+addEventListener("message", (event: MessageEvent<FleetRequest[]>) => {
+  // Requests arrive batched; apply them all before sorting once.
+  for (const request of event.data) {
+    if (request.type === "upsert") {
+      for (const row of request.rows) {
+        const previous = rows.get(row.guid);
+        if (previous) count(previous, -1);
+        rows.set(row.guid, row);
+        count(row, 1);
+      }
+    } else if (request.type === "remove") {
+      for (const guid of request.guids) {
+        const previous = rows.get(guid);
+        if (!previous) continue;
+        count(previous, -1);
+        rows.delete(guid);
+      }
+    } else {
+      view = request.view;
+    }
+  }
+
+  const result: FleetResult = {
+    order: sortedOrder(rows.values(), view),
+    totalVulnerabilities,
+    contentWithVulnerabilities,
+  };
+  (self as unknown as Worker).postMessage(result);
+});
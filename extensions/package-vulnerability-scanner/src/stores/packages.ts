@@ -6,10 +6,15 @@ export interface Package {
   language: string;
   name: string;
   version: string;
+  // For an indirect dependency, the content's own packages that require it.
+  via?: string[];
 }
 
 export interface ContentPackages {
   guid: string;
+  // The bundle these packages were read from; a different bundle_id on the
+  // content item means it was redeployed and needs rescanning.
+  bundleId: string | null;
   packages: Package[];
   isLoading: boolean;
   error: Error | null;
@@ -24,11 +29,15 @@ export const usePackagesStore = defineStore("packages", () => {
   const error = ref<Error | null>(null);
 
   // Fetch packages for a specific content ID
-  async function fetchPackagesForContent(contentId: string) {
+  async function fetchPackagesForContent(
+    contentId: string,
+    bundleId: string | null = null,
+  ) {
     if (!contentItems.value[contentId]) {
       // Initialize content item
       contentItems.value[contentId] = {
         guid: contentId,
+        bundleId,
         packages: [],
         isLoading: true,
         error: null,
@@ -37,12 +46,18 @@ export const usePackagesStore = defineStore("packages", () => {
       };
     } else {
       // Update existing content item loading state
+      contentItems.value[contentId].bundleId = bundleId;
       contentItems.value[contentId].isLoading = true;
       contentItems.value[contentId].error = null;
     }
 
     try {
-      const response = await fetch(`api/packages/${contentId}`);
+      // With the bundle_id, the server answers an unchanged bundle from the
+      // packages it stored on an earlier scan.
+      const url = bundleId
+        ? `api/packages/${contentId}?bundle_id=${encodeURIComponent(bundleId)}`
+        : `api/packages/${contentId}`;
+      const response = await fetch(url);
 
       if (!response.ok) {
         throw new Error(`HTTP error - Status: ${response.status}`);
@@ -68,9 +83,11 @@ export const usePackagesStore = defineStore("packages", () => {
     guid: string,
     packages: Package[],
     error: Error | null = null,
+    bundleId: string | null = null,
   ) {
     contentItems.value[guid] = {
       guid,
+      bundleId,
       packages,
       isLoading: false,
       error,
@@ -1,9 +1,27 @@
-import { ref, computed } from "vue";
+import { ref, computed, watch } from "vue";
 import { defineStore } from "pinia";
 
 import { useContentStore, type ContentListItem } from "./content";
-import { usePackagesStore, type Package } from "./packages";
-import { useVulnsStore, type Vulnerability } from "./vulns";
+import {
+  usePackagesStore,
+  type ContentPackages,
+  type Package,
+} from "./packages";
+import {
+  useVulnsStore,
+  type Vulnerability,
+  type VulnerabilityMap,
+} from "./vulns";
+import {
+  sortedOrder,
+  type FleetRequest,
+  type FleetResult,
+  type FleetRow,
+  type FleetView,
+} from "./fleet";
+
+// How often to check on a scan started with "Scan now".
+const SCAN_POLL_INTERVAL_MS = 2000;
 
 export interface DetailedPackage extends Package {
   vulnerabilities: Vulnerability[];
@@ -17,56 +35,227 @@ export interface Content extends ContentListItem {
   packageFetchError?: Error;
 }
 
+// One content item as recorded by a background fleet scan (the fields of
+// SCAN_CONTENT_FIELDS in main.py).
+export interface ScannedContent {
+  guid: string;
+  bundle_id: string | null;
+  packages: Package[];
+  // Indirect dependencies, when the server resolves them.
+  dependencies: Package[];
+  error: string | null;
+}
+
+export interface FleetScan {
+  started_at: string;
+  finished_at: string;
+  content: Record<string, ScannedContent>;
+  vulns: { pypi: VulnerabilityMap; cran: VulnerabilityMap };
+}
+
+// What GET api/scan reports about the latest scan; its results are fetched
+// separately, only when there is one.
+export interface ScanSummary {
+  started_at: string;
+  finished_at: string;
+  content_count: number;
+  error_count: number;
+  vulnerable_packages: { pypi: number; cran: number };
+}
+
+export interface ScanStatus {
+  running: boolean;
+  error: string | null;
+  scan: ScanSummary | null;
+}
+
 export const useScannerStore = defineStore("scanner", () => {
   const currentContent = ref<Content>();
 
+  // The latest background scan from the server, which seeds the packages and
+  // vulnerabilities so only content redeployed since then is scanned live.
+  const latestScan = ref<FleetScan | null>(null);
+  const isLoadingScan = ref(false);
+  const isScanRunning = ref(false);
+
+  // Each item's details are rebuilt only when one of its own inputs changes
+  // (its listing, its packages, or the vulnerability data), so a package
+  // fetch for one item doesn't redo the other couple of thousand.
+  const contentCache = new Map<string, { inputs: unknown[]; value: Content }>();
+
+  function buildContent(
+    content: ContentListItem,
+    pkgData: ContentPackages | undefined,
+    scanned: ScannedContent | undefined,
+  ): Content {
+    const vulnsStore = useVulnsStore();
+    let packages: DetailedPackage[] = [];
+
+    if (pkgData) {
+      // Indirect dependencies only come from the background scan, so only
+      // add them while the item is still on the bundle that was scanned.
+      const dependencies =
+        scanned && scanned.bundle_id === pkgData.bundleId
+          ? (scanned.dependencies ?? [])
+          : [];
+
+      packages = [...pkgData.packages, ...dependencies].map((pkg) => ({
+        ...pkg,
+        ...vulnsStore.getDetailsForPackageVersion(
+          pkg.name,
+          pkg.version,
+          pkg.language.toLowerCase() === "python" ? "pypi" : "cran",
+        ),
+      }));
+    }
+
+    const vulnerabilityCount = packages.reduce((acc, pkg) => {
+      return acc + pkg.vulnerabilities.length;
+    }, 0);
+
+    return {
+      ...content,
+      isLoadingPackages: pkgData === undefined ? true : pkgData.isLoading,
+      packageFetchError: pkgData?.error || undefined,
+      packages: packages,
+      vulnerabilityCount,
+    };
+  }
+
   const content = computed<Content[]>(() => {
     const contentStore = useContentStore();
     const packagesStore = usePackagesStore();
     const vulnsStore = useVulnsStore();
 
-    return contentStore.contentList.map<Content>((content) => {
-      let packages: DetailedPackage[] = [];
+    const seen = new Set<string>();
+    const result = contentStore.contentList.map<Content>((content) => {
       const pkgData = packagesStore.contentItems[content.guid];
+      const scanned = latestScan.value?.content[content.guid];
+      const inputs = [
+        content,
+        pkgData,
+        pkgData?.packages,
+        pkgData?.isLoading,
+        pkgData?.error,
+        pkgData?.bundleId,
+        scanned,
+        vulnsStore.pypi,
+        vulnsStore.cran,
+      ];
 
-      if (pkgData) {
-        packages = pkgData.packages.map((pkg) => ({
-          ...pkg,
-          ...vulnsStore.getDetailsForPackageVersion(
-            pkg.name,
-            pkg.version,
-            pkg.language.toLowerCase() === "python" ? "pypi" : "cran",
-          ),
-        }));
+      seen.add(content.guid);
+      const cached = contentCache.get(content.guid);
+      if (cached && cached.inputs.every((input, i) => input === inputs[i])) {
+        return cached.value;
       }
-
-      const vulnerabilityCount = packages.reduce((acc, pkg) => {
-        return acc + pkg.vulnerabilities.length;
-      }, 0);
-
-      return {
-        ...content,
-        isLoadingPackages: pkgData === undefined ? true : pkgData.isLoading,
-        packageFetchError: pkgData?.error || undefined,
-        packages: packages,
-        vulnerabilityCount,
-      };
+      const value = buildContent(content, pkgData, scanned);
+      contentCache.set(content.guid, { inputs, value });
+      return value;
     });
-  });
 
-  const contentWithVulnerabilities = computed<Content[]>(() => {
-    return content.value.filter((item) => item.vulnerabilityCount > 0);
+    for (const guid of contentCache.keys()) {
+      if (!seen.has(guid)) contentCache.delete(guid);
+    }
+    return result;
   });
 
+  const contentByGuid = computed(
+    () => new Map(content.value.map((item) => [item.guid, item])),
+  );
+
   const hasContent = computed<boolean>(() => {
     return content.value.length > 0;
   });
 
-  const totalVulnerabilities = computed<number>(() => {
-    return content.value.reduce(
-      (acc, item) => acc + item.vulnerabilityCount,
-      0,
-    );
+  // Totals, filtering and sorting happen in a web worker (fleet.worker.ts),
+  // which is sent only the rows that changed.
+  const view = ref<FleetView>({
+    filter: "all",
+    sortBy: "last-deployment-date",
+    sortOrder: "desc",
+  });
+  // The worker's latest order; null until it first replies.
+  const sortedGuids = ref<string[] | null>(null);
+  const totalVulnerabilities = ref(0);
+  const contentWithVulnerabilitiesCount = ref(0);
+
+  const worker = new Worker(new URL("./fleet.worker.ts", import.meta.url), {
+    type: "module",
+  });
+  worker.addEventListener("message", (event: MessageEvent<FleetResult>) => {
+    sortedGuids.value = event.data.order;
+    totalVulnerabilities.value = event.data.totalVulnerabilities;
+    contentWithVulnerabilitiesCount.value =
+      event.data.contentWithVulnerabilities;
+  });
+
+  // What the worker was last told about each item, to send only changes.
+  const sentRows = new Map<string, FleetRow>();
+  let pending: FleetRequest[] = [];
+
+  // Coalesce the requests made while handling one batch of store updates
+  // into a single message.
+  function send(request: FleetRequest) {
+    if (pending.length === 0) {
+      queueMicrotask(() => {
+        worker.postMessage(pending);
+        pending = [];
+      });
+    }
+    pending.push(request);
+  }
+
+  function toRow(item: Content, position: number): FleetRow {
+    return {
+      guid: item.guid,
+      position,
+      lastDeployedTime: new Date(item.last_deployed_time || 0).getTime(),
+      vulnerabilityCount: item.vulnerabilityCount,
+    };
+  }
+
+  watch(
+    content,
+    (items) => {
+      const changed: FleetRow[] = [];
+      const current = new Set<string>();
+      items.forEach((item, position) => {
+        current.add(item.guid);
+        const row = toRow(item, position);
+        const sent = sentRows.get(item.guid);
+        if (
+          !sent ||
+          sent.position !== row.position ||
+          sent.lastDeployedTime !== row.lastDeployedTime ||
+          sent.vulnerabilityCount !== row.vulnerabilityCount
+        ) {
+          changed.push(row);
+          sentRows.set(item.guid, row);
+        }
+      });
+
+      const removed = [...sentRows.keys()].filter((guid) => !current.has(guid));
+      removed.forEach((guid) => sentRows.delete(guid));
+
+      if (changed.length > 0) send({ type: "upsert", rows: changed });
+      if (removed.length > 0) send({ type: "remove", guids: removed });
+    },
+    { immediate: true },
+  );
+
+  watch(view, (value) => send({ type: "view", view: { ...value } }), {
+    deep: true,
+    immediate: true,
+  });
+
+  // The content in the current view's filter and sort order. Until the
+  // worker first replies, sort here so the list doesn't start out empty.
+  const sortedContent = computed<Content[]>(() => {
+    const order =
+      sortedGuids.value ?? sortedOrder(content.value.map(toRow), view.value);
+    return order
+      .map((guid) => contentByGuid.value.get(guid))
+      .filter((item): item is Content => item !== undefined);
   });
 
   const anyContentLoadingPackages = computed<boolean>(() => {
@@ -84,13 +273,105 @@ export const useScannerStore = defineStore("scanner", () => {
     );
   });
 
+  function applyLatestScan() {
+    const scan = latestScan.value;
+    if (!scan) return;
+
+    const packagesStore = usePackagesStore();
+    const vulnsStore = useVulnsStore();
+
+    for (const item of Object.values(scan.content)) {
+      packagesStore.setPackagesForContent(
+        item.guid,
+        item.packages,
+        item.error ? new Error(item.error) : null,
+        item.bundle_id,
+      );
+    }
+    vulnsStore.setVulns(scan.vulns, new Date(scan.finished_at));
+  }
+
+  async function setScanStatus(status: ScanStatus) {
+    isScanRunning.value = status.running;
+    if (
+      !status.scan ||
+      status.scan.finished_at === latestScan.value?.finished_at
+    ) {
+      return;
+    }
+
+    // The results are only sent when there is a scan we don't have yet.
+    const response = await fetch("api/scan/results");
+    if (!response.ok) {
+      throw new Error(`HTTP error! Status: ${response.status}`);
+    }
+    latestScan.value = await response.json();
+    applyLatestScan();
+  }
+
+  async function loadLatestScan() {
+    isLoadingScan.value = true;
+
+    try {
+      const response = await fetch("api/scan");
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! Status: ${response.status}`);
+      }
+
+      await setScanStatus(await response.json());
+    } catch (err) {
+      // Not fatal: without a stored scan the content is scanned live.
+      console.error("Error loading latest scan:", err);
+    } finally {
+      isLoadingScan.value = false;
+    }
+  }
+
+  // Ask the server to scan the whole fleet now and wait for the result. The
+  // server runs one scan at a time, so this joins any scan already running.
+  async function scanNow() {
+    isScanRunning.value = true;
+
+    try {
+      let response = await fetch("api/scan", { method: "POST" });
+      let status: ScanStatus = await response.json();
+
+      while (status.running) {
+        await new Promise((resolve) =>
+          setTimeout(resolve, SCAN_POLL_INTERVAL_MS),
+        );
+        response = await fetch("api/scan");
+        status = await response.json();
+      }
+
+      if (status.error) {
+        throw new Error(status.error);
+      }
+      await setScanStatus(status);
+    } catch (err) {
+      console.error("Error running scan:", err);
+    } finally {
+      isScanRunning.value = false;
+    }
+  }
+
   return {
     currentContent,
+    latestScan,
+    isLoadingScan,
+    isScanRunning,
     content,
-    contentWithVulnerabilities,
+    sortedContent,
+    view,
     hasContent,
     totalVulnerabilities,
+    contentWithVulnerabilitiesCount,
     anyContentLoadingPackages,
     scanInProgress,
+
+    loadLatestScan,
+    applyLatestScan,
+    scanNow,
   };
 });
@@ -1,28 +1,23 @@
 import { defineStore } from "pinia";
 import { ref } from "vue";
 
-export interface VulnerabilityEvent {
-  introduced?: string;
-  fixed?: string;
-}
-
-export interface VulnerabilityRange {
-  type: string;
-  events: VulnerabilityEvent[];
-}
-
 export interface Vulnerability {
   id: string;
-  versions: Record<string, any>;
-  ranges: VulnerabilityRange[];
   summary: string;
   details: string;
   modified: string;
   published: string;
 }
 
+// The server has already matched each installed version against its
+// advisories, so this is a lookup table rather than raw advisory data.
+export interface PackageVersionDetails {
+  vulnerabilities: Vulnerability[];
+  latest_fixed_version: string | null;
+}
+
 export interface VulnerabilityMap {
-  [packageName: string]: Vulnerability[];
+  [packageName: string]: { [version: string]: PackageVersionDetails };
 }
 
 // Installed packages to look up, as "name==version" grouped by Package Manager
@@ -60,12 +55,7 @@ export const useVulnsStore = defineStore("vulns", () => {
         throw new Error(`HTTP error! Status: ${response.status}`);
       }
 
-      const data = await response.json();
-
-      pypi.value = data.pypi || {};
-      cran.value = data.cran || {};
-      isFetched.value = true;
-      lastFetchTime.value = new Date();
+      setVulns(await response.json());
     } catch (err) {
       console.error("Error fetching vulnerabilities:", err);
       error.value = err as Error;
@@ -74,31 +64,15 @@ export const useVulnsStore = defineStore("vulns", () => {
     }
   }
 
-  // Extract the fixed version from the vulnerability ranges data
-  function getFixedVersion(vuln: Vulnerability): string | null {
-    if (
-      !vuln.ranges ||
-      !Array.isArray(vuln.ranges) ||
-      vuln.ranges.length === 0
-    ) {
-      return null;
-    }
-
-    let result: string | null = null;
-
-    const getFixedEventValue = (range: VulnerabilityRange): string | null => {
-      return range.events.find((e) => Boolean(e.fixed))?.fixed || null;
-    };
-
-    for (const range of vuln.ranges) {
-      if (range.type === "ECOSYSTEM" && range.events) {
-        return getFixedEventValue(range);
-      } else {
-        result = getFixedEventValue(range);
-      }
-    }
-
-    return result;
+  // Replace the matched vulnerabilities, e.g. with a background scan's.
+  function setVulns(
+    data: { pypi?: VulnerabilityMap; cran?: VulnerabilityMap },
+    fetchTime: Date = new Date(),
+  ) {
+    pypi.value = data.pypi || {};
+    cran.value = data.cran || {};
+    isFetched.value = true;
+    lastFetchTime.value = fetchTime;
   }
 
   function getDetailsForPackageVersion(
@@ -109,43 +83,12 @@ export const useVulnsStore = defineStore("vulns", () => {
     vulnerabilities: Vulnerability[];
     latestFixedVersion: string | null;
   } {
-    const vulns: Vulnerability[] = [];
-    const fixVersions: string[] = [];
     const vulnsMap = repo === "pypi" ? pypi.value : cran.value;
-
-    // If this package has known vulnerabilities
-    if (vulnsMap[packageName]) {
-      // For each vulnerability associated with this package
-      for (const vuln of vulnsMap[packageName]) {
-        // Check if the current package version is in the vulnerable versions
-        if (vuln.versions && vuln.versions[version]) {
-          const fixedVersion = getFixedVersion(vuln);
-          if (fixedVersion) {
-            fixVersions.push(fixedVersion);
-          }
-          vulns.push(vuln);
-        }
-      }
-    }
-
-    const sortedFixedVersions = fixVersions.sort((a, b) => {
-      const aParts = a.split(".");
-      const bParts = b.split(".");
-
-      for (let i = 0; i < Math.max(aParts.length, bParts.length); i++) {
-        const aNum = parseInt(aParts[i] || "0", 10);
-        const bNum = parseInt(bParts[i] || "0", 10);
-        if (aNum !== bNum) {
-          return bNum - aNum; // Descending order (latest first)
-        }
-      }
-
-      return 0;
-    });
+    const details = vulnsMap[packageName]?.[version];
 
     return {
-      vulnerabilities: vulns,
-      latestFixedVersion: sortedFixedVersions[0] ?? null,
+      vulnerabilities: details?.vulnerabilities ?? [],
+      latestFixedVersion: details?.latest_fixed_version ?? null,
     };
   }
 
@@ -160,6 +103,7 @@ export const useVulnsStore = defineStore("vulns", () => {
 
     // Actions
     fetchVulns,
+    setVulns,
     getDetailsForPackageVersion,
   };
 });
@@ -0,0 +1,42 @@
+from dependencies import attribute, environment_key
+
+
+def test_environment_key_ignores_order_and_duplicates():
+    assert environment_key(["b==1", "a==1", "b==1"]) == environment_key(
+        ["a==1", "b==1"]
+    )
+
+
+def test_attributes_indirect_packages_to_direct_ones():
+    records = [
+        {"name": "requests", "version": "2.31.0", "dependencies": ["urllib3>=1.21"]},
+        {"name": "httpx", "version": "0.28.1", "dependencies": [{"name": "idna"}]},
+        {"name": "urllib3", "version": "2.0.0", "dependencies": ["idna (>=2.5)"]},
+        {"name": "idna", "version": "3.6", "dependencies": []},
+    ]
+    assert attribute("pypi", ["requests", "httpx"], records) == [
+        {"name": "idna", "version": "3.6", "via": ["httpx", "requests"]},
+        {"name": "urllib3", "version": "2.0.0", "via": ["requests"]},
+    ]
+
+
+def test_direct_packages_are_not_indirect():
+    records = [
+        {"name": "requests", "version": "2.31.0", "dependencies": ["urllib3"]},
+        {"name": "urllib3", "version": "2.0.0", "dependencies": []},
+    ]
+    assert attribute("pypi", ["requests", "urllib3"], records) == []
+
+
+def test_skips_r_builtins_and_unresolved_packages():
+    records = [
+        {
+            "name": "shiny",
+            "version": "1.10.0",
+            "dependencies": ["R (>= 3.0.2)", "methods", "httpuv", "later"],
+        },
+        {"name": "httpuv", "version": "1.6.15", "dependencies": []},
+    ]
+    assert attribute("cran", ["shiny"], records) == [
+        {"name": "httpuv", "version": "1.6.15", "via": ["shiny"]},
+    ]
@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+
+import pytest
+
+import exports
+
+
+@pytest.fixture
+def scan():
+    vuln = {
+        "id": "GHSA-1",
+        "summary": "Leaks headers",
+        "details": "details",
+        "published": "2024-01-01T00:00:00Z",
+        "modified": "2024-01-02T00:00:00Z",
+    }
+    return {
+        "started_at": "2026-01-01T00:00:00+00:00",
+        "finished_at": "2026-01-01T00:05:00+00:00",
+        "content": {
+            "guid-1": {
+                "guid": "guid-1",
+                "title": "Sales App",
+                "owner_guid": "owner-1",
+                "bundle_id": "b1",
+                "last_deployed_time": "2025-12-01T00:00:00Z",
+                "packages": [
+                    {"name": "requests", "version": "2.31.0", "language": "Python"},
+                    {"name": "shiny", "version": "1.10.0", "language": "R"},
+                ],
+                "dependencies": [
+                    {
+                        "name": "urllib3",
+                        "version": "2.0.0",
+                        "language": "Python",
+                        "via": ["requests"],
+                    },
+                ],
+                "error": None,
+            },
+        },
+        "vulns": {
+            "pypi": {
+                "requests": {
+                    "2.31.0": {
+                        "vulnerabilities": [vuln],
+                        "latest_fixed_version": "2.32.0",
+                    }
+                }
+            },
+            "cran": {},
+        },
+    }
+
+
+def test_cyclonedx(scan):
+    bom = json.loads("".join(exports.cyclonedx(scan, scan["content"]["guid-1"])))
+    assert bom["bomFormat"] == "CycloneDX"
+    assert [c["purl"] for c in bom["components"]] == [
+        "pkg:pypi/requests@2.31.0",
+        "pkg:cran/shiny@1.10.0",
+        "pkg:pypi/urllib3@2.0.0",
+    ]
+    assert bom["vulnerabilities"][0]["id"] == "GHSA-1"
+    assert bom["vulnerabilities"][0]["affects"] == [{"ref": "pkg:pypi/requests@2.31.0"}]
+
+
+def test_cyclonedx_recommends_a_fix_for_every_affected_package(scan):
+    # One advisory affecting both a direct and an indirect package.
+    vulns = scan["vulns"]["pypi"]
+    vulns["urllib3"] = {
+        "2.0.0": {
+            "vulnerabilities": vulns["requests"]["2.31.0"]["vulnerabilities"],
+            "latest_fixed_version": "2.2.2",
+        }
+    }
+    bom = json.loads("".join(exports.cyclonedx(scan, scan["content"]["guid-1"])))
+    [vuln] = bom["vulnerabilities"]
+    assert vuln["affects"] == [
+        {"ref": "pkg:pypi/requests@2.31.0"},
+        {"ref": "pkg:pypi/urllib3@2.0.0"},
+    ]
+    assert vuln["recommendation"] == (
+        "Upgrade requests to 2.32.0 or later. "
+        "Upgrade urllib3 to 2.2.2 or later (required by requests)."
+    )
+
+
+def test_spdx(scan):
+    doc = json.loads("".join(exports.spdx(scan, scan["content"]["guid-1"])))
+    assert doc["spdxVersion"] == "SPDX-2.3"
+    assert doc["creationInfo"]["created"] == "2026-01-01T00:05:00Z"
+    assert len(doc["packages"]) == 4
+    assert {
+        "spdxElementId": "SPDXRef-Package-0",
+        "relationshipType": "DEPENDS_ON",
+        "relatedSpdxElement": "SPDXRef-Package-2",
+    } in doc["relationships"]
+
+
+def test_fleet_csv(scan):
+    rows = list(csv.DictReader(io.StringIO("".join(exports.fleet_csv(scan)))))
+    assert [(r["package"], r["vulnerability_id"]) for r in rows] == [
+        ("requests", "GHSA-1"),
+        ("shiny", ""),
+        ("urllib3", ""),
+    ]
+    assert rows[0]["latest_fixed_version"] == "2.32.0"
+    assert [r["dependency_of"] for r in rows] == ["", "", "requests"]
+
+
+def test_fleet_csv_streams_in_chunks(scan, monkeypatch):
+    monkeypatch.setattr(exports, "CSV_CHUNK_SIZE", 1)
+    assert len(list(exports.fleet_csv(scan))) > 2
@@ -0,0 +1,52 @@
+import pytest
+
+from package_index import PackageIndex
+
+
+@pytest.fixture
+def index():
+    index = PackageIndex()
+    index.add("pypi", "requests", "2.31.0", "guid-1")
+    index.add("pypi", "requests", "2.31.0", "guid-2")
+    index.add("pypi", "requests", "2.32.3", "guid-3")
+    index.add("pypi", "requests-oauthlib", "1.3.1", "guid-1")
+    index.add("pypi", "Jinja2", "3.1.4", "guid-2")
+    index.add("cran", "shiny", "1.10.0", "guid-4")
+    return index
+
+
+def test_exact_name(index):
+    results = index.find("pypi", name="requests")
+    assert [(r["version"], r["guids"]) for r in results] == [
+        ("2.32.3", ["guid-3"]),
+        ("2.31.0", ["guid-1", "guid-2"]),
+    ]
+
+
+def test_names_are_normalized(index):
+    results = index.find("pypi", name="jinja2")
+    assert results[0]["name"] == "Jinja2"
+    assert index.find("pypi", name="Requests_OAuthlib")[0]["version"] == "1.3.1"
+
+
+def test_prefix(index):
+    names = {r["name"] for r in index.find("pypi", prefix="req")}
+    assert names == {"requests", "requests-oauthlib"}
+    assert index.find("pypi", prefix="zzz") == []
+
+
+def test_version_range(index):
+    results = index.find("pypi", name="requests", versions="<2.32")
+    assert [r["version"] for r in results] == ["2.31.0"]
+    results = index.find("cran", name="shiny", versions=">=1.9.1, <2.0")
+    assert [r["version"] for r in results] == ["1.10.0"]
+
+
+def test_requires_name_or_prefix(index):
+    with pytest.raises(ValueError):
+        index.find("pypi")
+
+
+def test_invalid_range(index):
+    with pytest.raises(ValueError):
+        index.find("cran", name="shiny", versions="about 1.0")
@@ -0,0 +1,268 @@
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+
+import scans
+
+
+@pytest.fixture(autouse=True)
+def empty_caches(monkeypatch, tmp_path):
+    monkeypatch.setattr(scans, "_bundle_packages", {})
+    monkeypatch.setattr(scans, "_advisories", {})
+    monkeypatch.setattr(scans, "_environments", {})
+    monkeypatch.setattr(scans, "latest_scan", None)
+    monkeypatch.setattr(scans, "_scan_task", None)
+    monkeypatch.setattr(scans, "_scan_error", None)
+    monkeypatch.setattr(scans, "_snapshot_mtime", None)
+    monkeypatch.setattr(scans, "SCAN_SNAPSHOT_PATH", str(tmp_path / "scan.json"))
+
+
+def make_client(bundle_id="b1", packages=None):
+    content = MagicMock()
+    content.get.return_value = bundle_id
+    content.packages = packages or [{"name": "requests", "version": "2.31.0"}]
+    client = MagicMock()
+    client.content.get.return_value = content
+    return client
+
+
+class TestGetPackages:
+    def test_reuses_packages_for_unchanged_bundle(self):
+        client = make_client("b1")
+        scans.get_packages(client, "guid-1", "b1")
+        scans.get_packages(client, "guid-1", "b1")
+        assert client.content.get.call_count == 1
+
+    def test_refetches_after_redeploy(self):
+        client = make_client("b1")
+        scans.get_packages(client, "guid-1", "b1")
+        client.content.get.return_value.get.return_value = "b2"
+        scans.get_packages(client, "guid-1", "b2")
+        assert client.content.get.call_count == 2
+
+    def test_refetches_without_bundle_id(self):
+        client = make_client("b1")
+        scans.get_packages(client, "guid-1", "b1")
+        scans.get_packages(client, "guid-1")
+        assert client.content.get.call_count == 2
+
+
+class TestMatchVulns:
+    def test_only_queries_unseen_specs(self, monkeypatch):
+        queried = []
+
+        async def fake_fetch(repo, specs):
+            queried.append(list(specs))
+            for spec in specs:
+                scans._advisories[(repo, spec)] = (
+                    scans.time.time(),
+                    [{"id": "GHSA-1", "versions": {"2.31.0": True}, "ranges": []}],
+                )
+
+        monkeypatch.setattr(scans, "_fetch_advisories", fake_fetch)
+
+        first = asyncio.run(scans.match_vulns("pypi", ["requests==2.31.0"]))
+        second = asyncio.run(
+            scans.match_vulns("pypi", ["requests==2.31.0", "requests==2.32.0"])
+        )
+
+        assert queried == [["requests==2.31.0"], ["requests==2.32.0"]]
+        assert list(first["requests"]) == ["2.31.0"]
+        assert list(second["requests"]) == ["2.31.0"]
+
+    def test_expired_advisories_are_refetched(self, monkeypatch):
+        scans._advisories[("pypi", "requests==2.31.0")] = (0, [])
+        queried = []
+
+        async def fake_fetch(repo, specs):
+            queried.extend(specs)
+
+        monkeypatch.setattr(scans, "_fetch_advisories", fake_fetch)
+        asyncio.run(scans.match_vulns("pypi", ["requests==2.31.0"]))
+        assert queried == ["requests==2.31.0"]
+
+
+class TestFleetScan:
+    @pytest.fixture
+    def fleet_client(self):
+        client = make_client(
+            "b1", [{"name": "requests", "version": "2.31.0", "language": "Python"}]
+        )
+        client.content.find.return_value = [
+            {"guid": "guid-1", "title": "App", "bundle_id": "b1"},
+            {"guid": "guid-2", "title": "Draft", "bundle_id": None},
+        ]
+        return client
+
+    @pytest.fixture(autouse=True)
+    def no_advisories(self, monkeypatch):
+        async def fake_match(repo, specifiers):
+            return {}
+
+        monkeypatch.setattr(scans, "match_vulns", fake_match)
+
+    def test_records_snapshot(self, fleet_client):
+        scan = asyncio.run(scans._scan_fleet(fleet_client))
+        assert scan is scans.latest_scan
+        assert scan["content"]["guid-1"]["packages"][0]["name"] == "requests"
+        assert scan["content"]["guid-2"]["error"]
+        assert scans.scan_status()["error"] is None
+
+    def test_concurrent_requests_share_one_scan(self, fleet_client):
+        async def request_twice():
+            first = scans.start_scan(fleet_client)
+            second = scans.start_scan(fleet_client)
+            await first
+            return first, second
+
+        first, second = asyncio.run(request_twice())
+        assert first is second
+        assert fleet_client.content.find.call_count == 1
+
+    def test_failed_scan_keeps_previous_snapshot(self, fleet_client):
+        previous = asyncio.run(scans._scan_fleet(fleet_client))
+        fleet_client.content.find.side_effect = RuntimeError("boom")
+        assert asyncio.run(scans._scan_fleet(fleet_client)) is previous
+        assert scans.scan_status()["error"] == "boom"
+
+    def test_status_summarizes_the_scan(self, fleet_client):
+        asyncio.run(scans._scan_fleet(fleet_client))
+        summary = scans.scan_status()["scan"]
+        assert summary["content_count"] == 2
+        assert summary["error_count"] == 1
+        assert summary["vulnerable_packages"] == {"pypi": 0, "cran": 0}
+        assert "content" not in summary
+
+    def test_saved_scan_is_picked_up_by_another_process(
+        self, monkeypatch, fleet_client
+    ):
+        scan = asyncio.run(scans._scan_fleet(fleet_client))
+        # A fresh process: nothing in memory yet.
+        monkeypatch.setattr(scans, "latest_scan", None)
+        monkeypatch.setattr(scans, "latest_index", scans.PackageIndex())
+        monkeypatch.setattr(scans, "_snapshot_mtime", None)
+
+        assert asyncio.run(scans.current_scan()) == scan
+        assert scans.latest_index.find("pypi", "requests", None, None)
+
+    def test_unreadable_snapshot_is_ignored(self):
+        with open(scans.SCAN_SNAPSHOT_PATH, "w") as f:
+            f.write("{not json")
+        assert asyncio.run(scans.current_scan()) is None
+
+
+class TestSchedule:
+    def run_schedule(self, monkeypatch, client):
+        # Run the scheduler until it first goes to sleep, recording how long.
+        slept = []
+
+        async def fake_sleep(seconds):
+            slept.append(seconds)
+            raise asyncio.CancelledError
+
+        monkeypatch.setattr(scans.asyncio, "sleep", fake_sleep)
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(scans.run_scheduled_scans(client))
+        return slept[0]
+
+    def test_fresh_saved_scan_is_not_rescanned(self, monkeypatch):
+        # Saved by an earlier run of the server.
+        with open(scans.SCAN_SNAPSHOT_PATH, "w") as f:
+            json.dump(
+                {
+                    "started_at": scans._now(),
+                    "finished_at": scans._now(),
+                    "content": {},
+                    "vulns": {"pypi": {}, "cran": {}},
+                },
+                f,
+            )
+        client = MagicMock()
+        wait = self.run_schedule(monkeypatch, client)
+        assert client.content.find.call_count == 0
+        assert 0 < wait <= scans.SCAN_INTERVAL_HOURS * 3600
+
+    def test_scans_without_a_saved_scan(self, monkeypatch):
+        client = make_client()
+        client.content.find.return_value = []
+        wait = self.run_schedule(monkeypatch, client)
+        assert client.content.find.call_count == 1
+        assert wait == scans.SCAN_INTERVAL_HOURS * 3600
+
+
+class TestDependencies:
+    @pytest.fixture
+    def resolved(self, monkeypatch):
+        monkeypatch.setattr(scans, "RESOLVE_DEPENDENCIES", True)
+        requests = []
+
+        async def fake_resolve(http, semaphore, repo, key):
+            requests.append(key)
+            scans._environments[(repo, key)] = [
+                {"name": "urllib3", "version": "2.0.0", "via": ["requests"]}
+            ]
+
+        monkeypatch.setattr(scans, "_resolve_environment", fake_resolve)
+        return requests
+
+    @pytest.fixture
+    def fleet_client(self):
+        client = make_client(
+            "b1", [{"name": "requests", "version": "2.31.0", "language": "Python"}]
+        )
+        client.content.find.return_value = [
+            {"guid": f"guid-{i}", "title": "Clone", "bundle_id": "b1"} for i in range(3)
+        ]
+        return client
+
+    def test_identical_environments_resolve_once(
+        self, monkeypatch, resolved, fleet_client
+    ):
+        looked_up = []
+
+        async def fake_match(repo, specifiers):
+            looked_up.extend(specifiers)
+            return {}
+
+        monkeypatch.setattr(scans, "match_vulns", fake_match)
+        scan = asyncio.run(scans._scan_fleet(fleet_client))
+
+        assert resolved == [("requests==2.31.0",)]
+        assert scan["content"]["guid-2"]["dependencies"] == [
+            {
+                "name": "urllib3",
+                "version": "2.0.0",
+                "via": ["requests"],
+                "language": "Python",
+            }
+        ]
+        assert sorted(looked_up) == ["requests==2.31.0", "urllib3==2.0.0"]
+
+    def test_unused_environments_are_forgotten(self, resolved):
+        asyncio.run(scans.resolve_environments({("pypi", ("a==1",))}))
+        asyncio.run(scans.resolve_environments({("pypi", ("b==1",))}))
+        assert list(scans._environments) == [("pypi", ("b==1",))]
+
+    def test_resolution_stores_advisories(self):
+        def handler(request):
+            lines = [
+                {"name": "requests", "version": "2.31.0", "dependencies": ["urllib3"]},
+                {"name": "urllib3", "version": "2.0.0", "vulns": [{"id": "GHSA-2"}]},
+            ]
+            return httpx.Response(200, text="\n".join(json.dumps(x) for x in lines))
+
+        async def resolve():
+            transport = httpx.MockTransport(handler)
+            async with httpx.AsyncClient(transport=transport) as http:
+                await scans._resolve_environment(
+                    http, asyncio.Semaphore(1), "pypi", ("requests==2.31.0",)
+                )
+
+        asyncio.run(resolve())
+        assert scans._environments[("pypi", ("requests==2.31.0",))] == [
+            {"name": "urllib3", "version": "2.0.0", "via": ["requests"]}
+        ]
+        assert scans._advisories[("pypi", "urllib3==2.0.0")][1] == [{"id": "GHSA-2"}]
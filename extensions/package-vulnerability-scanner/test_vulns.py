@@ -0,0 +1,150 @@
+import pytest
+
+from vulns import (
+    fixed_version,
+    is_affected,
+    match_package,
+    parse_version,
+    parse_version_range,
+)
+
+
+def make_vuln(vuln_id="GHSA-1", versions=None, ranges=None):
+    return {
+        "id": vuln_id,
+        "summary": "summary",
+        "details": "details",
+        "published": "2024-01-01T00:00:00Z",
+        "modified": "2024-01-02T00:00:00Z",
+        "versions": versions or {},
+        "ranges": ranges or [],
+    }
+
+
+def ecosystem(*events):
+    return {"type": "ECOSYSTEM", "events": list(events)}
+
+
+class TestParseVersion:
+    def test_pep440_ordering(self):
+        assert parse_version("pypi", "2.10.0") > parse_version("pypi", "2.9.1")
+        assert parse_version("pypi", "2.0.0rc1") < parse_version("pypi", "2.0.0")
+
+    def test_r_ordering(self):
+        assert parse_version("cran", "1.10-1") > parse_version("cran", "1.9-12")
+        assert parse_version("cran", "1.2.3") == (1, 2, 3)
+
+    def test_unparseable(self):
+        assert parse_version("pypi", "not a version") is None
+        assert parse_version("cran", "1.0.0rc1") is None
+        assert parse_version("pypi", "") is None
+
+
+class TestParseVersionRange:
+    def test_pep440_specifiers(self):
+        below_2_32 = parse_version_range("pypi", ">=2.0,<2.32")
+        assert below_2_32("2.31.0")
+        assert not below_2_32("2.32.0")
+        assert parse_version_range("pypi", "~=2.31.0")("2.31.5")
+        assert parse_version_range("pypi", ">=3.0.0rc1")("3.0.0rc1")
+
+    def test_r_comparisons(self):
+        assert parse_version_range("cran", ">1.9")("1.10-1")
+        assert not parse_version_range("cran", "<1.10-1")("1.10-1")
+        assert parse_version_range("cran", "==1.10.1")("1.10-1")
+
+    def test_unparseable_version_is_outside_every_range(self):
+        assert not parse_version_range("pypi", ">=0")("not a version")
+
+    def test_invalid_range(self):
+        with pytest.raises(ValueError):
+            parse_version_range("pypi", "about 1.0")
+        with pytest.raises(ValueError):
+            parse_version_range("cran", "~1.0")
+
+
+class TestIsAffected:
+    def test_trusts_versions_list(self):
+        vuln = make_vuln(
+            versions={"1.0.0": True},
+            ranges=[ecosystem({"introduced": "0"})],
+        )
+        assert is_affected(vuln, "pypi", "1.0.0")
+        assert not is_affected(vuln, "pypi", "1.1.0")
+
+    def test_falls_back_to_ranges(self):
+        vuln = make_vuln(ranges=[ecosystem({"introduced": "2.0"}, {"fixed": "2.31.1"})])
+        assert is_affected(vuln, "pypi", "2.31.0")
+        assert not is_affected(vuln, "pypi", "2.31.1")
+        assert not is_affected(vuln, "pypi", "1.9")
+
+    def test_last_affected_is_inclusive(self):
+        vuln = make_vuln(
+            ranges=[ecosystem({"introduced": "0"}, {"last_affected": "1.4-2"})]
+        )
+        assert is_affected(vuln, "cran", "1.4-2")
+        assert not is_affected(vuln, "cran", "1.4-3")
+
+
+class TestFixedVersion:
+    def test_lowest_fix_above_installed(self):
+        vuln = make_vuln(
+            ranges=[
+                ecosystem(
+                    {"introduced": "0"},
+                    {"fixed": "2.31.1"},
+                    {"introduced": "3.0.0"},
+                    {"fixed": "3.0.1"},
+                )
+            ]
+        )
+        assert fixed_version(vuln, "pypi", "2.30.0") == "2.31.1"
+        assert fixed_version(vuln, "pypi", "3.0.0") == "3.0.1"
+
+    def test_prefers_ecosystem_ranges(self):
+        vuln = make_vuln(
+            ranges=[
+                {"type": "GIT", "events": [{"fixed": "abc123"}]},
+                {"type": "SEMVER", "events": [{"fixed": "9.9.9"}]},
+                ecosystem({"introduced": "0"}, {"fixed": "1.2.0"}),
+            ]
+        )
+        assert fixed_version(vuln, "pypi", "1.0.0") == "1.2.0"
+
+    def test_no_fix(self):
+        vuln = make_vuln(ranges=[ecosystem({"introduced": "0"})])
+        assert fixed_version(vuln, "pypi", "1.0.0") is None
+
+
+class TestMatchPackage:
+    def test_unaffected_returns_none(self):
+        vuln = make_vuln(versions={"1.0.0": True})
+        assert match_package("pypi", "2.0.0", [vuln]) is None
+
+    def test_latest_fixed_version_across_vulns(self):
+        vulns = [
+            make_vuln(
+                "GHSA-1",
+                versions={"2.9.0": True},
+                ranges=[ecosystem({"introduced": "0"}, {"fixed": "2.9.1"})],
+            ),
+            make_vuln(
+                "GHSA-2",
+                versions={"2.9.0": True},
+                ranges=[ecosystem({"introduced": "0"}, {"fixed": "2.10.0"})],
+            ),
+        ]
+        result = match_package("pypi", "2.9.0", vulns)
+        assert [v["id"] for v in result["vulnerabilities"]] == ["GHSA-1", "GHSA-2"]
+        assert result["latest_fixed_version"] == "2.10.0"
+
+    def test_strips_matching_fields(self):
+        vuln = make_vuln(versions={"1.0": True})
+        result = match_package("cran", "1.0", [vuln])
+        assert set(result["vulnerabilities"][0]) == {
+            "id",
+            "summary",
+            "details",
+            "published",
+            "modified",
+        }
@@ -0,0 +1,181 @@
+"""Match installed package versions against Package Manager vulnerability data.
+
+Package Manager returns every known vulnerability for a package name, so the
+scan still has to decide which of them affect the exact installed version, and
+which release fixes them. Doing that here, with real PEP 440 (Python) and R
+version ordering, means the browser only renders a ready-made result.
+"""
+
+import operator
+import re
+from typing import Callable, Optional
+
+from packaging.specifiers import InvalidSpecifier, SpecifierSet
+from packaging.version import InvalidVersion, Version
+
+# The advisory fields the UI renders. Package Manager sends more (the full
+# affected-version list and ranges), which are only needed for matching.
+VULN_FIELDS = ("id", "summary", "details", "published", "modified")
+
+_R_VERSION = re.compile(r"^\d+([.-]\d+)*$")
+
+_COMPARISON = re.compile(r"^\s*(==|!=|>=|<=|>|<)\s*(\S+)\s*$")
+_COMPARE = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+
+
+def parse_version(repo: str, version: str):
+    """Return a sortable key for `version` in `repo`, or None if unparseable."""
+    if not version:
+        return None
+    if repo == "cran":
+        # R's package_version: integer components separated by "." or "-".
+        if not _R_VERSION.match(version):
+            return None
+        return tuple(int(part) for part in re.split(r"[.-]", version))
+    try:
+        return Version(version)
+    except InvalidVersion:
+        return None
+
+
+def parse_version_range(repo: str, spec: str) -> Callable[[str], bool]:
+    """Parse a comma-separated range like ">=2.0,<2.32" into a version test.
+
+    Python ranges are PEP 440 specifiers (so "~=2.31" and "==2.*" work too);
+    R ranges take the plain comparison operators. Raises ValueError for a
+    range that can't be parsed.
+    """
+    if repo == "pypi":
+        try:
+            specifier = SpecifierSet(spec, prereleases=True)
+        except InvalidSpecifier as e:
+            raise ValueError(f"Invalid version range '{spec}'") from e
+
+        def contains(version: str) -> bool:
+            installed = parse_version(repo, version)
+            return installed is not None and specifier.contains(installed)
+
+        return contains
+
+    bounds = []
+    for clause in spec.split(","):
+        match = _COMPARISON.match(clause)
+        bound = parse_version(repo, match.group(2)) if match else None
+        if bound is None:
+            raise ValueError(f"Invalid version range '{spec}'")
+        bounds.append((_COMPARE[match.group(1)], bound))
+
+    def contains(version: str) -> bool:
+        installed = parse_version(repo, version)
+        return installed is not None and all(
+            compare(installed, bound) for compare, bound in bounds
+        )
+
+    return contains
+
+
+def _in_range(repo: str, installed, events: list[dict]) -> bool:
+    # OSV range events are ordered: each "introduced" opens an affected span,
+    # closed by the next "fixed" (exclusive) or "last_affected" (inclusive).
+    affected = False
+    for event in events:
+        if "introduced" in event:
+            start = event["introduced"]
+            if start == "0":
+                affected = True
+            else:
+                key = parse_version(repo, start)
+                if key is not None and installed >= key:
+                    affected = True
+        elif "fixed" in event:
+            key = parse_version(repo, event["fixed"])
+            if key is not None and installed >= key:
+                affected = False
+        elif "last_affected" in event:
+            key = parse_version(repo, event["last_affected"])
+            if key is not None and installed > key:
+                affected = False
+    return affected
+
+
+def is_affected(vuln: dict, repo: str, version: str) -> bool:
+    """Whether `vuln` affects the installed `version` of its package."""
+    # Package Manager enumerates the affected releases; trust that list when
+    # present and fall back to evaluating the ranges only without it.
+    versions = vuln.get("versions")
+    if versions:
+        return bool(versions.get(version))
+
+    installed = parse_version(repo, version)
+    if installed is None:
+        return False
+    return any(
+        _in_range(repo, installed, r.get("events") or [])
+        for r in vuln.get("ranges") or []
+        if r.get("type") != "GIT"
+    )
+
+
+def fixed_version(vuln: dict, repo: str, version: str) -> Optional[str]:
+    """The earliest release that fixes `vuln` for someone on `version`.
+
+    Advisories often list one fix per release branch (e.g. 2.31.1 and 3.0.1),
+    so pick the lowest fix above the installed version rather than whichever
+    happens to be listed first.
+    """
+    ranges = vuln.get("ranges") or []
+    # Prefer the ecosystem's own versions over SEMVER or GIT ranges.
+    ecosystem = [r for r in ranges if r.get("type") == "ECOSYSTEM"]
+    fixes = [
+        event["fixed"]
+        for r in ecosystem or ranges
+        if r.get("type") != "GIT"
+        for event in r.get("events") or []
+        if event.get("fixed")
+    ]
+    keyed = [(parse_version(repo, fix), fix) for fix in fixes]
+    keyed = [(key, fix) for key, fix in keyed if key is not None]
+    if not keyed:
+        return fixes[0] if fixes else None
+
+    installed = parse_version(repo, version)
+    if installed is not None:
+        above = [(key, fix) for key, fix in keyed if key > installed]
+        if above:
+            return min(above)[1]
+    return max(keyed)[1]
+
+
+def latest_version(repo: str, versions: list[str]) -> Optional[str]:
+    """The highest of `versions` by `repo` ordering (unparseable ones last)."""
+    keyed = [(parse_version(repo, v), v) for v in versions]
+    parsed = [(key, v) for key, v in keyed if key is not None]
+    if parsed:
+        return max(parsed)[1]
+    return versions[0] if versions else None
+
+
+def match_package(repo: str, version: str, vulns: list[dict]) -> Optional[dict]:
+    """Resolve the vulnerabilities affecting one installed package version.
+
+    Returns None when the version is unaffected, so callers can keep only the
+    vulnerable packages in the response.
+    """
+    matched = [vuln for vuln in vulns if is_affected(vuln, repo, version)]
+    if not matched:
+        return None
+    fixes = [fixed_version(vuln, repo, version) for vuln in matched]
+    return {
+        "vulnerabilities": [
+            {field: vuln.get(field) for field in VULN_FIELDS} for vuln in matched
+        ],
+        # Upgrading to the highest of the per-vulnerability fixes clears them all.
+        "latest_fixed_version": latest_version(repo, [f for f in fixes if f]),
+    }
@@ -0,0 +1,258 @@
+"""Measure how many concurrent MCP tool calls the server sustains.
+
+Starts the app under uvicorn, pointed at a fake Connect server run in this
+process whose calls each take `--connect-delay` seconds. At each concurrency
+level, that many simulated viewers call `list_known_datasets`,
+`calculate_summary_statistics` and `connect_whoami` in turn over the
+streamable-HTTP endpoint for `--duration` seconds, each with their own session
+token, the way the companion chat calls on behalf of its viewers.
+
+    uv run python benchmark.py --concurrency 1 10 50 --workers 1 4
+
+Prints one JSON object per worker count and concurrency level, with requests
+per second, latency percentiles overall and by tool, the server's memory (the
+resident set of uvicorn and every process under it, on Linux), and how many
+token exchanges and /me calls reached Connect. Run it with
+`CACHE_BACKEND=sqlite` to see the exchanges stay flat as workers are added.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import ClassVar
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+TOOLS = (
+    ("list_known_datasets", {}),
+    ("calculate_summary_statistics", {"dataset_name": "iris"}),
+    ("connect_whoami", {}),
+)
+
+
+class FakeConnect(BaseHTTPRequestHandler):
+    """Just enough of the Connect API for the token exchange and /me."""
+
+    delay = 0.0
+    counts: ClassVar[dict[str, int]] = {"token_exchanges": 0, "me": 0}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+        time.sleep(self.delay)
+
+    def do_GET(self):
+        if self.path.startswith("/__api__/server_settings"):
+            self._reply({"version": "2025.09.0"})
+        elif self.path.startswith("/__api__/v1/user"):
+            self._count("me")
+            self._reply({"guid": "benchmark", "username": "benchmark"})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.startswith("/__api__/v1/oauth/integrations/credentials"):
+            self._count("token_exchanges")
+            self._reply(
+                {
+                    "access_token": "visitor-api-key",
+                    "issued_token_type": "urn:posit:connect:api-key",
+                    "token_type": "Key",
+                }
+            )
+        else:
+            self.send_error(404)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid):
+    """Resident memory of `pid` and all its descendants, or None off Linux."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS"))
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except (OSError, StopIteration):
+        return None
+    return rss / 1024 + sum(rss_mb(child) or 0 for child in children)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def latency_summary(samples):
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+    }
+
+
+async def call_tool(http, token, name, arguments):
+    """Call a tool over streamable HTTP; False if the call failed."""
+    response = await http.post(
+        "/mcp",
+        headers={
+            "Accept": "application/json, text/event-stream",
+            "Posit-Connect-User-Session-Token": token,
+        },
+        json={
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "tools/call",
+            "params": {"name": name, "arguments": arguments},
+        },
+    )
+    if response.status_code != 200:
+        return False
+    # Stateless requests answer with a short event stream ending in the result.
+    for line in response.text.splitlines():
+        if line.startswith("data:"):
+            message = json.loads(line[5:])
+            if "result" in message or "error" in message:
+                return not message.get("error") and not message["result"].get("isError")
+    return False
+
+
+async def run_level(http, concurrency, duration):
+    latencies = {name: [] for name, _ in TOOLS}
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def viewer(i):
+        nonlocal errors
+        for name, arguments in itertools.cycle(TOOLS):
+            if time.perf_counter() >= deadline:
+                return
+            start = time.perf_counter()
+            ok = await call_tool(http, f"viewer-{i}", name, arguments)
+            latencies[name].append(time.perf_counter() - start)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(viewer(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    samples = [s for tool_samples in latencies.values() for s in tool_samples]
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": errors,
+        "requests_per_second": round(len(samples) / elapsed, 1),
+        **latency_summary(samples),
+        "tools": {name: latency_summary(s) for name, s in latencies.items() if s},
+    }
+
+
+def start_server(workers, connect_url, cache_path):
+    port = free_port()
+    env = {
+        **os.environ,
+        "CONNECT_SERVER": connect_url,
+        "CONNECT_API_KEY": "benchmark",
+        "CACHE_PATH": cache_path,
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)]
+        + ["--workers", str(workers), "--log-level", "warning"],
+        cwd=HERE,
+        env=env,
+        # The MCP SDK logs every request; failed calls are counted as errors instead.
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            httpx.get(base_url + "/metrics").raise_for_status()
+            return server, base_url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("The server didn't start.")
+
+
+async def run_workers(args, workers, connect_url):
+    with tempfile.TemporaryDirectory() as tmp:
+        server, base_url = start_server(
+            workers, connect_url, os.path.join(tmp, "cache.sqlite")
+        )
+        # By default every call opens a new connection, so uvicorn's workers each
+        # take a share of every viewer's calls, as they would behind Connect's
+        # proxy; a kept-alive connection would pin a viewer to one worker.
+        limits = httpx.Limits(
+            max_connections=max(args.concurrency),
+            max_keepalive_connections=None if args.reuse_connections else 0,
+        )
+        try:
+            async with httpx.AsyncClient(
+                base_url=base_url, timeout=60, limits=limits
+            ) as http:
+                # Start the worker processes and load the dataset before timing.
+                await call_tool(http, "warmup", *TOOLS[1])
+                for concurrency in args.concurrency:
+                    before = dict(FakeConnect.counts)
+                    result = await run_level(http, concurrency, args.duration)
+                    memory = rss_mb(server.pid)
+                    result["server_memory_mb"] = memory and round(memory, 1)
+                    for name, count in FakeConnect.counts.items():
+                        result[f"connect_{name}"] = count - before[name]
+                    yield result
+        finally:
+            server.terminate()
+            server.wait()
+
+
+async def run(args):
+    FakeConnect.delay = args.connect_delay
+    connect = ThreadingHTTPServer(("127.0.0.1", free_port()), FakeConnect)
+    threading.Thread(target=connect.serve_forever, daemon=True).start()
+    connect_url = f"http://127.0.0.1:{connect.server_port}"
+
+    backend = os.getenv("CACHE_BACKEND", "memory")
+    for workers in args.workers:
+        async for result in run_workers(args, workers, connect_url):
+            record = {"workers": workers, "cache_backend": backend, **result}
+            print(json.dumps(record), flush=True)
+    connect.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--connect-delay", type=float, default=0.05)
+    parser.add_argument("--reuse-connections", action="store_true")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,237 @@
+"""Where the per-viewer caches keep their entries.
+
+By default each cache is a cachetools TTLCache in this process. Run several
+worker processes (Connect's max processes, or uvicorn --workers) and each one
+would exchange every viewer's token and fetch their /me again; with the
+"sqlite" backend the caches live in a SQLite file that every worker on the host
+opens, so one worker's lookup warms them all. `compute_once` makes a lookup
+single-flight across those processes too, so concurrent requests landing on
+different workers still exchange a viewer's token only once.
+
+The file holds viewers' API keys, so entries are encrypted with a key derived
+from their cache key (the viewer's session token, which is itself stored only
+as a hash): the file is no use without the token. The last process to close
+the cache deletes the file. The sqlite backend needs POSIX file locks.
+
+Either backend is a MutableMapping that cachetools' `cached` decorator can use.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, MutableMapping
+
+from cachetools import TTLCache
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+BACKENDS = ("memory", "sqlite")
+
+
+class _HostLock:
+    """POSIX locks on `<path>.lock`, shared by this process's caches in `path`.
+
+    Every process with the cache open holds a shared lock on byte 0, so the last
+    one out can tell that it is. Each cache key is locked on a byte of its own
+    while one process looks it up. POSIX locks belong to the process, and
+    closing any descriptor of the file drops them all, so there is one of these
+    per file per process.
+    """
+
+    def __init__(self, path: str):
+        import fcntl
+
+        self._fcntl = fcntl
+        self.path = path
+        self.users = 0
+        self._fd = os.open(f"{path}.lock", os.O_CREAT | os.O_RDWR, 0o600)
+        # Waits while the last process out of an earlier run deletes the file.
+        fcntl.lockf(self._fd, fcntl.LOCK_SH, 1, 0)
+
+    @contextlib.contextmanager
+    def key(self, digest: str):
+        offset = 1 + int(digest[:8], 16)
+        self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX, 1, offset)
+        try:
+            yield
+        finally:
+            self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN, 1, offset)
+
+    def release(self) -> bool:
+        """Stop using the file; True if no other process still is."""
+        try:
+            self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX | self._fcntl.LOCK_NB, 1, 0)
+        except OSError:
+            return False
+        return True
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+_host_locks: dict[str, _HostLock] = {}
+_host_locks_lock = threading.Lock()
+
+
+class SQLiteCache(MutableMapping):
+    """A TTL cache in a table of a SQLite file, shared between processes.
+
+    Keys are stored as SHA-256 digests, so session tokens never reach the disk.
+    Values must be JSON-serializable, and are stored encrypted (AES-GCM) with a
+    key derived from their cache key. Past `maxsize` entries, those closest to
+    expiring are dropped first. The file is created readable only by its owner.
+    """
+
+    def __init__(self, path: str, table: str, maxsize: int, ttl: float):
+        self.path = path
+        self.table = table
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        with _host_locks_lock:
+            host = _host_locks.get(path)
+            if host is None:
+                host = _host_locks[path] = _HostLock(path)
+            host.users += 1
+        self._host = host
+
+        # Create the file before SQLite does, so it never exists with wider permissions.
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self._lock, self._db:
+            # WAL lets readers in other processes proceed while one writes.
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def _digest(key) -> str:
+        return hashlib.sha256(repr(key).encode()).hexdigest()
+
+    @staticmethod
+    def _cipher(key) -> AESGCM:
+        # A different hash of the key than the stored digest, so the digest doesn't
+        # give the encryption key away.
+        return AESGCM(hashlib.sha256(b"cache value\0" + repr(key).encode()).digest())
+
+    def __getitem__(self, key):
+        digest = self._digest(key)
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT value FROM {self.table} WHERE key = ? AND expires > ?",
+                (digest, time.time()),
+            ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        value = row[0]
+        try:
+            plain = self._cipher(key).decrypt(value[:12], value[12:], digest.encode())
+        except (InvalidTag, TypeError, ValueError):
+            # Written by an older version, or damaged: look it up again.
+            raise KeyError(key) from None
+        return json.loads(plain)
+
+    def __setitem__(self, key, value):
+        now = time.time()
+        digest = self._digest(key)
+        nonce = os.urandom(12)
+        sealed = self._cipher(key).encrypt(
+            nonce, json.dumps(value).encode(), digest.encode()
+        )
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?)",
+                (digest, nonce + sealed, now + self.ttl),
+            )
+            self._db.execute(f"DELETE FROM {self.table} WHERE expires <= ?", (now,))
+            self._db.execute(
+                f"DELETE FROM {self.table} WHERE key NOT IN "
+                f"(SELECT key FROM {self.table} ORDER BY expires DESC LIMIT ?)",
+                (self.maxsize,),
+            )
+
+    def __delitem__(self, key):
+        with self._lock, self._db:
+            deleted = self._db.execute(
+                f"DELETE FROM {self.table} WHERE key = ?", (self._digest(key),)
+            ).rowcount
+        if not deleted:
+            raise KeyError(key)
+
+    def __iter__(self):
+        # Only the digests are stored, so those are the keys there are to list.
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT key FROM {self.table} WHERE expires > ?", (time.time(),)
+            ).fetchall()
+        return iter([key for (key,) in rows])
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute(
+                f"SELECT COUNT(*) FROM {self.table} WHERE expires > ?", (time.time(),)
+            ).fetchone()[0]
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute(f"DELETE FROM {self.table}")
+
+    def lock(self, key):
+        """Hold `key` for this process until the block exits, across processes."""
+        return self._host.key(self._digest((self.table, key)))
+
+    def close(self) -> None:
+        """Close the cache, deleting the file if no other process has it open."""
+        self._db.close()
+        with _host_locks_lock:
+            self._host.users -= 1
+            if self._host.users:
+                return
+            del _host_locks[self.path]
+        if self._host.release():
+            for suffix in ("", "-wal", "-shm"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self.path + suffix)
+        self._host.close()
+
+
+def compute_once(cache: MutableMapping, key, compute: Callable):
+    """`compute()` for a `key` missing from `cache`, once across processes.
+
+    With a SQLiteCache, a process that finds another computing the same key
+    waits for it and then uses its result. Use inside a function decorated with
+    `cached(cache)`.
+    """
+    if not isinstance(cache, SQLiteCache):
+        return compute()
+    with cache.lock(key):
+        with contextlib.suppress(KeyError):
+            return cache[key]
+        # Store it before letting the next process in, so it finds the result.
+        value = cache[key] = compute()
+        return value
+
+
+def close_caches(*caches: MutableMapping) -> None:
+    """Close any SQLiteCache among `caches`."""
+    for cache in caches:
+        if isinstance(cache, SQLiteCache):
+            cache.close()
+
+
+def make_cache(backend: str, path: str, name: str, maxsize: int, ttl: float):
+    """A cache named `name` in the chosen backend ("memory" or "sqlite")."""
+    if backend == "memory":
+        return TTLCache(maxsize=maxsize, ttl=ttl)
+    if backend == "sqlite":
+        return SQLiteCache(path, name, maxsize=maxsize, ttl=ttl)
+    raise ValueError(
+        f"Unknown cache backend {backend!r}; use one of: {', '.join(BACKENDS)}"
+    )
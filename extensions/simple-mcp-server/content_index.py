@@ -0,0 +1,189 @@
+"""A searchable index of the Connect content a viewer can see.
+
+The content tools answer from this index rather than listing content from
+Connect on every call. Each refresh fetches the viewer's content list once and
+re-indexes only the items whose `last_deployed_time` (or title, description
+or tags) changed since the last refresh, dropping items that are gone.
+
+Search is full-text over titles, names, descriptions and tags: a query word
+matches an item when it starts one of the item's words. Items matching more of
+the query's words rank first, then those matching in more heavily weighted
+fields (the title weighs most).
+"""
+
+import re
+import threading
+import time
+from bisect import bisect_left
+
+_WORD = re.compile(r"\w+")
+
+# How much a query word matching each field adds to an item's score.
+FIELD_WEIGHTS = {"title": 3, "name": 2, "tags": 2, "description": 1}
+
+# The longest description returned with a result, in characters.
+DESCRIPTION_CHARS = 200
+
+
+def words(text: str) -> list[str]:
+    return _WORD.findall(text.lower())
+
+
+def _entry(item) -> dict:
+    tags = [tag.get("name", "") for tag in item.get("tags") or []]
+    owner = item.get("owner") or {}
+    return {
+        "guid": item["guid"],
+        "name": item.get("name") or "",
+        "title": item.get("title") or item.get("name") or "",
+        "description": item.get("description") or "",
+        "tags": tags,
+        "app_mode": item.get("app_mode"),
+        "owner": owner.get("username"),
+        "url": item.get("dashboard_url") or item.get("content_url"),
+        "last_deployed_time": item.get("last_deployed_time"),
+    }
+
+
+def _revision(entry: dict) -> tuple:
+    # What a refresh compares to decide whether an item needs re-indexing.
+    return (
+        entry["last_deployed_time"],
+        entry["title"],
+        entry["description"],
+        tuple(entry["tags"]),
+    )
+
+
+def _terms(entry: dict) -> dict[str, int]:
+    terms: dict[str, int] = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        value = entry[field]
+        text = " ".join(value) if isinstance(value, list) else value
+        for word in words(text):
+            terms[word] = max(terms.get(word, 0), weight)
+    return terms
+
+
+def summarize(entry: dict) -> dict:
+    """An entry as a tool returns it, with its description shortened."""
+    description = entry["description"]
+    if len(description) > DESCRIPTION_CHARS:
+        description = description[: DESCRIPTION_CHARS - 1].rstrip() + "…"
+    return {**entry, "description": description}
+
+
+class ContentIndex:
+    """One viewer's content, indexed for search. Safe to use across threads."""
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self.refreshed_at: float | None = None
+        self._entries: dict[str, dict] = {}
+        self._revisions: dict[str, tuple] = {}
+        # Word -> {guid: weight}, and the words in sorted order for prefix lookups.
+        self._postings: dict[str, dict[str, int]] = {}
+        self._sorted_words: list[str] = []
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def stale(self) -> bool:
+        return (
+            self.refreshed_at is None
+            or time.monotonic() - self.refreshed_at > self.max_age
+        )
+
+    def refresh(self, fetch) -> None:
+        """Bring the index up to date with `fetch()`, the viewer's content list.
+
+        Blocking; concurrent refreshes wait for the one in progress instead of
+        fetching again.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            with self._refresh_lock:
+                return
+        try:
+            started = time.monotonic()
+            entries = {entry["guid"]: entry for entry in map(_entry, fetch())}
+            with self._lock:
+                removed = self._entries.keys() - entries.keys()
+                for guid in removed:
+                    self._remove(guid)
+                changed = bool(removed)
+                for guid, entry in entries.items():
+                    revision = _revision(entry)
+                    if self._revisions.get(guid) != revision:
+                        self._remove(guid)
+                        self._add(entry, revision)
+                        changed = True
+                    else:
+                        self._entries[guid] = entry
+                if changed:
+                    self._sorted_words = sorted(self._postings)
+            self.refreshed_at = started
+        finally:
+            self._refresh_lock.release()
+
+    def _add(self, entry: dict, revision: tuple) -> None:
+        guid = entry["guid"]
+        self._entries[guid] = entry
+        self._revisions[guid] = revision
+        for word, weight in _terms(entry).items():
+            self._postings.setdefault(word, {})[guid] = weight
+
+    def _remove(self, guid: str) -> None:
+        entry = self._entries.pop(guid, None)
+        self._revisions.pop(guid, None)
+        if entry is None:
+            return
+        for word in _terms(entry):
+            postings = self._postings.get(word)
+            if postings is not None:
+                postings.pop(guid, None)
+                if not postings:
+                    del self._postings[word]
+
+    def _matches(self, prefix: str) -> dict[str, int]:
+        # The best weight per item among the words starting with `prefix`.
+        matches: dict[str, int] = {}
+        i = bisect_left(self._sorted_words, prefix)
+        while i < len(self._sorted_words) and self._sorted_words[i].startswith(prefix):
+            for guid, weight in self._postings.get(self._sorted_words[i], {}).items():
+                matches[guid] = max(matches.get(guid, 0), weight)
+            i += 1
+        return matches
+
+    def search(self, query: str, limit: int) -> tuple[list[dict], int]:
+        """The best matches for `query`, and how many items matched in all."""
+        # Per item: how many query words it matches, then their summed weights.
+        # Ranking by the count first lets filler words in a natural-language query
+        # ("find the sales dashboard") match nothing without hiding every result.
+        scores: dict[str, tuple[int, int]] = {}
+        with self._lock:
+            for word in dict.fromkeys(words(query)):
+                for guid, weight in self._matches(word).items():
+                    count, total = scores.get(guid, (0, 0))
+                    scores[guid] = (count + 1, total + weight)
+            # Best score first; among equal scores, most recently deployed first.
+            ranked = self._by_deployment(scores)
+            ranked.sort(key=lambda entry: scores[entry["guid"]], reverse=True)
+            results = [
+                {**summarize(entry), "score": scores[entry["guid"]][1]}
+                for entry in ranked[:limit]
+            ]
+        return results, len(ranked)
+
+    def recent(self, limit: int, offset: int = 0) -> tuple[list[dict], int]:
+        """Items by most recent deployment, and how many there are in all."""
+        with self._lock:
+            entries = self._by_deployment(self._entries)
+        return [summarize(e) for e in entries[offset : offset + limit]], len(entries)
+
+    def _by_deployment(self, guids) -> list[dict]:
+        # ISO timestamps sort by time; never-deployed items (no timestamp) go last.
+        return sorted(
+            (self._entries[guid] for guid in guids),
+            key=lambda entry: entry["last_deployed_time"] or "",
+            reverse=True,
+        )
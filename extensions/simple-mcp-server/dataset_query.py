@@ -0,0 +1,207 @@
+"""Select, filter, group and trim a dataset for the query_dataset tool.
+
+Everything runs as vectorized pandas operations on the cached frame: filters
+become boolean masks, and only the columns the query touches are carried
+through grouping and sorting. Results come back as a compact JSON table,
+trimmed to a rough token budget so an assistant gets an answer it can read
+rather than a whole frame.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING, Any, Literal, get_args
+
+from pydantic import BaseModel, Field
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+Operator = Literal[
+    "==", "!=", "<", "<=", ">", ">=", "in", "not in", "contains", "is null", "not null"
+]
+
+Aggregation = Literal["count", "sum", "mean", "median", "min", "max", "std", "nunique"]
+AGGREGATIONS = get_args(Aggregation)
+
+# The most rows a query may ask for, however large its token budget.
+MAX_ROWS = 1000
+
+# Roughly how many characters of JSON an LLM tokenizer packs into one token.
+CHARS_PER_TOKEN = 4
+
+
+class Filter(BaseModel):
+    """One condition rows must meet, e.g. {"column": "A", "op": ">", "value": 2}."""
+
+    column: str
+    op: Operator = "=="
+    value: Any = Field(
+        None,
+        description='A list for "in" and "not in"; unused by "is null"/"not null".',
+    )
+
+
+def _check_columns(df: pd.DataFrame, columns, role: str) -> None:
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise ValueError(
+            f"Unknown {role} column(s): {', '.join(map(str, missing))}. "
+            f"Available: {', '.join(map(str, df.columns))}"
+        )
+
+
+def _mask(df: pd.DataFrame, condition: Filter) -> pd.Series:
+    series = df[condition.column]
+    op, value = condition.op, condition.value
+    if op == "is null":
+        return series.isna()
+    if op == "not null":
+        return series.notna()
+    if op in ("in", "not in"):
+        if not isinstance(value, list):
+            raise ValueError(f'"{op}" needs a list of values.')
+        mask = series.isin(value)
+        return mask if op == "in" else ~mask
+    if op == "contains":
+        return series.astype("string").str.contains(str(value), regex=False, na=False)
+    try:
+        return {
+            "==": series.__eq__,
+            "!=": series.__ne__,
+            "<": series.__lt__,
+            "<=": series.__le__,
+            ">": series.__gt__,
+            ">=": series.__ge__,
+        }[op](value)
+    except TypeError as e:
+        raise ValueError(
+            f"Can't compare column '{condition.column}' with {value!r}: {e}"
+        ) from e
+
+
+def run_query(
+    df: pd.DataFrame,
+    columns: list[str] | None = None,
+    filters: list[Filter] | None = None,
+    group_by: list[str] | None = None,
+    aggregations: dict[str, Aggregation] | None = None,
+    sort_by: list[str] | None = None,
+    descending: bool = False,
+) -> pd.DataFrame:
+    """Apply a query to `df` and return the result as a new frame.
+
+    `columns` selects columns for a plain query; with `group_by` or
+    `aggregations` the result is the group-by columns plus one column per
+    aggregation, named like "sepal length (cm)_mean". Raises ValueError for
+    a query that doesn't fit the data.
+    """
+    # Imported here so the server can describe the tool without loading pandas.
+    import pandas as pd
+
+    filters = filters or []
+    group_by = group_by or []
+    aggregations = aggregations or {}
+    for name, how in aggregations.items():
+        if how not in AGGREGATIONS:
+            raise ValueError(
+                f"Unknown aggregation '{how}' for '{name}'. "
+                f"Use one of: {', '.join(AGGREGATIONS)}"
+            )
+
+    _check_columns(df, [f.column for f in filters], "filter")
+    _check_columns(df, group_by, "group-by")
+    _check_columns(df, list(aggregations), "aggregation")
+    if columns:
+        _check_columns(df, columns, "selected")
+
+    # Filter first, on only the columns the rest of the query needs, so the
+    # later steps copy and sort as little as possible. An aggregated result
+    # has just its group-by and aggregated columns.
+    if group_by or aggregations:
+        needed = group_by + list(aggregations)
+    else:
+        needed = columns or list(df.columns)
+    needed = list(dict.fromkeys(needed))
+    if filters:
+        mask = pd.Series(True, index=df.index)
+        for condition in filters:
+            mask &= _mask(df, condition)
+        result = df.loc[mask, needed]
+    else:
+        result = df[needed]
+
+    if group_by or aggregations:
+        if not aggregations:
+            # Grouping alone counts the rows in each group.
+            result = (
+                result.groupby(group_by, dropna=False).size().reset_index(name="count")
+            )
+        elif group_by:
+            result = (
+                result.groupby(group_by, dropna=False)
+                .agg(**{f"{c}_{how}": (c, how) for c, how in aggregations.items()})
+                .reset_index()
+            )
+        else:
+            result = pd.DataFrame(
+                {f"{c}_{how}": [result[c].agg(how)] for c, how in aggregations.items()}
+            )
+
+    if sort_by:
+        _check_columns(result, sort_by, "sort")
+        result = result.sort_values(sort_by, ascending=not descending)
+    return result
+
+
+def to_compact_json(
+    df: pd.DataFrame, limit: int, max_tokens: int, offset: int = 0
+) -> str:
+    """Serialize one page of `df` as {"columns", "rows", "total_rows",
+    "truncated", "offset", "next_offset"}.
+
+    The page starts at row `offset`, keeps at most `limit` rows, and stops
+    adding rows once the JSON would run past about `max_tokens` tokens, so
+    only the page is ever serialized. "next_offset" is where the next page
+    starts, or null after the last row, and "truncated" says whether there is
+    one. A page always has at least one row unless it starts past the end;
+    raises ValueError if even that row doesn't fit in `max_tokens`, since a
+    page without it would send the caller back to the same offset forever.
+    """
+    limit = max(1, min(limit, MAX_ROWS))
+    offset = max(0, offset)
+    # pandas converts NaN to null, timestamps to ISO strings and numpy
+    # scalars to plain numbers in one vectorized pass.
+    table = json.loads(
+        df.iloc[offset : offset + limit].to_json(
+            orient="split", index=False, date_format="iso"
+        )
+    )
+    columns = table["columns"]
+
+    budget = max_tokens * CHARS_PER_TOKEN - len(json.dumps(columns)) - 100
+    rows = []
+    for row in table["data"]:
+        budget -= len(json.dumps(row, separators=(",", ":"))) + 1
+        if budget < 0:
+            break
+        rows.append(row)
+    if table["data"] and not rows:
+        raise ValueError(
+            f"Row {offset} doesn't fit in max_tokens={max_tokens}. Raise max_tokens "
+            "or select fewer columns."
+        )
+
+    end = offset + len(rows)
+    next_offset = end if end < len(df) else None
+    return json.dumps(
+        {
+            "columns": columns,
+            "rows": rows,
+            "total_rows": len(df),
+            "truncated": next_offset is not None,
+            "offset": offset,
+            "next_offset": next_offset,
+        },
+        separators=(",", ":"),
+    )
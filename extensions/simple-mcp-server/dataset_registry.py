@@ -0,0 +1,179 @@
+"""The datasets the MCP tools read, loaded on first use and kept in memory.
+
+Each dataset is registered with a loader and a version. It is loaded the first
+time a tool asks for it and kept in a size-bounded cache, so repeated tool
+calls don't rebuild it; when the cache is full, the least recently used
+datasets are dropped and reloaded on their next use. Results derived from a
+dataset (like its summary statistics) are cached by dataset version, so they
+are recomputed only when the data changes.
+
+Files in a directory can be registered too: Parquet, Arrow IPC (Feather) and
+CSV files. A file is read whole when first used, into an Arrow table that is
+then converted to pandas column by column, releasing each Arrow column as it
+goes. Loading one therefore needs about the size of its pandas frame, plus
+the Arrow columns not yet converted; the frame then counts against the cache
+budget like any other dataset.
+
+pandas and pyarrow are imported only when a dataset is first loaded, so
+registering datasets (and listing them) costs the server nothing at startup.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from cachetools import LRUCache, cachedmethod
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+
+def _read_parquet(path: Path) -> pa.Table:
+    import pyarrow.parquet
+
+    return pyarrow.parquet.read_table(path)
+
+
+def _read_arrow(path: Path) -> pa.Table:
+    import pyarrow as pa
+
+    with pa.OSFile(str(path)) as f:
+        return pa.ipc.open_file(f).read_all()
+
+
+def _read_csv(path: Path) -> pa.Table:
+    import pyarrow.csv
+
+    return pyarrow.csv.read_csv(path)
+
+
+# The file types register_directory picks up, by suffix.
+FILE_READERS = {
+    ".parquet": _read_parquet,
+    ".arrow": _read_arrow,
+    ".feather": _read_arrow,
+    ".ipc": _read_arrow,
+    ".csv": _read_csv,
+}
+
+
+@dataclass(frozen=True)
+class Dataset:
+    name: str
+    loader: Callable[[], pd.DataFrame]
+    # A file-backed dataset's version is read from the file each time, so an
+    # updated file is picked up without re-registering it.
+    version: str | Callable[[], str]
+
+    def current_version(self) -> str:
+        return self.version() if callable(self.version) else self.version
+
+
+def _to_pandas(table: pa.Table) -> pd.DataFrame:
+    # Free each Arrow column once it's converted, and keep the columns as separate
+    # blocks rather than copying them again to consolidate them.
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _frame_size(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True).sum())
+
+
+class DatasetRegistry:
+    """Named datasets, loaded lazily and cached up to `max_bytes` in memory."""
+
+    def __init__(self, max_bytes: int):
+        self._datasets: dict[str, Dataset] = {}
+        self._frames = LRUCache(maxsize=max_bytes, getsizeof=_frame_size)
+        self._summaries = LRUCache(maxsize=256)
+        # Loads run in whichever threads the tools run in; the conditions make
+        # concurrent requests for the same dataset wait for one load.
+        self._frames_condition = threading.Condition()
+        self._summaries_condition = threading.Condition()
+
+    def register(
+        self,
+        name: str,
+        loader: Callable[[], pd.DataFrame],
+        version: str | Callable[[], str] = "1",
+    ) -> None:
+        """Make a dataset available under `name`. Nothing is loaded yet."""
+        self._datasets[name] = Dataset(name, loader, version)
+
+    def register_file(self, path: str | os.PathLike, name: str | None = None) -> str:
+        """Register a Parquet, Arrow IPC or CSV file, named after its stem by default."""
+        path = Path(path)
+        reader = FILE_READERS.get(path.suffix.lower())
+        if reader is None:
+            raise ValueError(f"Unsupported dataset file type: '{path.name}'")
+        name = name or path.stem
+
+        def version() -> str:
+            stat = path.stat()
+            return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+        self.register(name, lambda: _to_pandas(reader(path)), version)
+        return name
+
+    def register_directory(self, directory: str | os.PathLike) -> list[str]:
+        """Register every supported file in `directory`; returns their names."""
+        return [
+            self.register_file(path)
+            for path in sorted(Path(directory).iterdir())
+            if path.suffix.lower() in FILE_READERS
+        ]
+
+    def names(self) -> list[str]:
+        return list(self._datasets)
+
+    def _dataset(self, name: str) -> Dataset:
+        try:
+            return self._datasets[name]
+        except KeyError:
+            raise KeyError(f"Dataset '{name}' not found.") from None
+
+    def version(self, name: str) -> str:
+        return self._dataset(name).current_version()
+
+    @cachedmethod(
+        lambda self: self._frames, condition=lambda self: self._frames_condition
+    )
+    def _load(self, name: str, version: str) -> pd.DataFrame:
+        return self._dataset(name).loader()
+
+    def _current(self, name: str) -> str:
+        # The current version, after dropping anything cached for older ones
+        # rather than waiting for them to age out.
+        version = self.version(name)
+        for cache, condition in (
+            (self._frames, self._frames_condition),
+            (self._summaries, self._summaries_condition),
+        ):
+            with condition:
+                for key in [k for k in cache if k[0] == name and k[1] != version]:
+                    del cache[key]
+        return version
+
+    def get(self, name: str) -> pd.DataFrame:
+        """The dataset's current data, loading it if it isn't cached.
+
+        Treat the frame as read-only: it is shared with every other caller.
+        """
+        return self._load(name, self._current(name))
+
+    @cachedmethod(
+        lambda self: self._summaries,
+        condition=lambda self: self._summaries_condition,
+    )
+    def _summary(self, name: str, version: str) -> str:
+        return self._load(name, version).describe(include="all").to_string()
+
+    def summary(self, name: str) -> str:
+        """Summary statistics for every column, computed once per version."""
+        return self._summary(name, self._current(name))
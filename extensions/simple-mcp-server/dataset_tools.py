@@ -0,0 +1,78 @@
+"""The datasets, and the work behind the tools that read them.
+
+pandas work holds the GIL, so main.py runs `summarize` and `query` in worker
+processes rather than in the server (see `run_in_process` there). Those
+processes import this module rather than the server, and each keeps its own
+dataset cache: loaded datasets can take up to `DATASET_CACHE_MB` per worker.
+"""
+
+import os
+
+from dataset_query import Aggregation, Filter, run_query, to_compact_json
+from dataset_registry import DatasetRegistry
+
+# How much memory loaded datasets may use before the least recently used are dropped.
+DATASET_CACHE_MB = int(os.getenv("DATASET_CACHE_MB", "512"))
+
+
+# The server imports this module for the dataset names, so the heavy imports wait
+# until a worker process first loads a dataset.
+def _load_iris():
+    from sklearn.datasets import load_iris
+
+    return load_iris(as_frame=True).frame
+
+
+def _load_sample_data():
+    import pandas as pd
+
+    return pd.DataFrame(
+        {"A": [1, 2, 3, 4, 5], "B": [5, 4, 3, 2, 1], "C": ["x", "y", "x", "z", "y"]}
+    )
+
+
+# Small built-in datasets for demonstration. Each is loaded on first use and kept
+# (see dataset_registry.py), so repeated tool calls don't rebuild it.
+datasets = DatasetRegistry(max_bytes=DATASET_CACHE_MB * 2**20)
+datasets.register("iris", _load_iris)
+datasets.register("sample_data", _load_sample_data)
+
+# Serve your own data by putting Parquet, Arrow (Feather) or CSV files in this
+# directory, bundled alongside main.py; each file becomes a dataset named after it.
+DATASETS_DIR = os.getenv("DATASETS_DIR", "datasets")
+if os.path.isdir(DATASETS_DIR):
+    datasets.register_directory(DATASETS_DIR)
+
+
+def summarize(dataset_name: str) -> str:
+    """Summary statistics for every column, computed once per dataset version."""
+    return datasets.summary(dataset_name)
+
+
+def query(
+    dataset_name: str,
+    columns: list[str] | None,
+    filters: list[Filter] | None,
+    group_by: list[str] | None,
+    aggregations: dict[str, Aggregation] | None,
+    sort_by: list[str] | None,
+    descending: bool,
+    limit: int,
+    max_tokens: int,
+    offset: int,
+) -> str:
+    """Run a query_dataset query and serialize one page of its result.
+
+    The result isn't kept between calls: each page runs the whole query (filter,
+    group and sort) again, in whichever worker process takes the call.
+    """
+    result = run_query(
+        datasets.get(dataset_name),
+        columns=columns,
+        filters=filters,
+        group_by=group_by,
+        aggregations=aggregations,
+        sort_by=sort_by,
+        descending=descending,
+    )
+    return to_compact_json(result, limit=limit, max_tokens=max_tokens, offset=offset)
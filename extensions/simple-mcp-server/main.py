@@ -1,44 +1,225 @@
+import asyncio
 import contextlib
 import json
+import os
+import tempfile
 import threading
 import traceback
 import urllib.parse
+from functools import partial
 
 import anyio
-import pandas as pd
-from cachetools import TTLCache, cached
+import anyio.to_process
+from cachetools import LRUCache, TTLCache, cached
+from cachetools.keys import hashkey
 from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from mcp.server.fastmcp import FastMCP, Context
 from mcp.server.fastmcp.exceptions import ToolError
 from mcp.server.transport_security import TransportSecuritySettings
 from posit import connect
 from posit.connect.errors import ClientError
-from sklearn.datasets import load_iris
+from starlette.datastructures import Headers
+
+import dataset_tools
+from cache_backend import close_caches, compute_once, make_cache
+from content_index import ContentIndex
+from dataset_query import Aggregation, Filter
+from metrics import Metrics
+
+# Call counts and latencies for every tool and route, served at /metrics.
+metrics = Metrics()
 
 # --- Connect Client Initialization ---
 client = connect.Client()
 
-# Cache one Connect client per viewer session token (1h TTL) so repeated tool
-# calls from the same viewer don't re-exchange the token on every request. Bounded so
-# a long-running server with many distinct viewers can't grow the cache without limit;
-# the least-recently-used client is evicted past the cap.
+# Where the per-viewer caches below keep their entries: "memory" (the default) keeps
+# them in this process; "sqlite" keeps them in a SQLite file at CACHE_PATH, shared by
+# every worker process on the host, so scaling out doesn't repeat each viewer's token
+# exchange in every worker. See cache_backend.py.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_PATH = os.getenv(
+    "CACHE_PATH", os.path.join(tempfile.gettempdir(), "simple-mcp-server-cache.sqlite")
+)
+
+# Cache each viewer's API key, exchanged for their session token (1h TTL), so repeated
+# tool calls from the same viewer don't re-exchange the token on every request. Bounded
+# so a long-running server with many distinct viewers can't grow the cache without
+# limit; past the cap, entries are evicted.
+exchange_cache = make_cache(CACHE_BACKEND, CACHE_PATH, "visitor_api_keys", 1024, 3600)
+
+# The Connect client built from each viewer's API key. Clients hold open connections,
+# so they stay in this process whichever backend is chosen; building one is cheap
+# once the key is cached.
 client_cache = TTLCache(maxsize=1024, ttl=3600)
 
+# Cache each viewer's /me alongside their API key. Shorter-lived, so a renamed user
+# shows up within minutes, but long enough that the landing page and connect_whoami
+# don't fetch it on every request.
+me_cache = make_cache(CACHE_BACKEND, CACHE_PATH, "visitor_me", 1024, 300)
+
+
+# The blocking Connect calls below run in worker threads (via anyio.to_thread), so
+# these functions can be entered concurrently. The condition makes each cache
+# single-flight: while one thread exchanges a token (or fetches /me), concurrent
+# callers for the same token wait for its result instead of repeating the call.
+_exchange_condition = threading.Condition()
+_client_condition = threading.Condition()
+_me_condition = threading.Condition()
+
+
+@cached(exchange_cache, condition=_exchange_condition, info=True)
+def get_visitor_api_key(token: str) -> str:
+    """Exchange the viewer's session token for an API key scoped to them (cached)."""
 
-# The lock keeps the cache consistent: the blocking Connect calls below run in
-# worker threads (via anyio.to_thread), so this function can be entered concurrently.
-@cached(client_cache, lock=threading.Lock())
+    def exchange() -> str:
+        with metrics.phase("connect.token_exchange"):
+            return client.with_user_session_token(token).cfg.api_key
+
+    # With a shared cache, another process may be exchanging this token already.
+    return compute_once(exchange_cache, hashkey(token), exchange)
+
+
+@cached(client_cache, condition=_client_condition, info=True)
 def get_visitor_client(token: str | None) -> connect.Client:
     """Return a Connect client scoped to the viewer's session token (cached)."""
     if token:
-        return client.with_user_session_token(token)
+        return connect.Client(url=client.cfg.url, api_key=get_visitor_api_key(token))
     else:
         return client
 
 
+@cached(me_cache, condition=_me_condition, info=True)
+def get_visitor_me(token: str) -> dict:
+    """Return the viewer's Connect /me, for their session token (cached)."""
+
+    def fetch() -> dict:
+        visitor_client = get_visitor_client(token)
+        with metrics.phase("connect.me"):
+            # A plain dict, so it can be stored in any cache backend.
+            return dict(visitor_client.me)
+
+    return compute_once(me_cache, hashkey(token), fetch)
+
+
+def cache_stats() -> dict:
+    """Hit and miss counts and sizes for the per-viewer and landing page caches."""
+    return {
+        name: func.cache_info()._asdict()
+        for name, func in (
+            ("visitor_api_keys", get_visitor_api_key),
+            ("visitor_clients", get_visitor_client),
+            ("visitor_me", get_visitor_me),
+            ("index_pages", render_index_page),
+            ("greetings", render_greeting),
+        )
+    }
+
+
+# Background warm-ups started by PrefetchViewer, by token, until they finish.
+_prefetches: dict[str, asyncio.Task] = {}
+
+
+async def _prefetch_viewer(token: str) -> None:
+    # Nothing is waiting on a prefetch, so log a failure here for it to be seen;
+    # the tool call that needs /me reports it to the client.
+    try:
+        await anyio.to_thread.run_sync(get_visitor_me, token)
+    except ClientError as e:
+        # 212 means no Visitor API Key integration is configured, which the tools
+        # already explain; log any other Connect error.
+        if e.error_code != 212:
+            traceback.print_exc()
+    except Exception:
+        traceback.print_exc()
+
+
+class PrefetchViewer:
+    """Start a viewer's token exchange and /me fetch as soon as their MCP session opens.
+
+    A client initializes and lists tools before it calls any, so by the time
+    connect_whoami runs its lookup is already cached (or in flight, and joined
+    through the single-flight caches above) rather than started from scratch.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/mcp"):
+            token = Headers(scope=scope).get("posit-connect-user-session-token")
+            if token:
+                with _me_condition:
+                    known = hashkey(token) in me_cache
+                if not known and token not in _prefetches:
+                    task = asyncio.create_task(_prefetch_viewer(token))
+                    _prefetches[token] = task
+                    task.add_done_callback(lambda _: _prefetches.pop(token, None))
+        await self.app(scope, receive, send)
+
+
+class RecordMetrics:
+    """ASGI middleware counting and timing every HTTP request by route.
+
+    MCP traffic is grouped under /mcp, and paths the app doesn't serve under
+    "other", so stray requests can't grow the metrics without bound.
+    """
+
+    routes = ("/", "/cache-stats", "/metrics")
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        if path.startswith("/mcp"):
+            route = "/mcp"
+        else:
+            route = path if path in self.routes else "other"
+
+        async def send_and_check(message):
+            if message["type"] == "http.response.start" and message["status"] >= 500:
+                metrics.route_failed(route)
+            await send(message)
+
+        with metrics.request(route):
+            await self.app(scope, receive, send_and_check)
+
+
 # --- FastMCP Server Initialization ---
-mcp = FastMCP(
+class Server(FastMCP):
+    """FastMCP that counts changes to its tool set.
+
+    The landing page lists the tools; `tools_version` lets it build that listing
+    once and rebuild it only after a tool is added or removed at runtime.
+    """
+
+    tools_version = 0
+
+    def add_tool(self, *args, **kwargs) -> None:
+        super().add_tool(*args, **kwargs)
+        self.tools_version += 1
+
+    def remove_tool(self, name: str) -> None:
+        super().remove_tool(name)
+        self.tools_version += 1
+
+    async def call_tool(self, name, arguments):
+        # Every tool call, however the tool was registered, passes through here. The
+        # name comes from the client, so calls to tools we don't have are counted
+        # under "other", as RecordMetrics does for routes, rather than each adding a
+        # new entry to the metrics.
+        known = self._tool_manager.get_tool(name) is not None
+        with metrics.tool_call(name if known else "other"):
+            return await super().call_tool(name, arguments)
+
+
+mcp = Server(
     name="MCP Server",
     instructions="MCP server for dataset operations and Connect 'whoami' via FastAPI.",
     streamable_http_path="/mcp",
@@ -46,50 +227,173 @@ mcp = FastMCP(
     # Connect terminates and authenticates requests in front of this app, and the
     # served host varies per deployment, so disable the SDK's default DNS-rebinding
     # Host check that would otherwise reject the Connect host.
-    transport_security=TransportSecuritySettings(
-        enable_dns_rebinding_protection=False
-    ),
+    transport_security=TransportSecuritySettings(enable_dns_rebinding_protection=False),
 )
 
-# --- Datasets ---
-# Simple in-memory datasets for demonstration
-_datasets_store = {
-    "iris": lambda: pd.DataFrame(data=load_iris(as_frame=True).frame),
-    "sample_data": lambda: pd.DataFrame(
-        {"A": [1, 2, 3, 4, 5], "B": [5, 4, 3, 2, 1], "C": ["x", "y", "x", "z", "y"]}
-    ),
+# --- Tool Execution ---
+# pandas work holds the GIL, so even on a worker thread a heavy dataset call would
+# slow every other request in this process, connect_whoami included. CPU-bound tools
+# run in a bounded pool of worker processes instead; I/O-bound ones, which mostly wait
+# on Connect, stay on threads (anyio.to_thread).
+TOOL_PROCESSES = int(os.getenv("TOOL_PROCESSES", str(min(4, os.cpu_count() or 1))))
+_process_limiter = anyio.CapacityLimiter(TOOL_PROCESSES)
+
+# How often, in seconds, a running CPU-bound tool reports progress to the client.
+PROGRESS_INTERVAL = 2
+
+# Seconds each CPU-bound tool may run before it's stopped.
+TOOL_TIMEOUTS = {
+    "calculate_summary_statistics": 30,
+    "query_dataset": 30,
 }
 
 
+async def _report_progress(
+    context: Context, tool_name: str, timeout: float, queued: bool
+) -> None:
+    # Progress counts seconds towards the timeout. Clients that asked for progress
+    # can show it, and many reset their own request timeouts on each report.
+    meta = context.request_context.meta
+    progress_token = meta.progressToken if meta else None
+    if progress_token is None:
+        return
+    if queued:
+        message = f"{tool_name} is waiting for a free worker process."
+    else:
+        message = f"{tool_name} is running."
+    elapsed = 0
+    while True:
+        # Not context.report_progress: it doesn't tie the notification to this request,
+        # and with stateless_http an unrelated notification has no stream to go out on.
+        await context.session.send_progress_notification(
+            progress_token,
+            elapsed,
+            timeout,
+            message,
+            related_request_id=context.request_id,
+        )
+        await anyio.sleep(PROGRESS_INTERVAL)
+        elapsed += PROGRESS_INTERVAL
+        message = f"{tool_name}: {elapsed} of at most {timeout} seconds elapsed."
+
+
+async def run_in_process(tool_name: str, func, *args, context: Context | None = None):
+    """Run a CPU-bound tool's work in a worker process.
+
+    The worker is killed if the call outlives the tool's timeout or the MCP request
+    is cancelled (the client cancels it or disconnects), so abandoned work doesn't
+    keep a CPU busy. Exceptions raised by `func` are re-raised here. With the tool's
+    `context`, progress notifications are sent every PROGRESS_INTERVAL seconds
+    while the call runs (only if the client's request asked for them).
+    """
+    timeout = TOOL_TIMEOUTS[tool_name]
+    progress = None
+    if context is not None:
+        queued = _process_limiter.available_tokens == 0
+        progress = asyncio.create_task(
+            _report_progress(context, tool_name, timeout, queued)
+        )
+    try:
+        with anyio.fail_after(timeout), metrics.phase("process"):
+            return await anyio.to_process.run_sync(
+                func, *args, cancellable=True, limiter=_process_limiter
+            )
+    except TimeoutError:
+        raise ToolError(
+            f"{tool_name} took longer than {timeout} seconds and was stopped."
+        )
+    finally:
+        if progress is not None:
+            progress.cancel()
+
+
 # --- MCP Tool Implementations ---
 @mcp.tool()
 def list_known_datasets() -> str:
     """Lists available dataset names."""
-    return str(list(_datasets_store.keys()))
+    return str(dataset_tools.datasets.names())
 
 
 @mcp.tool()
-def calculate_summary_statistics(dataset_name: str) -> str:
+async def calculate_summary_statistics(
+    dataset_name: str, context: Context | None = None
+) -> str:
     """
     Calculates summary statistics for a specified dataset.
     Returns the summary as a string or an error.
     """
-    if dataset_name not in _datasets_store:
+    if dataset_name not in dataset_tools.datasets.names():
         raise ToolError(f"Dataset '{dataset_name}' not found.")
     try:
-        df = _datasets_store[dataset_name]()
-        summary = df.describe(include="all").to_string()
-        return summary
+        return await run_in_process(
+            "calculate_summary_statistics",
+            dataset_tools.summarize,
+            dataset_name,
+            context=context,
+        )
+    except ToolError:
+        raise
     except Exception as e:
         raise ToolError(f"Error processing dataset '{dataset_name}': {str(e)}")
 
 
 @mcp.tool()
-async def connect_whoami(context: Context) -> str:
+async def query_dataset(
+    dataset_name: str,
+    columns: list[str] | None = None,
+    filters: list[Filter] | None = None,
+    group_by: list[str] | None = None,
+    aggregations: dict[str, Aggregation] | None = None,
+    sort_by: list[str] | None = None,
+    descending: bool = False,
+    limit: int = 50,
+    max_tokens: int = 2000,
+    offset: int = 0,
+    context: Context | None = None,
+) -> str:
     """
-    Calls the Posit Connect /me endpoint using the visitor's session token.
-    This tool requires a "Connect Visitor API Key" integration to be configured.
+    Queries a dataset and returns the matching rows as a compact JSON table.
+    Prefer this to pulling a whole dataset: select only the columns you need, filter
+    rows (e.g. {"column": "A", "op": ">", "value": 2}), and group and aggregate
+    (e.g. group_by ["C"] with aggregations {"A": "mean"}). Grouping without
+    aggregations counts the rows per group.
+
+    Returns {"columns", "rows", "total_rows", "truncated", "offset", "next_offset"}.
+    At most `limit` rows (up to 1000) come back, starting at row `offset`, fewer if
+    they would exceed about `max_tokens` tokens; "truncated" says whether rows after
+    this page were left out. To read a large result in pages, call again with the same query and
+    `offset` set to the "next_offset" returned, until it is null. Each page runs the
+    whole query again, so narrow or aggregate a large result rather than paging
+    through all of it.
     """
+    if dataset_name not in dataset_tools.datasets.names():
+        raise ToolError(f"Dataset '{dataset_name}' not found.")
+    try:
+        return await run_in_process(
+            "query_dataset",
+            dataset_tools.query,
+            dataset_name,
+            columns,
+            filters,
+            group_by,
+            aggregations,
+            sort_by,
+            descending,
+            limit,
+            max_tokens,
+            offset,
+            context=context,
+        )
+    except ToolError:
+        raise
+    except ValueError as e:
+        raise ToolError(str(e))
+    except Exception as e:
+        raise ToolError(f"Error querying dataset '{dataset_name}': {str(e)}")
+
+
+def _session_token(context: Context) -> str:
+    """The viewer's session token for this tool call, or a ToolError saying why not."""
     # The underlying Starlette request, where Connect's injected headers live.
     http_request = context.request_context.request
     if http_request is None:
@@ -98,7 +402,7 @@ async def connect_whoami(context: Context) -> str:
         )
 
     # Connect injects this header on every request from a logged-in viewer. Reading
-    # it (instead of a stored API key) is what lets the tool act as the viewer: the
+    # it (instead of a stored API key) is what lets a tool act as the viewer: the
     # AI assistant calls connect_whoami and Connect answers for whoever is using it.
     session_token = http_request.headers.get("posit-connect-user-session-token")
 
@@ -106,27 +410,144 @@ async def connect_whoami(context: Context) -> str:
         raise ToolError(
             "Session token not available. This tool must be called from content running on Posit Connect."
         )
+    return session_token
 
+
+def _connect_error(e: Exception) -> ToolError:
+    """The ToolError to raise for an error from a viewer's Connect call."""
+    if isinstance(e, ClientError) and e.error_code == 212:
+        return ToolError(
+            'No "Connect Visitor API Key" integration configured. In the content '
+            'settings, on the "Access" tab, add a "Connect Visitor API Key" '
+            'integration under "Integrations".'
+        )
+    return ToolError(f"Error calling Connect API: {str(e)}")
+
+
+@mcp.tool()
+async def connect_whoami(context: Context) -> str:
+    """
+    Calls the Posit Connect /me endpoint using the visitor's session token.
+    This tool requires a "Connect Visitor API Key" integration to be configured.
+    """
+    session_token = _session_token(context)
     try:
         # posit-sdk is a blocking (requests-based) client, so run it in a worker
         # thread to keep it off the event loop and free to serve other requests.
-        me = await anyio.to_thread.run_sync(
-            lambda: get_visitor_client(session_token).me
-        )
+        with metrics.phase("thread"):
+            me = await anyio.to_thread.run_sync(get_visitor_me, session_token)
         return json.dumps(me)
-    except ClientError as e:
-        if e.error_code == 212:
-            raise ToolError(
-                'No "Connect Visitor API Key" integration configured. In the content '
-                'settings, on the "Access" tab, add a "Connect Visitor API Key" '
-                'integration under "Integrations".'
-            )
-        raise ToolError(f"Error calling Connect API: {str(e)}")
     except Exception as e:
-        raise ToolError(f"Error calling Connect API: {str(e)}")
+        raise _connect_error(e)
+
+
+# --- Content Catalog ---
+# How long, in seconds, a viewer's content index answers searches before the next
+# one refreshes it. Stale indexes still answer at once; the refresh runs behind them.
+CONTENT_INDEX_MAX_AGE = int(os.getenv("CONTENT_INDEX_MAX_AGE", "60"))
+
+# One content index per viewer, by user GUID, so all of a viewer's sessions share
+# it. Bounded like the caches above. Only touched from the event loop.
+content_indexes = LRUCache(maxsize=256)
+
+# Background refreshes of stale indexes, by user GUID, until they finish.
+_content_refreshes: dict[str, asyncio.Task] = {}
+
+
+def _fetch_content(token: str) -> list:
+    visitor_client = get_visitor_client(token)
+    with metrics.phase("connect.content"):
+        return visitor_client.content.find(include="tags,owner")
+
+
+async def _refresh_in_background(index: ContentIndex, token: str) -> None:
+    try:
+        await anyio.to_thread.run_sync(index.refresh, partial(_fetch_content, token))
+    except Exception:
+        # The stale index keeps answering; the next search tries again.
+        traceback.print_exc()
+
+
+async def get_content_index(context: Context) -> ContentIndex:
+    """The calling viewer's content index, fetched on first use and kept fresh."""
+    token = _session_token(context)
+    try:
+        with metrics.phase("thread"):
+            me = await anyio.to_thread.run_sync(get_visitor_me, token)
+        guid = me["guid"]
+        index = content_indexes.get(guid)
+        if index is None:
+            index = content_indexes[guid] = ContentIndex(CONTENT_INDEX_MAX_AGE)
+        if index.refreshed_at is None:
+            with metrics.phase("thread"):
+                await anyio.to_thread.run_sync(
+                    index.refresh, partial(_fetch_content, token)
+                )
+        elif index.stale and guid not in _content_refreshes:
+            task = asyncio.create_task(_refresh_in_background(index, token))
+            _content_refreshes[guid] = task
+            task.add_done_callback(lambda _: _content_refreshes.pop(guid, None))
+    except Exception as e:
+        raise _connect_error(e)
+    return index
+
+
+@mcp.tool()
+async def search_content(
+    query: str, limit: int = 10, context: Context | None = None
+) -> str:
+    """
+    Searches the Posit Connect content the viewer can access for words in its title,
+    name, description or tags, e.g. "sales dashboard". A word matches the start of a
+    word in the item; items matching more of the words, and in their titles, rank
+    first. Use this to find content by what it's about.
+
+    Returns {"results", "total_matches"}: up to `limit` items, best matches first,
+    each with its guid, title, description, tags, owner, url and last_deployed_time.
+    """
+    index = await get_content_index(context)
+    results, total = index.search(query, max(1, min(limit, 100)))
+    return json.dumps({"results": results, "total_matches": total})
+
+
+@mcp.tool()
+async def list_content(
+    limit: int = 20, offset: int = 0, context: Context | None = None
+) -> str:
+    """
+    Lists the Posit Connect content the viewer can access, most recently deployed
+    first.
+
+    Returns {"results", "total", "next_offset"}: up to `limit` items starting at
+    `offset`. Call again with `offset` set to "next_offset" for the next page, until
+    it is null.
+    """
+    index = await get_content_index(context)
+    offset = max(0, offset)
+    results, total = index.recent(max(1, min(limit, 100)), offset)
+    end = offset + len(results)
+    return json.dumps(
+        {
+            "results": results,
+            "total": total,
+            "next_offset": end if end < total else None,
+        }
+    )
+
+
+# The landing page's tool listing, and the tools_version it was built for.
+_tools_info: tuple[int, list] | None = None
 
 
 async def get_tools_info():
+    """The registered tools as the landing page lists them, rebuilt on change."""
+    global _tools_info
+    if _tools_info is None or _tools_info[0] != mcp.tools_version:
+        _tools_info = (mcp.tools_version, await _build_tools_info())
+    return _tools_info[1]
+
+
+async def _build_tools_info():
     # List the registered tools through the SDK's public API to render them on
     # the landing page.
     tools = []
@@ -161,14 +582,47 @@ async def lifespan(app: FastAPI):
     # Run the MCP session manager for the mounted streamable-HTTP app.
     async with mcp.session_manager.run():
         yield
+    # The last process to stop deletes a shared cache's file, viewers' keys with it.
+    close_caches(exchange_cache, me_cache)
 
 
 app = FastAPI(title=mcp.name, lifespan=lifespan)
+app.add_middleware(PrefetchViewer)
+app.add_middleware(RecordMetrics)
 templates = Jinja2Templates(directory=".")
 # The template is named *.jinja, so Starlette's default select_autoescape leaves
 # escaping off; turn it on so user-controlled values (e.g. the viewer's name) are
 # HTML-escaped.
 templates.env.autoescape = True
+index_template = templates.get_template("index.html.jinja")
+
+
+# The page is the same for every visitor apart from its greeting block, so it's
+# rendered once per endpoint and tool set (health checks and anonymous visits are
+# served straight from here), and each viewer's greeting is rendered separately and
+# spliced in. The endpoint comes from the request URL, so there's one page per
+# hostname the server is reached by.
+@cached(
+    LRUCache(maxsize=16),
+    key=lambda endpoint, tools_version, tools: hashkey(endpoint, tools_version),
+    info=True,
+)
+def render_index_page(
+    endpoint: str, tools_version: int, tools: list
+) -> tuple[str, str]:
+    """The anonymous landing page, split around its greeting block."""
+    page = index_template.render(
+        title=mcp.name, endpoint=endpoint, tools=tools, viewer_name=None
+    )
+    before, _, after = page.partition(render_greeting(None))
+    return before, after
+
+
+@cached(LRUCache(maxsize=1024), info=True)
+def render_greeting(viewer_name: str | None) -> str:
+    """Render just the template's greeting block, for a viewer or anonymously."""
+    context = index_template.new_context({"viewer_name": viewer_name})
+    return "".join(index_template.blocks["greeting"](context))
 
 
 @app.get("/")
@@ -176,6 +630,7 @@ async def get_index_page(request: Request):
     """Serves the HTML index page using a Jinja2 template."""
     tools = await get_tools_info()
     endpoint = urllib.parse.urljoin(request.url._url, "mcp")
+    before, after = render_index_page(endpoint, mcp.tools_version, tools)
 
     # Look up who is viewing the page from the session token Connect injects (the
     # same lookup connect_whoami does), so the page can greet them by name and show
@@ -186,12 +641,12 @@ async def get_index_page(request: Request):
     if session_token:
         try:
             # Blocking posit-sdk call; run it off the event loop (see connect_whoami).
-            me = await anyio.to_thread.run_sync(
-                lambda: get_visitor_client(session_token).me
-            )
+            me = await anyio.to_thread.run_sync(get_visitor_me, session_token)
             # Prefer the viewer's display name; fall back to username, since not
             # every Connect user has a first and last name set.
-            display_name = f"{me.get('first_name', '')} {me.get('last_name', '')}".strip()
+            display_name = (
+                f"{me.get('first_name', '')} {me.get('last_name', '')}".strip()
+            )
             viewer_name = display_name or me.get("username")
         except ClientError as e:
             # 212 means no Visitor API Key integration is configured; that's the
@@ -204,16 +659,27 @@ async def get_index_page(request: Request):
             # e.g. a malformed token exchange; log it and leave the greeting off.
             traceback.print_exc()
 
-    return templates.TemplateResponse(
-        request,
-        "index.html.jinja",
-        {
-            "title": mcp.name,
-            "endpoint": endpoint,
-            "tools": tools,
-            "viewer_name": viewer_name,
-        },
-    )
+    return HTMLResponse(before + render_greeting(viewer_name) + after)
+
+
+@app.get("/cache-stats")
+async def get_cache_stats():
+    """Reports how well the per-viewer client and /me caches are doing."""
+    return cache_stats()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Reports call counts, errors, concurrency and latency histograms per tool and route.
+
+    A tool's "phases" break its latency down: "thread" is time waiting on the thread
+    pool (including the Connect calls run there), "process" time in the worker
+    process pool, and "connect.token_exchange" and "connect.me" the Connect API
+    calls themselves (made only on a cache miss). Connect calls made outside a tool
+    call, such as PrefetchViewer's background lookups, are under "other_phases"; a
+    tool that joins one of those in flight counts the wait as "thread" time.
+    """
+    return metrics.snapshot()
 
 
 app.mount("/", mcp_app)
@@ -0,0 +1,152 @@
+"""In-process request and tool metrics, served as JSON at /metrics.
+
+Every HTTP request and every tool call is counted and timed. Within a tool call,
+time spent in named phases, such as waiting on the thread pool or on a Connect
+API call, is timed as well, so a slow tool can be traced to where it waits.
+Phases are attributed through a context variable, which anyio carries into
+worker threads, so code deep inside a blocking call can time itself without
+knowing which tool it's serving.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+from collections import defaultdict
+
+# Upper bounds of the latency histogram buckets, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """Counts of observed durations by bucket, with their total and maximum."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def snapshot(self) -> dict:
+        # Cumulative, like Prometheus: each bucket counts everything up to its bound.
+        cumulative, buckets = 0, {}
+        for bound, count in zip((*map(str, BUCKETS), "+Inf"), self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+            "buckets": buckets,
+        }
+
+
+class _Calls:
+    """Counts, errors, concurrency and latency for one tool or route."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.latency = Histogram()
+        self.phases = defaultdict(Histogram)
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "latency": self.latency.snapshot(),
+            "phases": {name: h.snapshot() for name, h in sorted(self.phases.items())},
+        }
+
+
+# The tool call the current task (or the worker thread it's waiting on) is serving.
+_current: contextvars.ContextVar[_Calls | None] = contextvars.ContextVar(
+    "current_tool_call", default=None
+)
+
+
+class Metrics:
+    """Per-tool and per-route metrics. Safe to update from worker threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tools: dict[str, _Calls] = defaultdict(_Calls)
+        self._routes: dict[str, _Calls] = defaultdict(_Calls)
+        # Phases timed outside any tool call, e.g. a viewer lookup for the landing page.
+        self._phases: dict[str, Histogram] = defaultdict(Histogram)
+
+    @contextlib.contextmanager
+    def _track(self, calls: _Calls):
+        with self._lock:
+            calls.calls += 1
+            calls.in_flight += 1
+            calls.max_in_flight = max(calls.max_in_flight, calls.in_flight)
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            with self._lock:
+                calls.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                calls.in_flight -= 1
+                calls.latency.observe(elapsed)
+
+    @contextlib.contextmanager
+    def tool_call(self, name: str):
+        """Count and time a call to the tool `name`; an exception counts as an error."""
+        calls = self._tools[name]
+        token = _current.set(calls)
+        try:
+            with self._track(calls):
+                yield
+        finally:
+            _current.reset(token)
+
+    @contextlib.contextmanager
+    def request(self, route: str):
+        """Count and time an HTTP request to `route`."""
+        with self._track(self._routes[route]):
+            yield
+
+    def route_failed(self, route: str) -> None:
+        """Count an error response (5xx) that didn't raise."""
+        with self._lock:
+            self._routes[route].errors += 1
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Time part of the current tool call, or of no call in particular."""
+        calls = _current.get()
+        phases = calls.phases if calls is not None else self._phases
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                phases[name].observe(elapsed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "buckets": list(BUCKETS),
+                "tools": {n: c.snapshot() for n, c in sorted(self._tools.items())},
+                "routes": {n: c.snapshot() for n, c in sorted(self._routes.items())},
+                "other_phases": {
+                    n: h.snapshot() for n, h in sorted(self._phases.items())
+                },
+            }
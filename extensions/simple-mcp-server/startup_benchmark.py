@@ -0,0 +1,137 @@
+"""Measure how long the server takes to start from cold.
+
+Connect stops idle processes, so the first request after a quiet spell waits
+for Python to import main.py and for uvicorn to start serving. Each run starts
+a fresh interpreter, so nothing is cached in-process from an earlier run:
+
+- `python -X importtime -c "import main"` times the import, and breaks it down
+  by the modules main.py imports directly.
+- uvicorn is started and `GET /` is polled until the landing page answers,
+  for the time to first response.
+
+    uv run python startup_benchmark.py --runs 5
+
+Prints one JSON object with the median of each measurement, for comparing
+runs. With `--max-import-ms`, exits non-zero when the import takes longer,
+so a heavy new top-level import is caught before it ships.
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# main.py builds a Connect client at import; give it placeholder settings.
+ENV = {
+    **os.environ,
+    "CONNECT_SERVER": "http://connect.invalid",
+    "CONNECT_API_KEY": "benchmark",
+}
+
+# "import time: <self us> | <cumulative us> | <indent><module>"
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def import_times():
+    """Main's cumulative import time, and each module it imports directly, in ms."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=HERE,
+        env=ENV,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Modules are listed after the modules they import, each level indented
+    # two spaces further; main's direct imports are the level-one entries
+    # listed since the previous top-level import.
+    children = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, module = match.groups()
+        ms = int(cumulative) / 1000
+        if not indent:
+            if module == "main":
+                return ms, children
+            children = {}
+        elif len(indent) == 2:
+            children[module] = ms
+    raise RuntimeError("main wasn't imported.")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def first_response_ms():
+    """Milliseconds from starting uvicorn to the landing page's first answer."""
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)]
+        + ["--log-level", "warning"],
+        cwd=HERE,
+        env=ENV,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while server.poll() is None:
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/").raise_for_status()
+                return (time.perf_counter() - start) * 1000
+            except httpx.HTTPError:
+                time.sleep(0.01)
+        raise RuntimeError("The server exited before answering.")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run(args):
+    imports = [import_times() for _ in range(args.runs)]
+    first_responses = [first_response_ms() for _ in range(args.runs)]
+
+    import_ms = statistics.median(ms for ms, _ in imports)
+    by_module = {
+        module: round(statistics.median(times[module] for _, times in imports), 1)
+        for module in imports[0][1]
+        if all(module in times for _, times in imports)
+    }
+    slowest = dict(sorted(by_module.items(), key=lambda m: -m[1])[: args.top])
+    print(
+        json.dumps(
+            {
+                "runs": args.runs,
+                "import_ms": round(import_ms, 1),
+                "first_response_ms": round(statistics.median(first_responses), 1),
+                "slowest_imports_ms": slowest,
+            }
+        )
+    )
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        sys.exit(
+            f"Importing main took {import_ms:.0f} ms, over the "
+            f"{args.max_import_ms:.0f} ms budget."
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--max-import-ms", type=float)
+    run(parser.parse_args())
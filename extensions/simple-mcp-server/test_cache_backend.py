@@ -0,0 +1,142 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+from cachetools import TTLCache
+
+from cache_backend import SQLiteCache, close_caches, compute_once, make_cache
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache.sqlite")
+
+
+@pytest.fixture
+def cache(path):
+    cache = SQLiteCache(path, "things", maxsize=10, ttl=60)
+    yield cache
+    cache.close()
+
+
+def test_round_trip(cache):
+    cache["token"] = {"key": "secret"}
+    assert cache["token"] == {"key": "secret"}
+    assert len(cache) == 1
+    del cache["token"]
+    with pytest.raises(KeyError):
+        cache["token"]
+
+
+def test_entries_expire(path):
+    cache = SQLiteCache(path, "things", maxsize=10, ttl=0.05)
+    try:
+        cache["token"] = "value"
+        assert "token" in cache
+        time.sleep(0.1)
+        assert "token" not in cache
+        assert len(cache) == 0
+    finally:
+        cache.close()
+
+
+def test_maxsize_drops_the_soonest_to_expire(path):
+    cache = SQLiteCache(path, "things", maxsize=2, ttl=60)
+    try:
+        for key in ("a", "b", "c"):
+            cache[key] = key
+        assert "a" not in cache
+        assert cache["b"] == "b"
+        assert cache["c"] == "c"
+    finally:
+        cache.close()
+
+
+def test_tables_are_separate(cache, path):
+    other = SQLiteCache(path, "others", maxsize=10, ttl=60)
+    try:
+        cache["token"] = "thing"
+        assert "token" not in other
+    finally:
+        other.close()
+
+
+def test_keys_and_values_are_not_stored_in_the_clear(cache, path):
+    cache["session-token"] = "api-key-value"
+    with open(path, "rb") as f:
+        contents = f.read()
+    with open(f"{path}-wal", "rb") as f:
+        contents += f.read()
+    assert b"session-token" not in contents
+    assert b"api-key-value" not in contents
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+
+def test_undecryptable_entries_are_misses(cache):
+    cache["token"] = "value"
+    digest = cache._digest("token")
+    with cache._db:
+        cache._db.execute("UPDATE things SET value = ? WHERE key = ?", (b"x", digest))
+    with pytest.raises(KeyError):
+        cache["token"]
+
+
+def test_last_close_deletes_the_file(path):
+    first = SQLiteCache(path, "things", maxsize=10, ttl=60)
+    second = SQLiteCache(path, "others", maxsize=10, ttl=60)
+    first["token"] = "value"
+    close_caches(first)
+    assert os.path.exists(path)
+    close_caches(second, TTLCache(maxsize=1, ttl=1))
+    assert not os.path.exists(path)
+    assert not os.path.exists(f"{path}-wal")
+
+
+def _compute_in_process(path, results):
+    cache = SQLiteCache(path, "things", maxsize=10, ttl=60)
+
+    def compute():
+        results.put("computed")
+        time.sleep(0.2)
+        return "value"
+
+    try:
+        assert compute_once(cache, "token", compute) == "value"
+    finally:
+        cache.close()
+
+
+def test_compute_once_across_processes(path):
+    # Hold the file open so the workers' closes don't delete it mid-test.
+    holder = SQLiteCache(path, "things", maxsize=10, ttl=60)
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    workers = [
+        context.Process(target=_compute_in_process, args=(path, results))
+        for _ in range(4)
+    ]
+    try:
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=10)
+        assert [worker.exitcode for worker in workers] == [0] * 4
+        assert results.qsize() == 1
+        assert holder["token"] == "value"
+    finally:
+        holder.close()
+
+
+def test_compute_once_with_a_memory_cache():
+    cache = TTLCache(maxsize=1, ttl=60)
+    assert compute_once(cache, "token", lambda: "value") == "value"
+
+
+def test_make_cache(path):
+    assert isinstance(make_cache("memory", path, "things", 10, 60), TTLCache)
+    sqlite = make_cache("sqlite", path, "things", 10, 60)
+    assert isinstance(sqlite, SQLiteCache)
+    sqlite.close()
+    with pytest.raises(ValueError, match="Unknown cache backend 'redis'"):
+        make_cache("redis", path, "things", 10, 60)
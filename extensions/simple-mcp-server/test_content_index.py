@@ -0,0 +1,127 @@
+import threading
+
+import pytest
+
+from content_index import DESCRIPTION_CHARS, ContentIndex
+
+
+def item(guid, title, deployed, description="", tags=()):
+    return {
+        "guid": guid,
+        "name": guid,
+        "title": title,
+        "description": description,
+        "tags": [{"name": tag} for tag in tags],
+        "last_deployed_time": deployed,
+    }
+
+
+def guids(results):
+    return [result["guid"] for result in results]
+
+
+@pytest.fixture
+def content():
+    return [
+        item("sales", "Sales Dashboard", "2024-03-01T00:00:00Z", tags=["finance"]),
+        item("report", "Quarterly Report", "2024-02-01T00:00:00Z", "Sales by region"),
+        item("api", "Model API", "2024-01-01T00:00:00Z"),
+    ]
+
+
+@pytest.fixture
+def index(content):
+    index = ContentIndex(max_age=60)
+    index.refresh(lambda: content)
+    return index
+
+
+def test_stale_until_refreshed(index):
+    assert ContentIndex(max_age=60).stale
+    assert not index.stale
+    assert ContentIndex(max_age=0).stale
+
+
+class TestSearch:
+    def test_title_outranks_description(self, index):
+        results, total = index.search("sales", limit=10)
+        assert guids(results) == ["sales", "report"]
+        assert total == 2
+
+    def test_words_match_by_prefix(self, index):
+        assert guids(index.search("quart", limit=10)[0]) == ["report"]
+
+    def test_tags_match(self, index):
+        assert guids(index.search("finance", limit=10)[0]) == ["sales"]
+
+    def test_more_query_words_matched_rank_first(self, index):
+        # "find the" match nothing; "region" only matches the report.
+        results, _ = index.search("find the sales region", limit=10)
+        assert guids(results) == ["report", "sales"]
+
+    def test_limit_keeps_the_total(self, index):
+        results, total = index.search("sales", limit=1)
+        assert guids(results) == ["sales"]
+        assert total == 2
+
+    def test_no_match(self, index):
+        assert index.search("weather", limit=10) == ([], 0)
+
+
+def test_recent_pages_by_deployment(index):
+    results, total = index.recent(limit=2)
+    assert guids(results) == ["sales", "report"]
+    assert total == 3
+    assert guids(index.recent(limit=2, offset=2)[0]) == ["api"]
+
+
+def test_long_descriptions_are_shortened():
+    index = ContentIndex(max_age=60)
+    index.refresh(lambda: [item("long", "Long", None, "word " * 100)])
+    description = index.recent(limit=1)[0][0]["description"]
+    assert len(description) <= DESCRIPTION_CHARS
+    assert description.endswith("…")
+
+
+class TestRefresh:
+    def test_changed_items_are_reindexed(self, index, content):
+        content[2] = item("api", "Forecast API", "2024-04-01T00:00:00Z")
+        index.refresh(lambda: content)
+        assert guids(index.search("forecast", limit=10)[0]) == ["api"]
+        assert index.search("model", limit=10) == ([], 0)
+        assert guids(index.recent(limit=1)[0]) == ["api"]
+
+    def test_removed_items_are_dropped(self, index, content):
+        index.refresh(lambda: content[1:])
+        assert guids(index.search("sales", limit=10)[0]) == ["report"]
+        assert index.search("finance", limit=10) == ([], 0)
+        assert index.recent(limit=10)[1] == 2
+
+    def test_unchanged_items_keep_their_latest_details(self, index, content):
+        content[0] = {**content[0], "dashboard_url": "https://connect/sales"}
+        index.refresh(lambda: content)
+        assert index.search("sales", limit=1)[0][0]["url"] == "https://connect/sales"
+
+    def test_concurrent_refreshes_fetch_once(self, content):
+        index = ContentIndex(max_age=60)
+        fetching = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            fetching.set()
+            release.wait()
+            return content
+
+        first = threading.Thread(target=index.refresh, args=(fetch,))
+        first.start()
+        fetching.wait()
+        second = threading.Thread(target=index.refresh, args=(fetch,))
+        second.start()
+        release.set()
+        first.join()
+        second.join()
+
+        assert len(calls) == 1
+        assert index.recent(limit=10)[1] == 3
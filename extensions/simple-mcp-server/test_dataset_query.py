@@ -0,0 +1,130 @@
+import json
+
+import pandas as pd
+import pytest
+
+from dataset_query import Filter, run_query, to_compact_json
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame(
+        {
+            "A": [1, 2, 3, 4, 5],
+            "B": [5.0, 4.0, None, 2.0, 1.0],
+            "C": ["x", "y", "x", "z", "y"],
+        }
+    )
+
+
+def page(df, limit=50, max_tokens=2000, offset=0):
+    return json.loads(to_compact_json(df, limit, max_tokens, offset))
+
+
+class TestFilters:
+    @pytest.mark.parametrize(
+        ("condition", "expected"),
+        [
+            (Filter(column="A", op=">", value=3), [4, 5]),
+            (Filter(column="A", op="<=", value=2), [1, 2]),
+            (Filter(column="C", value="x"), [1, 3]),
+            (Filter(column="C", op="!=", value="x"), [2, 4, 5]),
+            (Filter(column="C", op="in", value=["x", "z"]), [1, 3, 4]),
+            (Filter(column="C", op="not in", value=["x", "z"]), [2, 5]),
+            (Filter(column="C", op="contains", value="y"), [2, 5]),
+            (Filter(column="B", op="is null"), [3]),
+            (Filter(column="B", op="not null"), [1, 2, 4, 5]),
+        ],
+    )
+    def test_operators(self, df, condition, expected):
+        result = run_query(df, columns=["A"], filters=[condition])
+        assert result["A"].tolist() == expected
+
+    def test_filters_combine(self, df):
+        filters = [
+            Filter(column="C", value="y"),
+            Filter(column="A", op=">", value=2),
+        ]
+        assert run_query(df, columns=["A"], filters=filters)["A"].tolist() == [5]
+
+    def test_in_needs_a_list(self, df):
+        with pytest.raises(ValueError, match="needs a list"):
+            run_query(df, filters=[Filter(column="C", op="in", value="x")])
+
+    def test_incomparable_value(self, df):
+        with pytest.raises(ValueError, match="Can't compare column 'C'"):
+            run_query(df, filters=[Filter(column="C", op=">", value=1)])
+
+    def test_unknown_column(self, df):
+        with pytest.raises(ValueError, match="Unknown filter column"):
+            run_query(df, filters=[Filter(column="D", value=1)])
+
+
+class TestAggregation:
+    def test_group_and_aggregate(self, df):
+        result = run_query(df, group_by=["C"], aggregations={"A": "sum"}, sort_by=["C"])
+        assert result.to_dict("list") == {"C": ["x", "y", "z"], "A_sum": [4, 7, 4]}
+
+    def test_grouping_alone_counts(self, df):
+        result = run_query(df, group_by=["C"], sort_by=["count"], descending=True)
+        assert result.set_index("C")["count"].to_dict() == {"x": 2, "y": 2, "z": 1}
+
+    def test_aggregate_without_grouping(self, df):
+        result = run_query(df, aggregations={"A": "mean", "B": "max"})
+        assert result.to_dict("records") == [{"A_mean": 3.0, "B_max": 5.0}]
+
+    def test_unknown_aggregation(self, df):
+        with pytest.raises(ValueError, match="Unknown aggregation 'mode'"):
+            run_query(df, aggregations={"A": "mode"})
+
+    def test_sort_by_a_column_the_result_lacks(self, df):
+        with pytest.raises(ValueError, match="Unknown sort column"):
+            run_query(df, group_by=["C"], aggregations={"A": "sum"}, sort_by=["A"])
+
+
+class TestPaging:
+    def test_first_page(self, df):
+        result = page(df, limit=2)
+        assert result["rows"] == [[1, 5.0, "x"], [2, 4.0, "y"]]
+        assert result["total_rows"] == 5
+        assert result["truncated"] is True
+        assert result["next_offset"] == 2
+
+    def test_last_page(self, df):
+        result = page(df, limit=2, offset=4)
+        assert result["rows"] == [[5, 1.0, "y"]]
+        assert result["truncated"] is False
+        assert result["next_offset"] is None
+
+    def test_pages_cover_every_row_once(self, df):
+        rows, offset = [], 0
+        while offset is not None:
+            result = page(df, limit=2, offset=offset)
+            rows.extend(result["rows"])
+            offset = result["next_offset"]
+        assert [row[0] for row in rows] == [1, 2, 3, 4, 5]
+
+    def test_token_budget_cuts_the_page_short(self, df):
+        # Room for the columns and about two rows.
+        result = page(df, limit=5, max_tokens=34)
+        assert 0 < len(result["rows"]) < 5
+        assert result["truncated"] is True
+        assert result["next_offset"] == len(result["rows"])
+
+    def test_a_row_too_large_for_the_budget_is_an_error(self, df):
+        # An empty page pointing back at its own offset would loop forever.
+        with pytest.raises(ValueError, match="doesn't fit in max_tokens=5"):
+            page(df, limit=5, max_tokens=5)
+
+    def test_past_the_end(self, df):
+        result = page(df, offset=10)
+        assert result["rows"] == []
+        assert result["next_offset"] is None
+
+    def test_limit_is_at_least_one(self, df):
+        result = page(df, limit=0)
+        assert len(result["rows"]) == 1
+        assert result["next_offset"] == 1
+
+    def test_missing_values_are_null(self, df):
+        assert page(df, limit=1, offset=2)["rows"] == [[3, None, "x"]]
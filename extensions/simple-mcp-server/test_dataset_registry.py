@@ -0,0 +1,112 @@
+import os
+
+import pandas as pd
+import pytest
+
+from dataset_registry import DatasetRegistry
+
+
+def frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({"A": range(rows)})
+
+
+class CountingLoader:
+    def __init__(self, rows: int = 10):
+        self.rows = rows
+        self.calls = 0
+
+    def __call__(self) -> pd.DataFrame:
+        self.calls += 1
+        return frame(self.rows)
+
+
+@pytest.fixture
+def registry():
+    return DatasetRegistry(max_bytes=2**20)
+
+
+def test_nothing_loads_until_used(registry):
+    loader = CountingLoader()
+    registry.register("data", loader)
+    assert registry.names() == ["data"]
+    assert loader.calls == 0
+
+
+def test_loaded_once(registry):
+    loader = CountingLoader()
+    registry.register("data", loader)
+    assert registry.get("data") is registry.get("data")
+    registry.summary("data")
+    assert loader.calls == 1
+
+
+def test_new_version_reloads(registry):
+    loader = CountingLoader()
+    version = ["1"]
+    registry.register("data", loader, lambda: version[0])
+    first_summary = registry.summary("data")
+
+    loader.rows = 20
+    version[0] = "2"
+    assert len(registry.get("data")) == 20
+    assert registry.summary("data") != first_summary
+    assert loader.calls == 2
+
+
+def test_least_recently_used_is_evicted_by_size():
+    size = int(frame(1000).memory_usage(deep=True).sum())
+    # Room for two of the three datasets.
+    registry = DatasetRegistry(max_bytes=size * 2 + size // 2)
+    loaders = {name: CountingLoader(1000) for name in ("a", "b", "c")}
+    for name, loader in loaders.items():
+        registry.register(name, loader)
+
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")  # Now "b" is the least recently used.
+    registry.get("c")
+    registry.get("a")
+    registry.get("b")
+
+    assert {name: loader.calls for name, loader in loaders.items()} == {
+        "a": 1,
+        "b": 2,
+        "c": 1,
+    }
+
+
+def test_unknown_dataset(registry):
+    with pytest.raises(KeyError, match="Dataset 'nope' not found."):
+        registry.get("nope")
+
+
+def test_register_directory(tmp_path, registry):
+    df = pd.DataFrame({"A": [1, 2, 3], "B": ["x", "y", "z"]})
+    df.to_csv(tmp_path / "from_csv.csv", index=False)
+    df.to_parquet(tmp_path / "from_parquet.parquet")
+    df.to_feather(tmp_path / "from_feather.feather")
+    (tmp_path / "notes.txt").write_text("not a dataset")
+
+    names = registry.register_directory(tmp_path)
+
+    assert names == ["from_csv", "from_feather", "from_parquet"]
+    for name in names:
+        pd.testing.assert_frame_equal(registry.get(name), df)
+
+
+def test_changed_file_is_reloaded(tmp_path, registry):
+    path = tmp_path / "data.csv"
+    pd.DataFrame({"A": [1]}).to_csv(path, index=False)
+    registry.register_file(path)
+    assert registry.get("data")["A"].tolist() == [1]
+
+    pd.DataFrame({"A": [1, 2]}).to_csv(path, index=False)
+    # Make sure the modification time moves, however coarse the filesystem's clock.
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert registry.get("data")["A"].tolist() == [1, 2]
+
+
+def test_unsupported_file(tmp_path, registry):
+    with pytest.raises(ValueError, match="Unsupported dataset file type"):
+        registry.register_file(tmp_path / "data.xlsx")
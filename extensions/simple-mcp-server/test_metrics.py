@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from metrics import BUCKETS, Histogram, Metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram()
+    for seconds in (0.001, 0.02, 0.02, 100):
+        histogram.observe(seconds)
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 4
+    assert snapshot["max"] == 100
+    assert snapshot["buckets"]["0.005"] == 1
+    assert snapshot["buckets"]["0.025"] == 3
+    assert snapshot["buckets"][str(BUCKETS[-1])] == 3
+    assert snapshot["buckets"]["+Inf"] == 4
+
+
+def test_tool_calls_and_errors():
+    metrics = Metrics()
+    with metrics.tool_call("query"):
+        pass
+    with pytest.raises(RuntimeError), metrics.tool_call("query"):
+        raise RuntimeError
+
+    query = metrics.snapshot()["tools"]["query"]
+    assert query["calls"] == 2
+    assert query["errors"] == 1
+    assert query["in_flight"] == 0
+    assert query["latency"]["count"] == 2
+
+
+def test_phases_are_attributed_to_the_current_call():
+    metrics = Metrics()
+    with metrics.tool_call("whoami"), metrics.phase("connect.me"):
+        pass
+    with metrics.phase("connect.me"):
+        pass
+
+    snapshot = metrics.snapshot()
+    assert snapshot["tools"]["whoami"]["phases"]["connect.me"]["count"] == 1
+    assert snapshot["other_phases"]["connect.me"]["count"] == 1
+
+
+def test_concurrency_is_tracked():
+    metrics = Metrics()
+    inside = threading.Barrier(3)
+    leave = threading.Event()
+
+    def call():
+        with metrics.tool_call("slow"):
+            inside.wait()
+            leave.wait()
+
+    threads = [threading.Thread(target=call) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    inside.wait()
+    assert metrics.snapshot()["tools"]["slow"]["in_flight"] == 2
+    leave.set()
+    for thread in threads:
+        thread.join()
+
+    slow = metrics.snapshot()["tools"]["slow"]
+    assert slow["in_flight"] == 0
+    assert slow["max_in_flight"] == 2
+
+
+def test_routes_and_failures():
+    metrics = Metrics()
+    with metrics.request("/"):
+        pass
+    metrics.route_failed("/")
+    root = metrics.snapshot()["routes"]["/"]
+    assert root["calls"] == 1
+    assert root["errors"] == 1
@@ -1,6 +1,13 @@
+import asyncio
+import hashlib
+import json
 import os
+import re
+import tempfile
+import time
 import traceback
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 import chatlas
 import faicons
@@ -11,6 +18,11 @@ from posit.connect.errors import ClientError
 from shiny import App, Inputs, Outputs, Session, reactive, render, ui
 from dotenv import load_dotenv
 
+from context_budget import ContextBudget
+from http_pool import viewer_client
+from mcp_registry import SavedRegistry, register_servers
+from tool_calls import ParallelToolCalls
+
 load_dotenv()
 
 # Zero-config fallback model, used only when no LLM provider is configured. Bedrock
@@ -18,23 +30,92 @@ load_dotenv()
 BEDROCK_MODEL = "us.anthropic.claude-sonnet-4-5-20250929-v1:0"
 
 
+# A successful credential check is remembered in this file for BEDROCK_CHECK_TTL
+# seconds, so a restarted process using the same credentials doesn't check again.
+BEDROCK_CHECK_TTL = int(os.getenv("BEDROCK_CHECK_TTL", "3600"))
+BEDROCK_CHECK_PATH = os.path.join(
+    tempfile.gettempdir(), "simple-shiny-chat-with-mcp-bedrock-check.json"
+)
+
+
+def _credentials_fingerprint(credentials) -> str:
+    # Which credentials were checked: where they came from and their access key ID,
+    # hashed so the file doesn't name the key.
+    access_key = credentials.get_frozen_credentials().access_key
+    return hashlib.sha256(f"{credentials.method}\0{access_key}".encode()).hexdigest()
+
+
+def _checked_recently(fingerprint: str) -> bool:
+    # Whether these same credentials passed the check within BEDROCK_CHECK_TTL.
+    try:
+        with open(BEDROCK_CHECK_PATH) as f:
+            check = json.load(f)
+        return (
+            check["credentials"] == fingerprint
+            and time.time() - check["checked_at"] < BEDROCK_CHECK_TTL
+        )
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+
+def _remember_check(fingerprint: str, identity: dict) -> None:
+    # Written readable only by this user, then moved into place whole, so a process
+    # reading it never sees half a file.
+    temp_path = f"{BEDROCK_CHECK_PATH}.{os.getpid()}"
+    try:
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(
+                {
+                    "checked_at": time.time(),
+                    "credentials": fingerprint,
+                    "account": identity.get("Account"),
+                    "arn": identity.get("Arn"),
+                },
+                f,
+            )
+        os.replace(temp_path, BEDROCK_CHECK_PATH)
+    except OSError as e:
+        print(f"Couldn't cache the AWS Bedrock credential check. Err: {e}")
+
+
 def check_aws_bedrock_credentials():
-    # Probe for usable Bedrock credentials by making a real (throwaway) Bedrock call.
-    # Bedrock is the zero-config fallback: this only runs when no provider is set via
-    # CHATLAS_CHAT_PROVIDER_MODEL, so an explicit choice is never probed over.
+    # Check for usable AWS credentials without calling the model: resolve them the way
+    # Bedrock's client would, then confirm they're valid with STS GetCallerIdentity,
+    # which needs no permissions and costs nothing. Bedrock is the zero-config
+    # fallback: this only runs when no provider is set via CHATLAS_CHAT_PROVIDER_MODEL,
+    # so an explicit choice is never checked over.
     try:
-        chat = chatlas.ChatBedrockAnthropic(
-            model=BEDROCK_MODEL,
+        import boto3
+        from botocore.config import Config
+
+        aws = boto3.Session()
+        credentials = aws.get_credentials()
+        if credentials is None:
+            raise RuntimeError("no AWS credentials found")
+        fingerprint = _credentials_fingerprint(credentials)
+        if _checked_recently(fingerprint):
+            return True
+        sts = aws.client(
+            "sts",
+            region_name=aws.region_name or "us-east-1",
+            # Sessions wait on this check, so don't let an unreachable STS hold them.
+            config=Config(
+                connect_timeout=5, read_timeout=5, retries={"max_attempts": 1}
+            ),
         )
-        chat.chat("test", echo="none")
-        return True
+        identity = sts.get_caller_identity()
     except Exception as e:
         print(
-            f"AWS Bedrock credential probe failed; with no LLM provider configured, "
+            f"AWS Bedrock credential check failed; with no LLM provider configured, "
             f"the app will show the setup screen. Err: {e}"
         )
         return False
 
+    # Only a success is remembered, so fixing the credentials takes effect on restart.
+    _remember_check(fingerprint, identity)
+    return True
+
 
 # The LLM provider comes from environment variables that chatlas reads itself
 # (`CHATLAS_CHAT_PROVIDER_MODEL`, plus the deprecated `CHATLAS_CHAT_PROVIDER` and
@@ -42,12 +123,48 @@ def check_aws_bedrock_credentials():
 # configured, which decides whether to show the setup screen.
 CHATLAS_CHAT_PROVIDER = os.getenv("CHATLAS_CHAT_PROVIDER")
 CHATLAS_CHAT_PROVIDER_MODEL = os.getenv("CHATLAS_CHAT_PROVIDER_MODEL")
-# An explicitly configured provider always wins; only probe for Bedrock credentials
-# as the zero-config fallback when nothing is set.
-HAS_AWS_BEDROCK_CREDENTIALS = (
-    check_aws_bedrock_credentials()
+# An explicitly configured provider always wins; only check for Bedrock credentials
+# as the zero-config fallback when nothing is set. The check runs in the background,
+# so the app starts serving at once; sessions wait for it only to pick their screen.
+_bedrock_check = (
+    ThreadPoolExecutor(max_workers=1).submit(check_aws_bedrock_credentials)
     if not (CHATLAS_CHAT_PROVIDER_MODEL or CHATLAS_CHAT_PROVIDER)
-    else False
+    else None
+)
+
+
+async def has_llm():
+    # Whether a model is configured: a provider, or Bedrock credentials that checked out.
+    if _bedrock_check is None:
+        return True
+    return await asyncio.wrap_future(_bedrock_check)
+
+
+# How long one MCP server may take to connect and list its tools before registering it
+# fails. Servers are registered concurrently, each with its own timeout.
+MCP_REGISTER_TIMEOUT = float(os.getenv("MCP_REGISTER_TIMEOUT", "15"))
+
+# How many of one turn's MCP tool calls run at once (1 runs them one at a time), and
+# which: "read-only" for only the tools their server marks as read-only, or "all".
+MCP_TOOL_CONCURRENCY = int(os.getenv("MCP_TOOL_CONCURRENCY", "4"))
+MCP_PARALLEL_TOOLS = os.getenv("MCP_PARALLEL_TOOLS", "read-only")
+
+# Before each message, keep the conversation sent to the LLM within about
+# CONTEXT_TOKEN_BUDGET tokens (see context_budget.py). The last CONTEXT_KEEP_EXCHANGES
+# exchanges are always sent whole; older tool outputs are compacted by CONTEXT_POLICY
+# ("truncate" to CONTEXT_TOOL_OUTPUT_CHARS characters, "drop", or "off"), and then the
+# oldest exchanges dropped, until it fits.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "50000"))
+CONTEXT_KEEP_EXCHANGES = int(os.getenv("CONTEXT_KEEP_EXCHANGES", "3"))
+CONTEXT_POLICY = os.getenv("CONTEXT_POLICY", "truncate")
+CONTEXT_TOOL_OUTPUT_CHARS = int(os.getenv("CONTEXT_TOOL_OUTPUT_CHARS", "1000"))
+
+# Each viewer's registered MCP servers, restored at the start of their next session.
+saved_registry = SavedRegistry(
+    os.getenv(
+        "MCP_REGISTRY_PATH",
+        os.path.join(tempfile.gettempdir(), "simple-shiny-chat-with-mcp-registry.json"),
+    )
 )
 
 # Shared styling for the setup screen.
@@ -161,9 +278,9 @@ _INTEGRATION_SETUP_SECTION = (
     ui.h2("Connect Visitor API Key", class_="setup-section-title"),
     ui.div(
         ui.HTML(
-            "This app needs a \"Connect Visitor API Key\" integration so its tools run "
+            'This app needs a "Connect Visitor API Key" integration so its tools run '
             "as the signed-in viewer. In the content settings, on the "
-            "<strong>Access</strong> tab, add the \"Connect Visitor API Key\" integration under "
+            '<strong>Access</strong> tab, add the "Connect Visitor API Key" integration under '
             "<strong>Integrations</strong>. "
             "For more information, "
             '<a href="https://docs.posit.co/connect/user/oauth-integrations/" class="setup-link" target="_blank" rel="noopener">see the OAuth Integrations documentation</a>.'
@@ -195,13 +312,17 @@ def setup_ui(need_llm: bool, need_integration: bool):
         fillable=True,
     )
 
+
 app_ui = ui.page_fillable(
     ui.layout_sidebar(
         ui.sidebar(
             ui.h3("MCP Registry"),
             ui.output_ui("identity_note"),
-            ui.p("Add the URLs of the MCP servers you want to use below."),
-            ui.input_text("mcp_address", None, placeholder="Enter an MCP server URL"),
+            ui.p(
+                "Add the URLs of the MCP servers you want to use below. Separate "
+                "several URLs with spaces to add them at once."
+            ),
+            ui.input_text("mcp_address", None, placeholder="Enter MCP server URLs"),
             ui.input_action_button(
                 id="add_server", label="Add Server", class_="btn-primary mb-3 w-100"
             ),
@@ -258,6 +379,7 @@ app_ui = ui.page_fillable(
 
 screen_ui = ui.page_output("screen")
 
+
 def server(input: Inputs, output: Outputs, session: Session):
     user_session_token = session.http_conn.headers.get(
         "Posit-Connect-User-Session-Token"
@@ -268,6 +390,7 @@ def server(input: Inputs, output: Outputs, session: Session):
     # integration means no viewer key, so registering a server is blocked below.
     visitor_api_key = None
     viewer_name = None
+    viewer_guid = None
     connect_origin = None
     visitor_api_integration_enabled = True
     if user_session_token:
@@ -279,6 +402,7 @@ def server(input: Inputs, output: Outputs, session: Session):
             connect_url = httpx.URL(visitor_client.cfg.url)
             connect_origin = (connect_url.scheme, connect_url.host, connect_url.port)
             me = visitor_client.me
+            viewer_guid = me.get("guid")
             viewer_name = (
                 f"{me.get('first_name', '')} {me.get('last_name', '')}".strip()
                 or me.get("username")
@@ -295,19 +419,12 @@ def server(input: Inputs, output: Outputs, session: Session):
             # e.g. a malformed token exchange; log it but keep the session alive.
             traceback.print_exc()
 
-    # One HTTP client per viewer, carrying their key, shared by every MCP server they
-    # register. The MCP transport takes auth through a client, not a `headers` argument.
+    # One HTTP client per viewer, used by every MCP server they register. The MCP
+    # transport takes auth through a client, not a `headers` argument. The client holds
+    # no connections of its own: it sends through the process-wide pool, adding the
+    # viewer's key only to requests for this Connect server (see http_pool.py).
     mcp_http_client = (
-        httpx.AsyncClient(
-            headers={"Authorization": f"Key {visitor_api_key}"},
-            # Passing our own client overrides the one the MCP SDK would build, so match
-            # its defaults: a 30s timeout with a long (300s) read for streamed responses,
-            # and redirect following so a trailing-slash URL still resolves.
-            timeout=httpx.Timeout(30, read=300),
-            follow_redirects=True,
-        )
-        if visitor_api_key
-        else None
+        viewer_client(visitor_api_key, connect_origin) if visitor_api_key else None
     )
 
     system_prompt = """\
@@ -317,26 +434,41 @@ Always show the raw output of the tools you call, and do not modify it. For all
 If a user's request would require multiple tool calls, create a plan of action for the user to confirm before executing those tools. The user must confirm the plan.</prime-directive>"""
 
     # Pick the LLM: the explicitly configured provider wins; Bedrock is the zero-config
-    # fallback. `chat` stays None when neither is set, which drives the setup screen.
-    chat = None
+    # fallback. Building the Bedrock chat makes no request, so it's built before its
+    # credential check finishes; `has_llm()` decides whether the setup screen shows.
     if CHATLAS_CHAT_PROVIDER_MODEL or CHATLAS_CHAT_PROVIDER:
         chat = chatlas.ChatAuto(system_prompt=system_prompt)
-    elif HAS_AWS_BEDROCK_CREDENTIALS:
+    else:
         chat = chatlas.ChatBedrockAnthropic(
             model=BEDROCK_MODEL,
             system_prompt=system_prompt,
         )
 
-    # When the viewer's session ends, close their MCP server connections first, then the
-    # shared client. Order matters: closing a session can send a termination request over
-    # the client, so it must still be open; and the MCP transport won't close a client we
-    # passed in, so we do it here.
+    # Run the MCP tool calls the LLM asks for in one turn concurrently, rather than one
+    # after another.
+    tool_calls = ParallelToolCalls(chat, MCP_TOOL_CONCURRENCY, MCP_PARALLEL_TOOLS)
+
+    # The system prompt asks for raw tool output, so old outputs would otherwise be
+    # resent with every message for the rest of the session.
+    context = ContextBudget(
+        chat,
+        max_tokens=CONTEXT_TOKEN_BUDGET,
+        keep_exchanges=CONTEXT_KEEP_EXCHANGES,
+        policy=CONTEXT_POLICY,
+        tool_output_chars=CONTEXT_TOOL_OUTPUT_CHARS,
+    )
+
+    # When the viewer's session ends, close their MCP server sessions first, then their
+    # client. Order matters: closing a session can send a termination request over the
+    # client, so it must still be open; and the MCP transport won't close a client we
+    # passed in, so we do it here. Closing the client leaves the shared pool, and its
+    # warm connections, open for other sessions.
     if mcp_http_client is not None:
 
         async def close_mcp_resources():
             try:
-                if chat is not None:
-                    await chat.cleanup_mcp_tools()
+                tool_calls.cancel()
+                await chat.cleanup_mcp_tools()
             finally:
                 # Always close the client, even if session cleanup errored, so it
                 # can't leak.
@@ -352,10 +484,11 @@ If a user's request would require multiple tool calls, create a plan of action f
     chat_ui = ui.Chat("chat", on_error="actual")
 
     @render.ui
-    def screen():
-        if chat is None or not visitor_api_integration_enabled:
+    async def screen():
+        llm_configured = await has_llm()
+        if not llm_configured or not visitor_api_integration_enabled:
             return setup_ui(
-                need_llm=chat is None,
+                need_llm=not llm_configured,
                 need_integration=not visitor_api_integration_enabled,
             )
         return app_ui
@@ -376,10 +509,16 @@ If a user's request would require multiple tool calls, create a plan of action f
 
     @chat_ui.on_user_submit
     async def _(user_input: str):
+        record = context.compact()
         await chat_ui.append_message_stream(
-            await chat.stream_async(
-                user_input,
-                content="all",
+            context.track(
+                record,
+                tool_calls.guard(
+                    await chat.stream_async(
+                        user_input,
+                        content="all",
+                    )
+                ),
             )
         )
 
@@ -416,11 +555,71 @@ If a user's request would require multiple tool calls, create a plan of action f
 
         return ui.div(*cards, class_="d-grid gap-2")
 
+    def transport_kwargs(url):
+        # Every server is reached through the viewer's client, so through the shared
+        # pool. The client forwards the viewer's Connect key only to this Connect
+        # server: a Connect key is meaningless to any other origin and must never leak
+        # to one, so off-Connect servers are reached without it.
+        return {"http_client": mcp_http_client}
+
+    def save_servers(servers):
+        if viewer_guid:
+            saved_registry.save(viewer_guid, [srv["url"] for srv in servers])
+
+    def show_registrations(results, verb):
+        # Add a card for each server that registered, remember the viewer's servers for
+        # their next session, and report each failure. A server that fails to restore
+        # is dropped from the saved list, so it isn't retried every session.
+        added = [r for r in results if r.error is None]
+        for r in added:
+            tool_calls.add_tools(r.tools)
+        with reactive.isolate():
+            servers = registered_servers() + [
+                {"id": uuid.uuid4().hex, "name": r.name, "url": r.url, "tools": r.tools}
+                for r in added
+            ]
+        registered_servers.set(servers)
+        save_servers(servers)
+
+        for r in results:
+            if r.error is not None:
+                traceback.print_exception(r.error)
+                ui.notification_show(
+                    f"Couldn't {verb} server {r.url}: {r.error}", type="error"
+                )
+        if added:
+            names = ", ".join(f"'{r.name}'" for r in added)
+            done = "Added" if verb == "add" else "Restored"
+            servers_word = "server" if len(added) == 1 else "servers"
+            ui.notification_show(f"{done} MCP {servers_word} {names}.", type="message")
+
+    @reactive.extended_task
+    async def restore_servers(urls):
+        return await register_servers(
+            chat, urls, timeout=MCP_REGISTER_TIMEOUT, transport_kwargs=transport_kwargs
+        )
+
+    @reactive.effect
+    async def _():
+        # Reconnect the viewer's saved servers once, when the session starts. It runs as
+        # a background task, so the chat is usable while the servers connect.
+        if not visitor_api_key or not viewer_guid or not await has_llm():
+            return
+        urls = saved_registry.load(viewer_guid)
+        if urls:
+            restore_servers.invoke(urls)
+
+    @reactive.effect
+    def _():
+        show_registrations(restore_servers.result(), "restore")
+
     @reactive.effect
     @reactive.event(input.add_server)
     async def add_server():
-        url = (input.mcp_address() or "").strip()
-        if not url:
+        # Several URLs can be entered at once, separated by spaces or commas.
+        urls = list(dict.fromkeys(re.split(r"[\s,]+", input.mcp_address() or "")))
+        urls = [url for url in urls if url]
+        if not urls:
             ui.notification_show("Please enter an MCP server URL", type="error")
             return
 
@@ -432,60 +631,30 @@ If a user's request would require multiple tool calls, create a plan of action f
             )
             return
 
-        if any(srv["url"] == url for srv in registered_servers()):
-            # Re-registering a server chatlas already tracks would raise; catch the
-            # common case (the same URL) here and warn, instead of surfacing that error.
+        if restore_servers.status() == "running":
             ui.notification_show(
-                "That MCP server is already registered.", type="warning"
+                "Still reconnecting your saved servers. Try again in a moment.",
+                type="warning",
             )
             return
 
-        try:
-            # Forward the viewer's Connect key only to MCP servers on this Connect
-            # server. A Connect key is meaningless to any other origin and must never
-            # leak to one, so off-Connect servers are reached without it (chatlas builds
-            # its own client).
-            transport_kwargs = {}
-            target = httpx.URL(url)
-            if (target.scheme, target.host, target.port) == connect_origin:
-                transport_kwargs["http_client"] = mcp_http_client
-
-            await chat.register_mcp_tools_http_stream_async(
-                url=url,
-                transport_kwargs=transport_kwargs,
-            )
-
-            # chatlas exposes no accessor for the registered servers/tools we need for the
-            # cards, so read its private session registry. A duplicate name raises above,
-            # so a successful call adds exactly one session; find it by diffing the names
-            # we already track.
-            sessions = chat._mcp_manager._mcp_sessions
-            current_servers = registered_servers()
-            existing_session_names = {srv["name"] for srv in current_servers}
-
-            new_servers = [
-                {
-                    "id": uuid.uuid4().hex,
-                    "name": session_name,
-                    "url": url,
-                    "tools": mcp_session.tools,
-                }
-                for session_name, mcp_session in sessions.items()
-                if session_name not in existing_session_names
-            ]
-
-            registered_servers.set(current_servers + new_servers)
-            ui.update_text("mcp_address", value="")
+        registered_urls = {srv["url"] for srv in registered_servers()}
+        if any(url in registered_urls for url in urls):
+            # Re-registering a server chatlas already tracks would raise; catch the
+            # common case (the same URL) here and warn, instead of surfacing that error.
             ui.notification_show(
-                f"Added MCP server '{new_servers[0]['name']}'.", type="message"
+                "That MCP server is already registered.", type="warning"
             )
+            urls = [url for url in urls if url not in registered_urls]
+            if not urls:
+                return
 
-        except Exception as e:
-            # chatlas wraps the real failure and chains it via `raise ... from`;
-            # surface that cause so the toast says why, not just "failed".
-            traceback.print_exc()
-            cause = e.__cause__ or e
-            ui.notification_show(f"Couldn't add server: {cause}", type="error")
+        results = await register_servers(
+            chat, urls, timeout=MCP_REGISTER_TIMEOUT, transport_kwargs=transport_kwargs
+        )
+        show_registrations(results, "add")
+        if all(r.error is None for r in results):
+            ui.update_text("mcp_address", value="")
 
     @reactive.effect
     async def handle_delete_buttons():
@@ -504,15 +673,22 @@ If a user's request would require multiple tool calls, create a plan of action f
                         type="error",
                     )
                     return
-                registered_servers.set([s for s in servers if s["id"] != srv["id"]])
-                ui.notification_show(
-                    f"Removed server '{srv['name']}'.", type="message"
-                )
+                remaining = [s for s in servers if s["id"] != srv["id"]]
+                registered_servers.set(remaining)
+                save_servers(remaining)
+                ui.notification_show(f"Removed server '{srv['name']}'.", type="message")
                 return
 
     @reactive.effect
     @reactive.event(input.info_link)
     async def _():
+        tokens = None
+        if messages := context.messages:
+            tokens = ui.p(
+                ui.tags.strong("Tokens sent: "),
+                f"{messages[-1]['input_tokens']:,} for the last message, "
+                f"{sum(m['input_tokens'] for m in messages):,} this session",
+            )
         modal = ui.modal(
             ui.h3("About this app"),
             ui.p(
@@ -523,6 +699,7 @@ If a user's request would require multiple tool calls, create a plan of action f
                 ui.tags.strong("Model: "),
                 f"{chat.provider.name} / {chat.provider.model}",
             ),
+            tokens,
             ui.p(
                 ui.tags.a(
                     "Learn more about the Model Context Protocol",
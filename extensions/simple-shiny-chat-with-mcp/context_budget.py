@@ -0,0 +1,216 @@
+"""Keeping the conversation sent to the LLM within a token budget.
+
+chatlas resends the whole conversation with every request, including the raw
+output of every tool called so far, so a long session grows slower and costlier
+with each message. Before each message, `ContextBudget` estimates the size of
+the conversation; once it's over the budget, it shrinks the oldest exchanges (a
+user message and everything the LLM and its tools did to answer it) until it
+fits:
+
+1. Their tool outputs are compacted, by policy: "truncate" keeps the start of
+   the text each output was sent as (a string, or other values' JSON), "drop"
+   replaces it with a note. Images and PDFs can't be cut, so both policies
+   replace them with the note. "off" leaves the conversation alone.
+2. If that isn't enough, the oldest exchanges are dropped whole.
+
+The most recent exchanges are always kept as they are, so the LLM still sees
+everything it just did. Compacting changes only what is sent to the LLM: the
+chat on screen keeps every tool output.
+
+After each message, the tokens the provider reports for it are recorded, so
+the effect on what each message costs can be seen.
+"""
+
+import json
+
+from chatlas import Chat
+from chatlas.types import (
+    ContentImage,
+    ContentPDF,
+    ContentText,
+    ContentThinking,
+    ContentToolRequest,
+    ContentToolResult,
+)
+
+POLICIES = ("truncate", "drop", "off")
+
+# A rough size for estimating before sending: about four characters per token, and
+# a flat size for an image or PDF, whatever its encoded length.
+CHARS_PER_TOKEN = 4
+FILE_TOKENS = 1500
+
+_NOTE = "[Earlier tool output {what} to save context. Call the tool again if needed.]"
+
+
+def _files(value) -> int:
+    # How many images and PDFs a tool returned as its value.
+    items = value if isinstance(value, (list, tuple)) else [value]
+    return sum(isinstance(item, (ContentImage, ContentPDF)) for item in items)
+
+
+def _points_to_files(result: ContentToolResult) -> bool:
+    # chatlas sends the images and PDFs a tool returned after its result, which then
+    # only says to see the <tool-content call-id="..."> below.
+    return (
+        result.request is not None
+        and isinstance(result.value, str)
+        and f'call-id="{result.id}"' in result.value
+    )
+
+
+def _content_tokens(content) -> int:
+    if isinstance(content, (ContentImage, ContentPDF)):
+        return FILE_TOKENS
+    if isinstance(content, ContentText):
+        text = content.text
+    elif isinstance(content, ContentThinking):
+        text = content.thinking
+    elif isinstance(content, ContentToolRequest):
+        text = content.name + json.dumps(content.arguments, default=str)
+    elif isinstance(content, ContentToolResult):
+        # Images and PDFs a tool returned are sent as files, anything else as text.
+        files = _files(content.value) if content.error is None else 0
+        if files:
+            return files * FILE_TOKENS
+        text = str(content.get_model_value())
+    else:
+        text = str(content)
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def estimate_tokens(turns) -> int:
+    """A rough count of the tokens `turns` take up when sent to the LLM."""
+    return sum(_content_tokens(c) for turn in turns for c in turn.contents)
+
+
+def _exchanges(turns) -> list[list]:
+    # A new exchange starts at each user turn that isn't just returning tool results.
+    exchanges: list[list] = []
+    for turn in turns:
+        is_prompt = turn.role == "user" and not any(
+            isinstance(c, ContentToolResult) for c in turn.contents
+        )
+        if is_prompt or not exchanges:
+            exchanges.append([])
+        exchanges[-1].append(turn)
+    return exchanges
+
+
+class ContextBudget:
+    """Compacts one chat's conversation to `max_tokens` before each message."""
+
+    def __init__(
+        self,
+        chat: Chat,
+        *,
+        max_tokens: int,
+        keep_exchanges: int,
+        policy: str,
+        tool_output_chars: int,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(
+                f"Unknown context policy {policy!r}; use one of: {', '.join(POLICIES)}"
+            )
+        self.max_tokens = max_tokens
+        self.keep_exchanges = keep_exchanges
+        self.policy = policy
+        self.tool_output_chars = tool_output_chars
+        self._chat = chat
+        # One record per message: the estimate before and after compacting, what was
+        # compacted, and the tokens the provider reported for answering it.
+        self.messages: list[dict] = []
+
+    def compact(self) -> dict:
+        """Bring the conversation within budget before a message is sent."""
+        turns = self._chat.get_turns()
+        before = estimate_tokens(turns)
+        record = {
+            "estimated_tokens_before": before,
+            "estimated_tokens_after": before,
+            "compacted_tool_outputs": 0,
+            "dropped_exchanges": 0,
+        }
+        if self.policy == "off" or before <= self.max_tokens:
+            return record
+
+        exchanges = _exchanges(turns)
+        keep = max(self.keep_exchanges, 0)
+        old = exchanges[: len(exchanges) - keep] if keep else exchanges
+        recent = exchanges[len(old) :]
+
+        total = before
+        for i, exchange in enumerate(old):
+            if total <= self.max_tokens:
+                break
+            compacted, count = self._compact_exchange(exchange)
+            total += estimate_tokens(compacted) - estimate_tokens(exchange)
+            record["compacted_tool_outputs"] += count
+            old[i] = compacted
+        while old and total > self.max_tokens:
+            total -= estimate_tokens(old.pop(0))
+            record["dropped_exchanges"] += 1
+
+        self._chat.set_turns([turn for exchange in old + recent for turn in exchange])
+        record["estimated_tokens_after"] = total
+        return record
+
+    def _compact_exchange(self, exchange: list) -> tuple[list, int]:
+        compacted, count = [], 0
+        for turn in exchange:
+            if not any(isinstance(c, ContentToolResult) for c in turn.contents):
+                compacted.append(turn)
+                continue
+            contents = []
+            for content in turn.contents:
+                if isinstance(content, ContentToolResult):
+                    new = self._compact_result(content)
+                    count += new is not content
+                    contents.append(new)
+                elif not isinstance(content, (ContentImage, ContentPDF, ContentText)):
+                    contents.append(content)
+                # Images and PDFs here are ones a tool returned, and text is chatlas's
+                # tags around them; the note on their result covers them.
+            compacted.append(turn.model_copy(update={"contents": contents}))
+        return compacted, count
+
+    def _compact_result(self, result: ContentToolResult) -> ContentToolResult:
+        if result.error is not None:
+            return result
+        removed = _NOTE.format(what="removed")
+        if isinstance(result.value, str) and result.value == removed:
+            return result
+        # Images and PDFs can't be cut, so they are removed under either policy.
+        has_files = _files(result.value) or _points_to_files(result)
+        if self.policy == "truncate" and not has_files:
+            # Cut the text the LLM was sent, which for a dict or list is its JSON.
+            text = result.get_model_value()
+            if isinstance(text, str):
+                if len(text) <= self.tool_output_chars + len(_NOTE) * 2:
+                    return result
+                kept = f"cut to {self.tool_output_chars} of {len(text)} characters"
+                value = f"{text[: self.tool_output_chars]}\n{_NOTE.format(what=kept)}"
+                return result.model_copy(update={"value": value})
+        return result.model_copy(update={"value": removed})
+
+    async def track(self, record: dict, stream):
+        """Pass `stream` through, then record the tokens its message used."""
+        start = len(self._chat.get_turns())
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            # A message can take several requests (one more per round of tool calls);
+            # each request's tokens are on the assistant turn it produced.
+            tokens = [
+                turn.tokens
+                for turn in self._chat.get_turns()[start:]
+                if turn.role == "assistant" and turn.tokens
+            ]
+            record["requests"] = len(tokens)
+            record["input_tokens"] = sum(t[0] for t in tokens)
+            record["output_tokens"] = sum(t[1] for t in tokens)
+            record["cached_input_tokens"] = sum(t[2] for t in tokens)
+            self.messages.append(record)
+            print(f"Context budget: {json.dumps(record)}")
@@ -0,0 +1,71 @@
+"""One HTTP connection pool for every session's MCP traffic.
+
+Each Shiny session used to build its own httpx client and close it when the
+session ended, so every page load opened (and TLS-handshook) new connections to
+the same MCP servers. Now every session sends through one process-wide pool,
+which keeps its open connections per origin (scheme, host and port), so a new
+session reuses connections an earlier one left warm.
+
+A session still gets its own client, but it holds no connections: it carries
+the viewer's credentials, added to each request by `ViewerKeyAuth`, and closing
+it leaves the shared pool open.
+"""
+
+import os
+
+import httpx
+
+# Keep idle connections open long enough to be reused by the next page load.
+POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("MCP_POOL_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=20,
+    keepalive_expiry=30,
+)
+
+
+class SharedTransport(httpx.AsyncBaseTransport):
+    """Sends requests through a pool that outlives the clients using it."""
+
+    def __init__(self, pool: httpx.AsyncBaseTransport):
+        self._pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._pool.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        # A client closing at the end of its session must not close the pool.
+        pass
+
+
+class ViewerKeyAuth(httpx.Auth):
+    """Adds a viewer's Connect API key to requests for one origin, and only that one.
+
+    The key is checked against each request's URL, so it can't be sent to another
+    server, whether that server was entered in the sidebar or redirected to.
+    """
+
+    def __init__(self, api_key: str, origin: tuple):
+        self._header = f"Key {api_key}"
+        self._origin = origin
+
+    def auth_flow(self, request: httpx.Request):
+        url = request.url
+        if (url.scheme, url.host, url.port) == self._origin:
+            request.headers["Authorization"] = self._header
+        yield request
+
+
+shared_transport = SharedTransport(httpx.AsyncHTTPTransport(limits=POOL_LIMITS))
+
+
+def viewer_client(api_key: str, connect_origin: tuple) -> httpx.AsyncClient:
+    """A client for one viewer's MCP sessions, sending through the shared pool."""
+    return httpx.AsyncClient(
+        transport=shared_transport,
+        auth=ViewerKeyAuth(api_key, connect_origin),
+        # Passing our own client overrides the one the MCP SDK would build, so match
+        # its defaults: a 30s timeout with a long (300s) read for streamed responses,
+        # and redirect following so a trailing-slash URL still resolves.
+        timeout=httpx.Timeout(30, read=300),
+        follow_redirects=True,
+    )
@@ -0,0 +1,139 @@
+"""Registering MCP servers with a chat, several at once, and remembering them.
+
+`register_servers` connects to every URL concurrently, each bounded by its own
+timeout, so adding (or restoring) eight servers takes as long as the slowest
+handshake rather than the sum of all eight. `SavedRegistry` keeps the URLs each
+viewer has registered, so their servers come back in their next session.
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+
+import chatlas
+
+
+@dataclass
+class Registration:
+    """The outcome of registering one server: its session name and tools, or why not."""
+
+    url: str
+    name: str | None = None
+    tools: dict = field(default_factory=dict)
+    error: BaseException | None = None
+
+
+async def register_servers(
+    chat: chatlas.Chat,
+    urls: list[str],
+    *,
+    timeout: float,
+    transport_kwargs,
+) -> list[Registration]:
+    """Register the MCP servers at `urls` concurrently, in the order given.
+
+    None of `urls` may already be registered. `transport_kwargs(url)` gives the
+    transport arguments for each server. A server that hasn't finished its
+    handshake within `timeout` seconds fails with a TimeoutError.
+    """
+    await _close_stale_sessions(chat, urls)
+    return await asyncio.gather(
+        *(_register(chat, url, timeout, transport_kwargs(url)) for url in urls)
+    )
+
+
+async def _register(chat, url, timeout, transport_kwargs) -> Registration:
+    try:
+        async with asyncio.timeout(timeout):
+            await chat.register_mcp_tools_http_stream_async(
+                url=url,
+                transport_kwargs=transport_kwargs,
+            )
+    except TimeoutError:
+        return Registration(
+            url, error=TimeoutError(f"no response within {timeout:g} seconds")
+        )
+    except Exception as e:
+        # chatlas wraps the real failure and chains it via `raise ... from`; keep that
+        # cause so the caller can say why, not just "failed".
+        cause = e.__cause__ or e
+        if isinstance(cause, asyncio.CancelledError):
+            # When the connection itself fails, the MCP client logs why and cancels
+            # the session, so all that reaches us is the cancellation.
+            cause = ConnectionError("couldn't connect to the server")
+        return Registration(url, error=cause)
+
+    # chatlas exposes no accessor for the registered servers/tools we need for the
+    # cards, so read its private session registry. Registrations run concurrently, so
+    # find this one by its URL rather than by diffing the session names.
+    for name, session in chat._mcp_manager._mcp_sessions.items():
+        if getattr(session, "url", None) == url:
+            return Registration(url, name=name, tools=session.tools)
+    return Registration(url, error=RuntimeError("the server's session wasn't found"))
+
+
+async def _close_stale_sessions(chat, urls: list[str]) -> None:
+    # A timed-out registration can't be cancelled: chatlas finishes the handshake in a
+    # background task and may add its session afterwards, without exposing its tools
+    # to the chat. Close any such straggler for a URL being registered again, so it
+    # doesn't block the new session under the same name. Only the session is closed;
+    # its tools were never added to the chat.
+    stale = [
+        name
+        for name, session in chat._mcp_manager._mcp_sessions.items()
+        if getattr(session, "url", None) in urls
+    ]
+    if stale:
+        await chat._mcp_manager.close_sessions(stale)
+
+
+class SavedRegistry:
+    """The MCP server URLs each viewer has registered, kept in a JSON file.
+
+    Viewers are keyed by their Connect user GUID. Only URLs are stored, never
+    credentials. Writes replace the file whole, so a reader never sees a partial
+    one; the file is created readable only by its owner. Like reading, saving
+    is a convenience: if the file can't be written, that is logged, not raised.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict[str, list[str]]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            # An unreadable file shouldn't break the app; start over rather than crash.
+            print(f"Ignoring unreadable MCP registry at {self.path}. Err: {e}")
+            return {}
+
+    def load(self, viewer: str) -> list[str]:
+        with self._lock:
+            return list(self._read().get(viewer, []))
+
+    def save(self, viewer: str, urls: list[str]) -> None:
+        with self._lock:
+            registry = self._read()
+            if urls:
+                registry[viewer] = urls
+            else:
+                registry.pop(viewer, None)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                fd = os.open(tmp, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "w") as f:
+                    json.dump(registry, f)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                # The servers are registered either way; they just won't be restored
+                # next session.
+                print(f"Couldn't save the MCP registry at {self.path}. Err: {e}")
+                with contextlib.suppress(OSError):
+                    os.remove(tmp)
@@ -0,0 +1,169 @@
+import asyncio
+
+import chatlas
+import pytest
+from chatlas import AssistantTurn, UserTurn
+from chatlas.types import ContentImageInline, ContentToolRequest, ContentToolResult
+
+from context_budget import FILE_TOKENS, ContextBudget, estimate_tokens
+
+IMAGE = ContentImageInline(image_content_type="image/png", data="iVBORw0KGgo=")
+
+
+def exchange(i: int, output) -> list:
+    """One question, answered by calling a tool that returns `output`."""
+    request = ContentToolRequest(id=f"call-{i}", name="fetch", arguments={"i": i})
+    return [
+        UserTurn(f"Question {i}?"),
+        AssistantTurn([request]),
+        UserTurn([ContentToolResult(value=output, request=request)]),
+        AssistantTurn(f"Answer {i}."),
+    ]
+
+
+def outputs(chat) -> list:
+    return [
+        content.value
+        for turn in chat.get_turns()
+        for content in turn.contents
+        if isinstance(content, ContentToolResult)
+    ]
+
+
+def make_chat(*outputs_) -> chatlas.Chat:
+    chat = chatlas.ChatOpenAI(api_key="not-used", model="gpt-4o")
+    chat.set_turns([turn for i, o in enumerate(outputs_) for turn in exchange(i, o)])
+    return chat
+
+
+def budget(chat, max_tokens=1000, keep_exchanges=1, policy="truncate"):
+    return ContextBudget(
+        chat,
+        max_tokens=max_tokens,
+        keep_exchanges=keep_exchanges,
+        policy=policy,
+        tool_output_chars=100,
+    )
+
+
+BIG = "x" * 8000
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError, match="Unknown context policy 'all'"):
+        budget(make_chat(), policy="all")
+
+
+def test_within_budget_is_left_alone():
+    chat = make_chat("small", "small")
+    record = budget(chat).compact()
+    assert outputs(chat) == ["small", "small"]
+    assert record["compacted_tool_outputs"] == 0
+    assert record["estimated_tokens_after"] == record["estimated_tokens_before"]
+
+
+def test_off_sends_everything():
+    chat = make_chat(BIG, BIG)
+    record = budget(chat, policy="off").compact()
+    assert outputs(chat) == [BIG, BIG]
+    assert record["estimated_tokens_after"] > 1000
+
+
+class TestTruncate:
+    def test_old_outputs_are_cut(self):
+        chat = make_chat(BIG, BIG)
+        record = budget(chat, max_tokens=2500).compact()
+        old, recent = outputs(chat)
+        assert old.startswith("x" * 100 + "\n[Earlier tool output cut to 100 of 8000")
+        assert recent == BIG
+        assert record["compacted_tool_outputs"] == 1
+        assert record["dropped_exchanges"] == 0
+        assert record["estimated_tokens_after"] <= 2500
+
+    def test_values_are_cut_as_the_json_sent(self):
+        chat = make_chat({"rows": [BIG]}, "small")
+        budget(chat).compact()
+        assert outputs(chat)[0].startswith('{"rows":["xxx')
+        assert "cut to 100 of 8013 characters" in outputs(chat)[0]
+
+    def test_short_outputs_are_kept(self):
+        chat = make_chat(BIG, "short", BIG)
+        budget(chat, max_tokens=2500).compact()
+        assert outputs(chat)[1] == "short"
+
+    def test_compacting_again_changes_nothing(self):
+        chat = make_chat(BIG, BIG)
+        budget(chat, max_tokens=2500).compact()
+        first = outputs(chat)
+        record = budget(chat, max_tokens=10).compact()
+        assert outputs(chat)[-1] == first[-1]
+        assert record["compacted_tool_outputs"] == 0
+
+
+def test_drop_replaces_old_outputs():
+    chat = make_chat(BIG, {"rows": [BIG]}, BIG)
+    record = budget(chat, max_tokens=2500, policy="drop").compact()
+    old = outputs(chat)[:2]
+    assert all(value.startswith("[Earlier tool output removed") for value in old)
+    assert outputs(chat)[-1] == BIG
+    assert record["compacted_tool_outputs"] == 2
+
+
+class TestFiles:
+    def test_a_returned_image_counts_as_a_file(self):
+        turns = [UserTurn([ContentToolResult(value=IMAGE)])]
+        assert estimate_tokens(turns) == FILE_TOKENS
+        turns = [UserTurn([ContentToolResult(value=[IMAGE, IMAGE])])]
+        assert estimate_tokens(turns) == 2 * FILE_TOKENS
+
+    def test_images_are_removed_even_when_truncating(self):
+        chat = make_chat(IMAGE, BIG)
+        record = budget(chat, max_tokens=2500).compact()
+        # chatlas sends the image after a result pointing to it; both go.
+        contents = chat.get_turns()[2].contents
+        assert len(contents) == 1
+        assert outputs(chat)[0].startswith("[Earlier tool output removed")
+        assert record["compacted_tool_outputs"] == 1
+
+
+class TestKeepExchanges:
+    def test_recent_exchanges_are_kept_whole(self):
+        chat = make_chat(BIG, BIG, BIG)
+        budget(chat, max_tokens=10, keep_exchanges=2).compact()
+        assert outputs(chat) == [BIG, BIG]
+
+    def test_zero_keeps_nothing(self):
+        chat = make_chat(BIG, BIG)
+        record = budget(chat, max_tokens=10, keep_exchanges=0).compact()
+        assert chat.get_turns() == []
+        assert record["dropped_exchanges"] == 2
+
+
+def test_an_unmeetable_budget_drops_all_but_the_kept_exchanges():
+    chat = make_chat(BIG, BIG, BIG)
+    record = budget(chat, max_tokens=10).compact()
+    assert outputs(chat) == [BIG]
+    assert chat.get_turns()[0].text == "Question 2?"
+    assert record["dropped_exchanges"] == 2
+    assert record["estimated_tokens_after"] > 10
+
+
+def test_track_records_the_tokens_used():
+    chat = make_chat()
+    context = budget(chat)
+    record = context.compact()
+
+    async def stream():
+        yield "Hello"
+        chat.add_turn(UserTurn("Hi"))
+        chat.add_turn(AssistantTurn("Hello", tokens=(10, 2, 4)))
+
+    async def consume():
+        return [chunk async for chunk in context.track(record, stream())]
+
+    chunks = asyncio.run(consume())
+    assert chunks == ["Hello"]
+    assert context.messages == [record]
+    assert record["requests"] == 1
+    assert record["input_tokens"] == 10
+    assert record["cached_input_tokens"] == 4
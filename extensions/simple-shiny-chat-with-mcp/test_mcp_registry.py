@@ -0,0 +1,44 @@
+import os
+
+from mcp_registry import SavedRegistry
+
+
+def test_round_trip(tmp_path):
+    registry = SavedRegistry(str(tmp_path / "registry.json"))
+    registry.save("viewer", ["https://a/mcp", "https://b/mcp"])
+    assert registry.load("viewer") == ["https://a/mcp", "https://b/mcp"]
+    assert registry.load("someone-else") == []
+    assert os.stat(registry.path).st_mode & 0o777 == 0o600
+
+
+def test_saving_no_servers_forgets_the_viewer(tmp_path):
+    registry = SavedRegistry(str(tmp_path / "registry.json"))
+    registry.save("viewer", ["https://a/mcp"])
+    registry.save("viewer", [])
+    assert registry.load("viewer") == []
+
+
+def test_a_file_that_cant_be_written_is_logged(tmp_path, capsys):
+    registry = SavedRegistry(str(tmp_path / "missing" / "registry.json"))
+    registry.save("viewer", ["https://a/mcp"])
+    assert "Couldn't save the MCP registry" in capsys.readouterr().out
+    assert registry.load("viewer") == []
+
+
+def test_a_failed_replace_leaves_no_temporary_file(tmp_path, capsys):
+    # A directory where the file should be: the temporary file is written, but
+    # can't replace it.
+    path = tmp_path / "registry.json"
+    path.mkdir()
+    SavedRegistry(str(path)).save("viewer", ["https://a/mcp"])
+    assert "Couldn't save the MCP registry" in capsys.readouterr().out
+    assert sorted(os.listdir(tmp_path)) == ["registry.json"]
+
+
+def test_an_unreadable_file_starts_over(tmp_path, capsys):
+    path = tmp_path / "registry.json"
+    path.write_text("{not json")
+    registry = SavedRegistry(str(path))
+    assert registry.load("viewer") == []
+    registry.save("viewer", ["https://a/mcp"])
+    assert registry.load("viewer") == ["https://a/mcp"]
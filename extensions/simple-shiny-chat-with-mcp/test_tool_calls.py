@@ -0,0 +1,145 @@
+import asyncio
+
+import chatlas
+import pytest
+from chatlas import AssistantTurn, UserTurn
+from chatlas.types import ContentToolRequest
+
+from tool_calls import ParallelToolCalls
+
+
+class Tools:
+    """Async tools that record how many of their calls run at once."""
+
+    def __init__(self):
+        self.running = 0
+        self.most_running = 0
+        self.cancelled = []
+
+    async def _run(self, seconds: float):
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.running -= 1
+
+    async def wait(self, seconds: float) -> float:
+        """Wait `seconds`, then return them."""
+        try:
+            await self._run(seconds)
+        except asyncio.CancelledError:
+            self.cancelled.append(seconds)
+            raise
+        return seconds
+
+    async def fail(self, message: str) -> None:
+        """Fail with `message`."""
+        await self._run(0.01)
+        raise RuntimeError(message)
+
+
+def setup(policy="all", max_concurrency=4, read_only=("wait", "fail")):
+    chat = chatlas.ChatOpenAI(api_key="not-used", model="gpt-4o")
+    tools = Tools()
+    for func in (tools.wait, tools.fail):
+        annotations = {"readOnlyHint": True} if func.__name__ in read_only else None
+        chat.register_tool(func, annotations=annotations)
+    calls = ParallelToolCalls(chat, max_concurrency, policy)
+    calls.add_tools({tool.name: tool for tool in chat.get_tools()})
+    return chat, tools, calls
+
+
+def request_turn(chat, *calls) -> list[ContentToolRequest]:
+    requests = [
+        ContentToolRequest(id=f"call-{i}", name=name, arguments=arguments)
+        for i, (name, arguments) in enumerate(calls)
+    ]
+    chat.set_turns([UserTurn("Go."), AssistantTurn(requests)])
+    return requests
+
+
+def invoke(chat, requests) -> list:
+    # What chatlas does with a turn's tool requests: invoke them one at a time.
+    async def run():
+        results = []
+        for request in requests:
+            async for result in chat._invoke_tool_async(request):
+                results.append(result)
+        return results
+
+    return asyncio.run(run())
+
+
+def test_unknown_policy():
+    chat = chatlas.ChatOpenAI(api_key="not-used", model="gpt-4o")
+    with pytest.raises(ValueError, match="Unknown tool-call policy 'some'"):
+        ParallelToolCalls(chat, 4, "some")
+
+
+def test_results_come_back_in_request_order():
+    chat, tools, _ = setup()
+    requests = request_turn(chat, *[("wait", {"seconds": s}) for s in (0.2, 0.05, 0.1)])
+    results = invoke(chat, requests)
+    assert [r.value for r in results] == [0.2, 0.05, 0.1]
+    assert [r.request.id for r in results] == ["call-0", "call-1", "call-2"]
+    assert tools.most_running == 3
+
+
+def test_max_concurrency_caps_the_calls_running():
+    chat, tools, _ = setup(max_concurrency=2)
+    requests = request_turn(chat, *[("wait", {"seconds": 0.05})] * 4)
+    assert len(invoke(chat, requests)) == 4
+    assert tools.most_running == 2
+
+
+def test_one_at_a_time():
+    chat, tools, _ = setup(max_concurrency=1)
+    requests = request_turn(chat, *[("wait", {"seconds": 0.01})] * 3)
+    assert [r.value for r in invoke(chat, requests)] == [0.01] * 3
+    assert tools.most_running == 1
+
+
+def test_errors_reach_their_own_result():
+    chat, _, _ = setup()
+    requests = request_turn(
+        chat,
+        ("wait", {"seconds": 0.05}),
+        ("fail", {"message": "no such table"}),
+        ("wait", {"seconds": 0.01}),
+    )
+    with pytest.warns(match="no such table"):
+        results = invoke(chat, requests)
+    assert [r.error is None for r in results] == [True, False, True]
+    assert str(results[1].error) == "no such table"
+    assert results[2].value == 0.01
+
+
+def test_read_only_runs_only_read_only_tools_ahead():
+    chat, tools, _ = setup(policy="read-only", read_only=("fail",))
+    requests = request_turn(chat, *[("wait", {"seconds": 0.05})] * 3)
+    assert [r.value for r in invoke(chat, requests)] == [0.05] * 3
+    assert tools.most_running == 1
+
+
+def test_guard_cancels_calls_left_running():
+    chat, tools, calls = setup()
+    requests = request_turn(
+        chat, ("wait", {"seconds": 0.01}), ("wait", {"seconds": 10})
+    )
+
+    async def stream():
+        # Reach the first call, which starts the turn's calls, then stop.
+        async for result in chat._invoke_tool_async(requests[0]):
+            yield result
+        raise RuntimeError("The LLM request failed.")
+
+    async def consume():
+        with pytest.raises(RuntimeError):
+            async for _ in calls.guard(stream()):
+                pass
+        await asyncio.sleep(0)
+        # Checked before asyncio.run cancels whatever is left at the end.
+        assert tools.cancelled == [10]
+
+    asyncio.run(consume())
@@ -0,0 +1,140 @@
+"""Running the MCP tool calls of one chat turn concurrently.
+
+When the LLM asks for several tools in one turn, chatlas calls them one after
+another, so the turn takes the sum of their latencies. `ParallelToolCalls`
+starts all of a turn's calls as soon as chatlas reaches the first one, at most
+`max_concurrency` at a time. chatlas then collects each call's result in the
+order the LLM asked for them, waiting only for calls that haven't finished.
+
+The calls in one turn are requested together, before the LLM has seen any of
+their results, so none can depend on another's output. What they can do is
+change the same data, so by default ("read-only") only tools their server
+annotates as read-only run ahead, and the rest run in order when reached. The
+"all" policy runs every tool ahead.
+"""
+
+import asyncio
+import inspect
+
+import chatlas
+from chatlas.types import ContentToolRequest
+
+POLICIES = ("read-only", "all")
+
+
+class ParallelToolCalls:
+    """Runs a turn's calls to the tools added with `add_tools` concurrently."""
+
+    def __init__(self, chat: chatlas.Chat, max_concurrency: int, policy: str):
+        if policy not in POLICIES:
+            raise ValueError(
+                f"Unknown tool-call policy {policy!r}; use one of: {', '.join(POLICIES)}"
+            )
+        self.max_concurrency = max_concurrency
+        self.policy = policy
+        self._chat = chat
+        # The original functions of the tools we wrapped, by tool name.
+        self._funcs = {}
+        # The assistant turn whose calls are running, the started calls by request
+        # ID, and the request chatlas is invoking now.
+        self._turn = None
+        self._pending: dict[str, asyncio.Task] = {}
+        self._current: ContentToolRequest | None = None
+        chat.on_tool_request(self._on_tool_request)
+
+    def add_tools(self, tools: dict) -> None:
+        """Route calls to `tools` (from one MCP server) through this dispatcher."""
+        for tool in tools.values():
+            # A server registered again brings new tools under the same names, so
+            # always keep the latest function.
+            self._funcs[tool.name] = tool.func
+            tool.func = self._wrap(tool.name)
+
+    def cancel(self) -> None:
+        """Cancel any calls still running, e.g. when the session ends."""
+        for task in self._pending.values():
+            task.cancel()
+        self._pending.clear()
+
+    async def guard(self, stream):
+        """Pass `stream` through, cancelling calls still running if it stops early.
+
+        Wrap the stream of each message, so calls started ahead don't keep running
+        after the viewer cancels the message or it fails.
+        """
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            self.cancel()
+
+    def _runs_ahead(self, request: ContentToolRequest) -> bool:
+        if request.name not in self._funcs:
+            return False
+        # The chat's tool of this name, if it is still registered.
+        tool = next((t for t in self._chat.get_tools() if t.name == request.name), None)
+        if tool is None:
+            return False
+        if self.policy == "all":
+            return True
+        return bool((getattr(tool, "annotations", None) or {}).get("readOnlyHint"))
+
+    def _on_tool_request(self, request: ContentToolRequest) -> None:
+        # chatlas invokes a turn's tools one at a time, calling this just before each.
+        # The first call of a new turn starts all of that turn's calls.
+        turn = self._chat.get_last_turn(role="assistant")
+        if turn is not self._turn:
+            self._start_turn(turn)
+        self._current = request
+
+    def _start_turn(self, turn) -> None:
+        # Calls left over from an earlier turn (one whose stream was cancelled) are
+        # never collected.
+        self.cancel()
+        self._turn = turn
+        if self.max_concurrency <= 1 or turn is None:
+            return
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        for request in turn.contents:
+            if isinstance(request, ContentToolRequest) and self._runs_ahead(request):
+                self._pending[request.id] = asyncio.create_task(
+                    self._collect(request, semaphore)
+                )
+
+    async def _collect(self, request: ContentToolRequest, semaphore) -> object:
+        func = self._funcs[request.name]
+        async with semaphore:
+            if isinstance(request.arguments, dict):
+                res = await func(**request.arguments)
+            else:
+                res = await func(request.arguments)
+            # An MCP tool's results stream from an async generator, which is where the
+            # call is actually made; drain it here so the call runs now.
+            if inspect.isasyncgen(res):
+                return _Streamed([x async for x in res])
+            return res
+
+    def _wrap(self, name: str):
+        async def func(*args, **kwargs):
+            request = self._current
+            task = None
+            if request is not None and request.name == name:
+                task = self._pending.pop(request.id, None)
+            if task is None:
+                return await self._funcs[name](*args, **kwargs)
+            res = await task
+            return _replay(res.results) if isinstance(res, _Streamed) else res
+
+        return func
+
+
+class _Streamed:
+    """The results a tool streamed, collected so they can be replayed in order."""
+
+    def __init__(self, results: list):
+        self.results = results
+
+
+async def _replay(results: list):
+    for result in results:
+        yield result